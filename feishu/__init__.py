@@ -1,8 +1,73 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-from .apis import setup_action_blueprint, setup_event_blueprint, guess_event
-from .client import FeishuClient
-from .errors import FeishuError, ERRORS
-from .models import *
-from .stores import TokenStore, MemoryStore, RedisStore
+"""飞书开放平台SDK
+
+`import feishu`本身只加载版本号, 其余名字都在第一次访问时才import,
+这样CLI工具/serverless冷启动只需为真正用到的client和models付出import的开销
+"""
+from importlib import import_module
+
 from .version import __version__
+
+# 名字 -> 所在模块, 不在这里的名字都去models里找
+_lazy_attrs = {
+    "setup_action_blueprint": ".apis",
+    "setup_event_blueprint": ".apis",
+    "guess_event": ".apis",
+    "FeishuClient": ".client",
+    "AsyncFeishuClient": ".asyncclient",
+    "TaskGroup": ".concurrency",
+    "ConcurrentFeishuClient": ".background",
+    "Paginator": ".pagination",
+    "RateLimiter": ".ratelimit",
+    "Checkpoint": ".checkpoint",
+    "Outbox": ".outbox",
+    "Dispatcher": ".dispatcher",
+    "OverflowPolicy": ".dispatcher",
+    "FeishuError": ".errors",
+    "ERRORS": ".errors",
+    "TokenStore": ".stores",
+    "MemoryStore": ".stores",
+    "RedisStore": ".stores",
+    "Cache": ".caches",
+    "MemoryCache": ".caches",
+    "SQLiteCache": ".caches",
+    "RedisCache": ".caches",
+    "HTTPCache": ".httpcache",
+    "ImageOptions": ".images",
+    "ImageFormat": ".images",
+    "CompiledCard": ".templates",
+    "compile_card": ".templates",
+    "CompiledMessage": ".templates",
+    "compile_message": ".templates",
+    "ResponseMode": ".responses",
+    "LazyModel": ".responses",
+    "MessageLimits": ".limits",
+}
+
+_submodules = ("apis", "asyncclient", "background", "baseclient", "caches", "checkpoint", "client", "concurrency",
+               "consts", "dispatcher", "errors", "httpcache", "images", "limits", "models", "outbox", "pagination",
+               "ratelimit", "responses", "server", "stores", "templates", "version")
+
+
+def __getattr__(name: str):
+    if name == "__all__":
+        return list(_lazy_attrs) + import_module(".models", __name__).__all__
+
+    if name in _lazy_attrs:
+        value = getattr(import_module(_lazy_attrs[name], __name__), name)
+    elif name in _submodules:
+        value = import_module("." + name, __name__)
+    else:
+        try:
+            value = getattr(import_module(".models", __name__), name)
+        except AttributeError:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    # 缓存下来, 下次访问就不会再走__getattr__了
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__getattr__("__all__")))
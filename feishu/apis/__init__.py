@@ -1,6 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-from .api import FeishuAPI
-from .base import _get_or_create_event_loop, allow_async_call
-from .card import setup_action_blueprint
-from .event import setup_event_blueprint, guess_event
+from importlib import import_module
+
+# 只接事件回调的服务用不到FeishuAPI, 所以这里也是按需import
+_lazy_attrs = {
+    "FeishuAPI": ".api",
+    "_get_or_create_event_loop": ".base",
+    "allow_async_call": ".base",
+    "setup_action_blueprint": ".card",
+    "setup_event_blueprint": ".event",
+    "guess_event": ".event",
+}
+
+
+def __getattr__(name: str):
+    if name not in _lazy_attrs:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_lazy_attrs[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -1,5 +1,4 @@
 from .auth import AuthAPI
-from .base import allow_async_call
 from .bot import BotAPI
 from .card import CardAPI
 from .message import MessageAPI
@@ -30,10 +29,3 @@ class FeishuAPI(AuthAPI, MessageAPI, CardAPI, BotAPI):
 
     def __init__(self, feishu_client: "FeishuClient"):
         self.client = feishu_client
-        # 执行allow_async_call里面的hack
-        self.dummy()
-
-    @allow_async_call
-    def dummy(self):
-        """这是一个用来初始化async函数的API"""
-        pass
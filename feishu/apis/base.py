@@ -4,6 +4,7 @@ import asyncio
 import base64
 import hashlib
 import inspect
+import itertools
 import json
 import linecache
 import logging
@@ -15,15 +16,13 @@ from asyncio import AbstractEventLoop
 from functools import wraps
 from typing import *
 
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-
 from ..baseclient import FeishuBaseClient
+from ..concurrency import aiterate
 from ..consts import *
 from ..errors import FeishuError, ERRORS
-from ..models import *
 
-# 需要models/typing/consts的import存在
-__needs__ = [Union, Event, FEISHU_APP_ID]
+# 需要typing/consts的import存在, models等依赖会在生成async代码时从API所在模块import
+__needs__ = [Union, FEISHU_APP_ID]
 
 
 class BaseAPI:
@@ -36,6 +35,52 @@ class BaseAPI:
         pass
 
 
+def iter_id_slices(slice_size: int, **ids: Iterable[str]) -> Iterator[Dict[str, List[str]]]:
+    """把多个id列表按slice_size切片, 每个列表只遍历一次
+
+    >>> list(iter_id_slices(2, open_ids=["a", "b", "c"], user_ids=["x"]))
+    [{'open_ids': ['a', 'b'], 'user_ids': ['x']}, {'open_ids': ['c'], 'user_ids': []}]
+    """
+    iterators = {key: iter(value or ()) for key, value in ids.items()}
+    while True:
+        chunk = {key: list(itertools.islice(iterator, slice_size)) for key, iterator in iterators.items()}
+        if not any(chunk.values()):
+            return
+        yield chunk
+
+
+def failure_fields(result: Any) -> Optional[dict]:
+    """批量/逐项调用中某一项的结果是异常时, 返回对应结果对象(SendResult等)的ok/code/msg字段, 否则返回None
+
+    FeishuError保留code和msg; 其他Exception(e.g. 网络错误, 参数校验失败)也记为这一项失败, 不会中断其他项;
+    KeyboardInterrupt等不是Exception的异常继续raise
+    """
+    if isinstance(result, FeishuError):
+        return {"ok": False, "code": result.code, "msg": result.msg}
+    if isinstance(result, Exception):
+        return {"ok": False, "msg": str(result) or type(result).__name__}
+    if isinstance(result, BaseException):
+        raise result
+    return None
+
+
+async def aiter_id_slices(slice_size: int,
+                          **ids: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[Dict[str, List[str]]]:
+    """iter_id_slices的async版本, id列表也可以是async iterable(e.g. 边查数据库边发送)"""
+    iterators = {key: aiterate(value or ()).__aiter__() for key, value in ids.items()}
+    while True:
+        chunk = {}
+        for key, iterator in iterators.items():
+            chunk[key] = []
+            async for id_ in iterator:
+                chunk[key].append(id_)
+                if len(chunk[key]) >= slice_size:
+                    break
+        if not any(chunk.values()):
+            return
+        yield chunk
+
+
 def verify_signature(verify_token: str, headers: dict, body: bytes) -> bool:
     """校验消息卡片签名
 
@@ -60,6 +105,8 @@ def decrypt_aes(encrypt_key: str, encrypted: str) -> dict:
         encrypt_key: 飞书后台加密用的encrypt_key
         encrypted: 加密的密文
     """
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
     if not encrypt_key:
         raise FeishuError(ERRORS.MISSING_ENCRYPT_KEY, "飞书推送了需要解密的消息, 但是配置的encrypt_key为空")
     block_size = 16
@@ -84,13 +131,32 @@ def _get_or_create_event_loop() -> AbstractEventLoop:
         return loop
 
 
+def _get_call_loop(client) -> AbstractEventLoop:
+    """run_async模式下API调用绑定的loop
+
+    在coroutine中调用时用正在运行的loop, 所以同一个client可以同时在多个线程的loop中使用;
+    不在coroutine中调用时(e.g. loop.run_until_complete(client.send_text(...)))用client.event_loop
+    """
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    if not client.event_loop or client.event_loop.is_closed():
+        client.event_loop = _get_or_create_event_loop()
+    return client.event_loop
+
+
 to_be_created = {}
 context = {}
 # name -> newname
 # "= name(...)" -> "= await newname(...)"
 async_method_mapping = {
     "self.client.request": "self.client.request",
-    "self.client.fetch": "self.client.fetch"}
+    "self.client.fetch": "self.client.fetch",
+    "self.client.fetch_cached": "self.client.fetch_cached",
+    "self.client.gather": "self.client.gather",
+    "self.client.cached_call": "self.client.cached_call",
+    "self.client.encode_image": "self.client.encode_image"}
 
 
 def allow_async_call(func):
@@ -100,7 +166,8 @@ def allow_async_call(func):
     加allow_async_call修饰的方法必须做到以下几点:
 
     - 方法中没有同步IO事件, 读写文件都最好不要有(本地磁盘且小文件问题不大)
-    - API请求用self.client.request, 且一定要写成xxxx = self.client.request这样的形式
+    - API请求用self.client.request, 且一定要写成xxxx = self.client.request(...)这样的形式,
+      不需要返回值的话可以单独一行self.client.request(...)
     - 通用HTTP请求用self.client.fetch, 且一定要携程yyyy = self.client.fetch这样的形式
     """
     global context, async_method_mapping, to_be_created
@@ -134,16 +201,22 @@ def allow_async_call(func):
                 r'async def\1_async\2) -> "Future":\n    ', source2)
         source = source2
 
-        # 修改await, 目前就修改两种:
-        # - xxx = self.method
-        # - return self.method
+        # 修改await, 目前就修改三种:
+        # - xxx = self.method(
+        # - return self.method(
+        # - self.method(  (单独成行, 不需要返回值的调用)
+        # method后面必须紧跟"(", 否则self.add_chatter会把self.add_chatter_all也替换掉
+        # 调用后面可能紧跟下一行代码、空行, 或者已经是函数的最后一行
         for method, newmethod in async_method_mapping.items():
-            source = re.sub(r'    (\S+)\s*=\s*(' + re.escape(method) + r')(.*?\n(\n|    ))',
+            source = re.sub(r'    (\S+)\s*=\s*(' + re.escape(method) + r')(\(.*?\n(\n|    |\Z))',
                             r'    \1 = await ' + newmethod + r'\3',
                             source)
-            source = re.sub(r'    (\s*)return\s*(' + re.escape(method) + r')(.*?\n(\n|    ))',
+            source = re.sub(r'    (\s*)return\s*(' + re.escape(method) + r')(\(.*?\n(\n|    |\Z))',
                             r'    \1return await ' + newmethod + r'\3',
                             source)
+            source = re.sub(r'\n(\s+)(' + re.escape(method) + r')(\()',
+                            r'\n\1await ' + newmethod + r'\3',
+                            source)
         # 去掉decorator
         source = re.sub(r'\s*@allow_async_call\s*\n', '', source)
 
@@ -181,27 +254,31 @@ def allow_async_call(func):
 
     @wraps(func)
     def wrapper(self, *args, **kwargs):
-        def create_async_apis():
-            for newname2, create in to_be_created.items():
-                create()
-                setattr(self.__class__, newname2, context[newname2])
-
-        if not hasattr(self.__class__, newname):
-            create_async_apis()
-
-        if not self.client.run_async or name == 'dummy':
+        # 同步模式用不到async版本的API, 所以只在第一次异步调用时才生成
+        if not self.client.run_async:
             return func(self, *args, **kwargs)
-        else:
-            # print("calling", self, newname, "args", args, "kwargs", kwargs)
-            if not self.client.event_loop or self.client.event_loop.is_closed():
-                self.client.event_loop = _get_or_create_event_loop()
 
-            if not hasattr(self, newname):
-                create_async_apis()
+        if not hasattr(self, newname):
+            create_async_apis(self.__class__)
+
+        if getattr(self.client, "native_async", False):
+            # AsyncFeishuClient: 直接返回coroutine, 由调用方await, 不绑定event_loop
+            return getattr(self, newname)(*args, **kwargs)
 
-            return asyncio.ensure_future(
-                getattr(self, newname)(*args, **kwargs),
-                loop=self.client.event_loop
-            )
+        return asyncio.ensure_future(
+            getattr(self, newname)(*args, **kwargs),
+            loop=_get_call_loop(self.client)
+        )
 
     return wrapper
+
+
+def create_async_apis(cls: type):
+    """生成所有allow_async_call修饰过的API的async版本, 并挂到cls上
+
+    每个API只会生成一次, 之后的class直接复用context中的结果
+    """
+    for newname, create in to_be_created.items():
+        if newname not in context:
+            create()
+        setattr(cls, newname, context[newname])
@@ -6,20 +6,95 @@
 - 群管理
 - 机器人管理
 """
-from typing import List, Optional
+from functools import partial
+from typing import List, Optional, Dict, Union, Type, Tuple, Iterable, Iterator, AsyncIterable, AsyncIterator
 
-from .base import BaseAPI, allow_async_call
-from ..consts import FEISHU_BATCH_SEND_SIZE
+from pydantic import ValidationError
+
+from .base import BaseAPI, allow_async_call, iter_id_slices, failure_fields
+from ..checkpoint import Checkpoint
+from ..concurrency import aiterate
+from ..consts import FEISHU_BATCH_SEND_SIZE, FEISHU_CONCURRENCY
+from ..errors import FeishuError, ERRORS
+from ..pagination import Paginator
+from ..ratelimit import RateLimiter, call_with_rate_limit, call_with_rate_limit_async
+from ..responses import ResponseMode, LazyModel, build_response, convert_response, get_field, response_mode_of
 from ..models import BotInfo, CreateChatRequest, CreateChatResponse, ChatPagination, ChatInfo, ChatUpdateRequest, \
-    AddChatterResponse, RemoveChatterResponse
+    AddChatterResponse, RemoveChatterResponse, BatchFailure, ChatOp, ChatOperation, ChatOperationResult, \
+    CreateChatResult
+
+# 批量群管理的输入: (chat_id, 操作), 操作可以是ChatOperation, 操作名(e.g. "add_bot")或dict
+ChatOperationItem = Tuple[str, Union[ChatOperation, str, dict]]
+
+
+def merge_chatter_responses(chat_id: str, slices: List[Dict[str, List[str]]],
+                            results: List[Union[CreateChatResponse, Exception]],
+                            response_cls: Type[CreateChatResponse] = CreateChatResponse) -> CreateChatResponse:
+    """按批次顺序合并add_chatter/remove_chatter的结果, 出错的批次记录在failures中"""
+    response = response_cls(chat_id=chat_id)
+    for index, (ids, resp) in enumerate(zip(slices, results)):
+        if isinstance(resp, FeishuError):
+            response.failures.append(BatchFailure(index=index, code=resp.code, msg=resp.msg, **ids))
+            continue
+        if isinstance(resp, BaseException):
+            raise resp
+        response.invalid_user_ids.extend(resp.invalid_user_ids)
+        response.invalid_open_ids.extend(resp.invalid_open_ids)
+    return response
+
+
+def to_chat_operation(operation: Union[ChatOperation, str, dict]) -> ChatOperation:
+    """转换为ChatOperation, 格式不对时raise FeishuError(ERRORS.VALIDATION_ERROR)"""
+    if isinstance(operation, ChatOperation):
+        return operation
+    try:
+        if isinstance(operation, dict):
+            return ChatOperation(**operation)
+        return ChatOperation(op=operation)
+    except ValidationError as e:
+        raise FeishuError(ERRORS.VALIDATION_ERROR, f"群管理操作的格式不对: {operation!r}, {e}")
+
+
+def to_create_chat_request(request: Union[CreateChatRequest, dict]) -> CreateChatRequest:
+    """转换为CreateChatRequest, 格式不对时raise FeishuError(ERRORS.VALIDATION_ERROR)"""
+    if isinstance(request, CreateChatRequest):
+        return request
+    try:
+        return CreateChatRequest(**request)
+    except (TypeError, ValidationError) as e:
+        raise FeishuError(ERRORS.VALIDATION_ERROR, f"建群清单的格式不对: {request!r}, {e}")
+
+
+def chat_operation_result(index: int, chat_id: str, operation: Union[ChatOperation, str, dict],
+                          result: Union[None, Exception] = None, skipped: bool = False) -> ChatOperationResult:
+    """把一项操作的返回或异常统一成ChatOperationResult, 任何Exception都记为失败, 不会中断其他项"""
+    try:
+        op = to_chat_operation(operation).op
+    except FeishuError:
+        op = None
+    return ChatOperationResult(index=index, chat_id=chat_id, op=op, skipped=skipped, **(failure_fields(result) or {}))
+
+
+def create_chat_result(index: int, result: Union[CreateChatResponse, Exception]) -> CreateChatResult:
+    """把create_chat_all的返回或异常统一成CreateChatResult, 任何Exception都记为失败, 不会中断其他群"""
+    failure = failure_fields(result)
+    if failure is not None:
+        return CreateChatResult(index=index, **failure)
+    return CreateChatResult(index=index, response=result)
 
 
 class BotAPI(BaseAPI):
     @allow_async_call
-    def get_bot_info(self) -> BotInfo:
+    def get_bot_info(self, response_mode: Optional[ResponseMode] = None) -> Union[BotInfo, dict, LazyModel]:
         """获取自建应用的token
 
         https://open.feishu.cn/document/ukTMukTMukTM/uAjMxEjLwITMx4CMyETM
+
+        Args:
+            response_mode: 返回结果的构建方式, 默认用client.response_mode, 见feishu.responses.ResponseMode
+        Returns:
+            typed模式返回BotInfo, raw模式返回dict, lazy模式返回LazyModel
+
         返回示例:
             {
                 "activate_status": 2,
@@ -31,7 +106,7 @@ class BotAPI(BaseAPI):
         """
         api = "/bot/v3/info/"
         result = self.client.request("GET", api=api)
-        return BotInfo(**result.get("bot", {}))
+        return build_response(BotInfo, result.get("bot", {}), response_mode_of(self.client, response_mode))
 
     @allow_async_call
     def add_bot(self, chat_id: str):
@@ -63,7 +138,8 @@ class BotAPI(BaseAPI):
     def create_chat(self, name: str = '', description: str = '',
                     open_ids: List[str] = [], user_ids: List[str] = [], i18n_names: dict = {},
                     only_owner_add: bool = False, share_allowed: bool = True,
-                    only_owner_at_all: bool = False, only_owner_edit: bool = False) -> CreateChatResponse:
+                    only_owner_at_all: bool = False, only_owner_edit: bool = False,
+                    response_mode: Optional[ResponseMode] = None) -> Union[CreateChatResponse, dict, LazyModel]:
         """创建群
 
         Args:
@@ -76,6 +152,7 @@ class BotAPI(BaseAPI):
             share_allowed: 是否允许分享群
             only_owner_at_all: 是否仅群主@all
             only_owner_edit: 是否仅群主可编辑群信息，群信息包括头像、名称、描述、公告
+            response_mode: 返回结果的构建方式, 默认用client.response_mode
 
         Returns:
             CreateChatResponse:
@@ -89,16 +166,19 @@ class BotAPI(BaseAPI):
                                 only_owner_at_all=only_owner_at_all, only_owner_edit=only_owner_edit)
         payload = req.dict(exclude_defaults=True)
         result = self.client.request("POST", api=api, payload=payload)
-        return CreateChatResponse(**result.get("data"))
+        return build_response(CreateChatResponse, result.get("data"), response_mode_of(self.client, response_mode))
 
     @allow_async_call
-    def list_chat(self, page_size: int = 100, page_token: str = '') -> ChatPagination:
+    def list_chat(self, page_size: int = 100, page_token: str = '',
+                  response_mode: Optional[ResponseMode] = None) -> Union[ChatPagination, dict, LazyModel]:
         """获取群列表
 
         Args:
             page_size: 最大为200
             page_token: 分页标记，第一次请求不填，表示从头开始遍历
                 分页查询还有更多群时会同时返回新的 page_token, 下次遍历可采用该 page_token 获取更多群
+            response_mode: 返回结果的构建方式, 默认用client.response_mode.
+                raw时返回dict, lazy时groups中的每个群都是LazyModel, 访问字段时才校验
         Returns:
             ChatPagination
                 has_more: bool
@@ -135,26 +215,45 @@ class BotAPI(BaseAPI):
         if page_token:
             payload["page_token"] = page_token
         result = self.client.request("POST", api=api, payload=payload)
-        return ChatPagination(**result)
+        return build_response(ChatPagination, result.get("data", {}), response_mode_of(self.client, response_mode))
+
+    def iter_chats(self, page_size: int = FEISHU_BATCH_SEND_SIZE, max_items: Optional[int] = None,
+                   prefetch: bool = True, response_mode: Optional[ResponseMode] = None) -> Paginator:
+        """逐个遍历所有群, 处理当前页时预取下一页, 同步模式下用`for`, 异步模式下用`async for`
+
+        Args:
+            page_size: 每页的数量, 最大为200
+            max_items: 最多返回多少个群, 默认不限
+            prefetch: 是否预取下一页
+            response_mode: 返回结果的构建方式, 见list_chat
+
+        Returns:
+            Paginator, 逐个返回ChatInfo
+        """
+        return Paginator(lambda page_token, size: self.list_chat(page_size=size, page_token=page_token,
+                                                                 response_mode=response_mode),
+                         items_field="groups", page_size=page_size, max_items=max_items, prefetch=prefetch)
 
     @allow_async_call
-    def list_chat_all(self) -> List[ChatInfo]:
-        """获取所有群列表"""
+    def list_chat_all(self, response_mode: Optional[ResponseMode] = None) -> List[Union[ChatInfo, dict, LazyModel]]:
+        """获取所有群列表, response_mode见list_chat"""
         all_chats = []
-        pag = self.list_chat(page_size=FEISHU_BATCH_SEND_SIZE)
-        all_chats.extend(pag.groups)
-        while pag.has_more:
-            pag = self.list_chat(page_size=FEISHU_BATCH_SEND_SIZE, page_token=pag.page_token)
-            all_chats.extend(pag.groups)
+        pag = self.list_chat(page_size=FEISHU_BATCH_SEND_SIZE, response_mode=response_mode)
+        all_chats.extend(get_field(pag, "groups", []))
+        while get_field(pag, "has_more", False):
+            pag = self.list_chat(page_size=FEISHU_BATCH_SEND_SIZE, page_token=get_field(pag, "page_token"),
+                                 response_mode=response_mode)
+            all_chats.extend(get_field(pag, "groups", []))
         return all_chats
 
     @allow_async_call
-    def get_chat_info(self, chat_id: str) -> ChatInfo:
-        """获取群信息"""
+    def get_chat_info(self, chat_id: str,
+                      response_mode: Optional[ResponseMode] = None) -> Union[ChatInfo, dict, LazyModel]:
+        """获取群信息, response_mode见list_chat"""
         api = "/chat/v4"
         params = {"chat_id": chat_id}
         result = self.client.request("GET", api=api, params=params)
-        return ChatInfo(**result.get("data", {}))
+        return build_response(ChatInfo, result.get("data", {}), response_mode_of(self.client, response_mode))
 
     @allow_async_call
     def update_chat_info(self, chat_id: str,
@@ -180,13 +279,15 @@ class BotAPI(BaseAPI):
         return result.get("data", {}).get("chat_id", "")
 
     @allow_async_call
-    def add_chatter(self, chat_id: str, user_ids: List[str] = [], open_ids: List[str] = []) -> AddChatterResponse:
+    def add_chatter(self, chat_id: str, user_ids: List[str] = [], open_ids: List[str] = [],
+                    response_mode: Optional[ResponseMode] = None) -> Union[AddChatterResponse, dict, LazyModel]:
         """拉用户进群
 
         Args:
             chat_id: 群ID
             open_ids: 自建应用提供用户ID, 数量限制200
             user_ids: 第三方应用提供用户ID, 数量限制200
+            response_mode: 返回结果的构建方式, 默认用client.response_mode
 
         Returns:
             AddChatterResponse:
@@ -202,31 +303,46 @@ class BotAPI(BaseAPI):
         if open_ids:
             payload["open_ids"] = open_ids
         result = self.client.request("POST", api=api, payload=payload)
-        response = AddChatterResponse(result.get("data", {}))
-        response.chat_id = chat_id
-        return response
+        data = {**result.get("data", {}), "chat_id": chat_id}
+        return build_response(AddChatterResponse, data, response_mode_of(self.client, response_mode))
 
     @allow_async_call
     def add_chatter_all(self, chat_id: str, user_ids: List[str] = [], open_ids: List[str] = [],
-                        slice_size: int = FEISHU_BATCH_SEND_SIZE) -> AddChatterResponse:
-        """拉全部用户进群, 不考虑200限制"""
-        response = AddChatterResponse()
-        while user_ids or open_ids:
-            resp = self.add_chatter(chat_id, user_ids[:slice_size], open_ids[:slice_size])
-            response.invalid_user_ids.extend(resp.invalid_user_ids)
-            response.invalid_open_ids.extend(resp.invalid_open_ids)
-            user_ids, open_ids = user_ids[slice_size:], open_ids[slice_size:]
-        response.chat_id = chat_id
-        return response
+                        slice_size: int = FEISHU_BATCH_SEND_SIZE,
+                        concurrency: int = FEISHU_CONCURRENCY,
+                        response_mode: Optional[ResponseMode] = None) \
+            -> Union[AddChatterResponse, dict, LazyModel]:
+        """拉全部用户进群, 不考虑200限制
+
+        按slice_size一批拆分成多个请求并发执行, 按批次顺序合并invalid_open_ids/invalid_user_ids,
+        某一批失败不会影响其他批次, 失败的批次记录在response.failures中
+
+        Args:
+            chat_id: 群ID
+            user_ids: 第三方应用提供用户ID, 不限数量
+            open_ids: 自建应用提供用户ID, 不限数量
+            slice_size: 每个请求的id数量
+            concurrency: 同时执行的最大请求数
+            response_mode: 合并后结果的形式, 默认用client.response_mode. 结果是在本地合并构建的,
+                lazy时直接返回AddChatterResponse, raw时返回dict
+        """
+        slices = list(iter_id_slices(slice_size, user_ids=user_ids, open_ids=open_ids))
+        calls = [partial(self.add_chatter, chat_id, response_mode=ResponseMode.TYPED, **ids) for ids in slices]
+        results = self.client.gather(calls, concurrency=concurrency, return_exceptions=True)
+        response = merge_chatter_responses(chat_id, slices, results, AddChatterResponse)
+        return convert_response(response, response_mode_of(self.client, response_mode))
 
     @allow_async_call
-    def remove_chatter(self, chat_id: str, user_ids: List[str] = [], open_ids: List[str] = []) -> RemoveChatterResponse:
+    def remove_chatter(self, chat_id: str, user_ids: List[str] = [], open_ids: List[str] = [],
+                       response_mode: Optional[ResponseMode] = None) \
+            -> Union[RemoveChatterResponse, dict, LazyModel]:
         """移除用户出群
 
         Args:
             chat_id: 群ID
             open_ids: 自建应用提供用户ID, 数量限制200
             user_ids: 第三方应用提供用户ID, 数量限制200
+            response_mode: 返回结果的构建方式, 默认用client.response_mode
 
         Returns:
             RemoveChatterResponse:
@@ -242,22 +358,21 @@ class BotAPI(BaseAPI):
         if open_ids:
             payload["open_ids"] = open_ids
         result = self.client.request("POST", api=api, payload=payload)
-        response = RemoveChatterResponse(result.get("data", {}))
-        response.chat_id = chat_id
-        return response
+        data = {**result.get("data", {}), "chat_id": chat_id}
+        return build_response(RemoveChatterResponse, data, response_mode_of(self.client, response_mode))
 
     @allow_async_call
     def remove_chatter_all(self, chat_id: str, user_ids: List[str] = [], open_ids: List[str] = [],
-                           slice_size: int = FEISHU_BATCH_SEND_SIZE) -> RemoveChatterResponse:
-        """移除全部用户出群, 不考虑200限制"""
-        response = RemoveChatterResponse()
-        while user_ids or open_ids:
-            resp = self.remove_chatter(chat_id, user_ids[:slice_size], open_ids[:slice_size])
-            response.invalid_user_ids.extend(resp.invalid_user_ids)
-            response.invalid_open_ids.extend(resp.invalid_open_ids)
-            user_ids, open_ids = user_ids[slice_size:], open_ids[slice_size:]
-        response.chat_id = chat_id
-        return response
+                           slice_size: int = FEISHU_BATCH_SEND_SIZE,
+                           concurrency: int = FEISHU_CONCURRENCY,
+                           response_mode: Optional[ResponseMode] = None) \
+            -> Union[RemoveChatterResponse, dict, LazyModel]:
+        """移除全部用户出群, 不考虑200限制, 参数和返回同add_chatter_all"""
+        slices = list(iter_id_slices(slice_size, user_ids=user_ids, open_ids=open_ids))
+        calls = [partial(self.remove_chatter, chat_id, response_mode=ResponseMode.TYPED, **ids) for ids in slices]
+        results = self.client.gather(calls, concurrency=concurrency, return_exceptions=True)
+        response = merge_chatter_responses(chat_id, slices, results, RemoveChatterResponse)
+        return convert_response(response, response_mode_of(self.client, response_mode))
 
     @allow_async_call
     def disband_chat(self, chat_id: str):
@@ -269,26 +384,182 @@ class BotAPI(BaseAPI):
         payload = {"chat_id": chat_id}
         self.client.request("POST", api=api, payload=payload)
 
+    @allow_async_call
+    def apply_chat_operation(self, chat_id: str, operation: ChatOperation):
+        """对一个群执行一个ChatOperation, 失败会raise FeishuError"""
+        params = operation.params
+        if operation.op == ChatOp.ADD_BOT:
+            return self.add_bot(chat_id)
+        elif operation.op == ChatOp.REMOVE_BOT:
+            return self.remove_bot(chat_id)
+        elif operation.op == ChatOp.UPDATE:
+            return self.update_chat_info(chat_id, **params)
+        elif operation.op == ChatOp.RENAME:
+            return self.update_chat_info(chat_id, name=params.get("name"), i18n_names=params.get("i18n_names"))
+        elif operation.op == ChatOp.TRANSFER_OWNER:
+            return self.update_chat_info(chat_id, owner_open_id=params.get("owner_open_id"),
+                                         owner_user_id=params.get("owner_user_id"))
+        elif operation.op == ChatOp.DISBAND:
+            return self.disband_chat(chat_id)
+
+    def bulk_chat_operations(self, operations: Union[Iterable[ChatOperationItem], AsyncIterable[ChatOperationItem]],
+                             concurrency: int = FEISHU_CONCURRENCY,
+                             rate_limiter: Optional[RateLimiter] = None,
+                             checkpoint_file: Optional[str] = None,
+                             max_retries: int = 3) \
+            -> Union[Iterator[ChatOperationResult], AsyncIterator[ChatOperationResult]]:
+        """批量群管理, e.g. 给几千个群加机器人/改名/转让群主/解散
+
+        operations是边执行边读取的, 按输入顺序逐项返回ChatOperationResult, 失败的项不会中断其他项.
+        同步模式下返回iterator, 异步模式下返回async iterator(operations也可以是async iterable)
+
+        Usage::
+
+        >>> operations = [(chat_id, "add_bot") for chat_id in chat_ids]
+        >>> operations.append(("oc_xxx", {"op": "rename", "params": {"name": "新群名"}}))
+        >>> for result in client.bulk_chat_operations(operations, rate_limiter=RateLimiter(50),
+        ...                                           checkpoint_file="chats.jsonl"):
+        ...     if not result.ok:
+        ...         print(result.chat_id, result.msg)
+
+        Args:
+            operations: (chat_id, 操作)的序列, 操作可以是ChatOperation, 操作名或者dict
+            concurrency: 同时执行的最大请求数
+            rate_limiter: 限制请求速率, 多个批量任务可以共享一个RateLimiter
+            checkpoint_file: 断点文件, 每完成一项追加一行结果; 中断后用同一个文件重新运行,
+                上次已经成功的项会被跳过(返回skipped=True), 要求operations的顺序不变
+            max_retries: 被飞书限流时的最大重试次数
+        """
+        if self.client.run_async:
+            return self._bulk_chat_operations_async(operations, concurrency, rate_limiter, checkpoint_file,
+                                                    max_retries)
+        return self._bulk_chat_operations_sync(operations, concurrency, rate_limiter, checkpoint_file, max_retries)
+
+    def _bulk_chat_operations_sync(self, operations: Iterable[ChatOperationItem], concurrency: int,
+                                   rate_limiter: Optional[RateLimiter], checkpoint_file: Optional[str],
+                                   max_retries: int) -> Iterator[ChatOperationResult]:
+        checkpoint = Checkpoint(checkpoint_file) if checkpoint_file else None
+
+        def run(item: Tuple[int, str, Union[ChatOperation, str, dict]]):
+            index, chat_id, operation = item
+            if checkpoint and checkpoint.is_done(index):
+                return
+            call_with_rate_limit(self.apply_chat_operation, chat_id, to_chat_operation(operation),
+                                 rate_limiter=rate_limiter, max_retries=max_retries)
+
+        # 操作在run中才转换, 格式不对的项只记为失败
+        items = ((index, chat_id, operation) for index, (chat_id, operation) in enumerate(operations))
+        try:
+            for (index, chat_id, operation), result in self.client.imap(run, items, concurrency=concurrency):
+                skipped = bool(checkpoint and checkpoint.is_done(index))
+                response = chat_operation_result(index, chat_id, operation, result, skipped=skipped)
+                if checkpoint and not skipped:
+                    checkpoint.record(response)
+                yield response
+        finally:
+            if checkpoint:
+                checkpoint.close()
+
+    async def _bulk_chat_operations_async(self, operations: Union[Iterable, AsyncIterable], concurrency: int,
+                                          rate_limiter: Optional[RateLimiter], checkpoint_file: Optional[str],
+                                          max_retries: int) -> AsyncIterator[ChatOperationResult]:
+        checkpoint = Checkpoint(checkpoint_file) if checkpoint_file else None
+
+        async def run(item: Tuple[int, str, Union[ChatOperation, str, dict]]):
+            index, chat_id, operation = item
+            if checkpoint and checkpoint.is_done(index):
+                return
+            await call_with_rate_limit_async(self.apply_chat_operation, chat_id, to_chat_operation(operation),
+                                             rate_limiter=rate_limiter, max_retries=max_retries)
+
+        async def items():
+            index = 0
+            async for chat_id, operation in aiterate(operations):
+                yield index, chat_id, operation
+                index += 1
+
+        try:
+            async for (index, chat_id, operation), result in self.client.imap(run, items(), concurrency=concurrency):
+                skipped = bool(checkpoint and checkpoint.is_done(index))
+                response = chat_operation_result(index, chat_id, operation, result, skipped=skipped)
+                if checkpoint and not skipped:
+                    checkpoint.record(response)
+                yield response
+        finally:
+            if checkpoint:
+                checkpoint.close()
+
     @allow_async_call
     def create_chat_all(self, name: str = '', description: str = '',
                         open_ids: List[str] = [], user_ids: List[str] = [], i18n_names: dict = {},
                         only_owner_add: bool = False, share_allowed: bool = True,
                         only_owner_at_all: bool = False, only_owner_edit: bool = False,
-                        slice_size: int = FEISHU_BATCH_SEND_SIZE) -> CreateChatResponse:
+                        slice_size: int = FEISHU_BATCH_SEND_SIZE,
+                        concurrency: int = FEISHU_CONCURRENCY,
+                        response_mode: Optional[ResponseMode] = None) \
+            -> Union[CreateChatResponse, dict, LazyModel]:
         """创建群
 
         和create_chat的区别是, create_chat的列表有200个的限制，这个没有
-        先create_chat, 如果还没搞定就add_chatter_all
+        先用前slice_size个id create_chat, 其余的id创建后按批并发add_chatter_all, 合并成一个返回,
+        failures中的index把创建请求算作第0批, response_mode同add_chatter_all
         """
         first_batch_open_ids, left_open_ids = open_ids[:slice_size], open_ids[slice_size:]
         first_batch_user_ids, left_user_ids = user_ids[:slice_size], user_ids[slice_size:]
         response = self.create_chat(name=name, description=description, i18n_names=i18n_names,
                                     open_ids=first_batch_open_ids, user_ids=first_batch_user_ids,
                                     only_owner_add=only_owner_add, share_allowed=share_allowed,
-                                    only_owner_at_all=only_owner_at_all, only_owner_edit=only_owner_edit)
+                                    only_owner_at_all=only_owner_at_all, only_owner_edit=only_owner_edit,
+                                    response_mode=ResponseMode.TYPED)
         if left_open_ids or left_user_ids:
             add_resp = self.add_chatter_all(chat_id=response.chat_id,
-                                            user_ids=left_user_ids, open_ids=left_open_ids)
+                                            user_ids=left_user_ids, open_ids=left_open_ids,
+                                            slice_size=slice_size, concurrency=concurrency,
+                                            response_mode=ResponseMode.TYPED)
             response.invalid_open_ids.extend(add_resp.invalid_open_ids)
             response.invalid_user_ids.extend(add_resp.invalid_user_ids)
-        return response
+            for failure in add_resp.failures:
+                failure.index += 1
+                response.failures.append(failure)
+        return convert_response(response, response_mode_of(self.client, response_mode))
+
+    def create_chats(self, manifest: Union[Iterable[Union[CreateChatRequest, dict]],
+                                           AsyncIterable[Union[CreateChatRequest, dict]]],
+                     concurrency: int = FEISHU_CONCURRENCY,
+                     member_concurrency: int = FEISHU_CONCURRENCY) \
+            -> Union[Iterator[CreateChatResult], AsyncIterator[CreateChatResult]]:
+        """按清单并发创建多个群, 每个群的成员不受200个的限制(见create_chat_all)
+
+        按清单顺序逐个返回CreateChatResult, 某个群创建失败(包括清单中这一项的格式不对)不影响其他群.
+        同步模式下返回iterator, 异步模式下返回async iterator(manifest也可以是async iterable)
+
+        Usage::
+
+        >>> manifest = [{"name": "项目A", "open_ids": members_a}, {"name": "项目B", "open_ids": members_b}]
+        >>> for result in client.create_chats(manifest):
+        ...     print(result.index, result.ok and result.response.chat_id)
+
+        Args:
+            manifest: CreateChatRequest或者同样字段的dict
+            concurrency: 同时创建的最大群数
+            member_concurrency: 每个群拉人时的最大并发请求数
+        """
+        def create(request: Union[CreateChatRequest, dict]):
+            return self.create_chat_all(**to_create_chat_request(request).dict(), concurrency=member_concurrency,
+                                        response_mode=ResponseMode.TYPED)
+
+        if self.client.run_async:
+            async def create_async(request: Union[CreateChatRequest, dict]):
+                # 在coroutine中校验, 格式不对时和请求出错一样记在这个群的结果里
+                return await create(request)
+
+            return self._create_chats_async(self.client.imap(create_async, manifest, concurrency=concurrency))
+        results = self.client.imap(create, manifest, concurrency=concurrency)
+        return (create_chat_result(index, result) for index, (_, result) in enumerate(results))
+
+    @staticmethod
+    async def _create_chats_async(results: AsyncIterator[tuple]) -> AsyncIterator[CreateChatResult]:
+        index = 0
+        async for _, result in results:
+            yield create_chat_result(index, result)
+            index += 1
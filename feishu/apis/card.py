@@ -6,15 +6,43 @@
 - flask和sanic的blueprint
 """
 import logging
+from functools import partial
 from typing import Union, Callable, Optional, Awaitable
 
 from .base import BaseAPI, allow_async_call, decrypt_aes
-from ..models import CardMessage, CardAction, CardContent, SendMsgType, Action
+from .message import idempotency_cache_key
+from ..limits import check_stats, preflight
+from ..models import CardMessage, CardContent, SendMsgType
 
 
 logger = logging.getLogger("feishu")
 
 
+def create_card_message(card: Union[dict, CardContent], update_multi: Optional[bool] = None,
+                        chat_id: str = '', open_id: str = '', user_id: str = '', email: str = '',
+                        root_id: str = '', trusted: bool = False) -> CardMessage:
+    """创建卡片消息, trusted为True时不做校验(pydantic的construct), card原样发送"""
+    if trusted:
+        msg = CardMessage.construct(msg_type=SendMsgType.INTERACTIVE, card=card, update_multi=update_multi)
+    else:
+        msg = CardMessage(
+            msg_type=SendMsgType.INTERACTIVE, card=card, update_multi=update_multi
+        )
+    if root_id:
+        msg.root_id = root_id
+
+    if chat_id:
+        msg.chat_id = chat_id
+    elif open_id:
+        msg.open_id = open_id
+    elif user_id:
+        msg.user_id = user_id
+    elif email:
+        msg.email = email
+
+    return msg
+
+
 class CardAPI(BaseAPI):
     @allow_async_call
     def send_card(
@@ -26,19 +54,25 @@ class CardAPI(BaseAPI):
         email: str = "",
         chat_id: str = "",
         root_id: str = "",
+        idempotency_key: str = "",
+        trusted: bool = False,
     ) -> Optional[str]:
         """发送卡片消息
 
         https://open.feishu.cn/document/ukTMukTMukTM/uYTNwUjL2UDM14iN1ATN
 
         Args:
-            card: dict或CardMessage类型
+            card: dict或CardMessage类型, 图片可以用img_source(本地路径, 链接, bytes等)代替img_key,
+                发送前会一起并发上传
             update_multi: 控制卡片是否是共享卡片, 默认位False
             open_id: 用户的飞信ID(自建应用)
             user_id: 用户的应用ID(三方应用)
             email: 用户的邮箱
             chat_id: 群ID, 以上4种ID必须提供一种, 优先级为chat_id>open_id>user_id>email
             root_id: 回复消息所对应的呃消息id, 可选
+            idempotency_key: 幂等key, 在client.idempotency_ttl内用同一个key重复发送时,
+                直接返回第一次发送的message_id, 不会再发一次
+            trusted: 为True时不构建和校验CardContent等pydantic对象, card(dict)原样发送, 调用方需要保证card是正确的
         Returns:
             message_id
 
@@ -88,27 +122,42 @@ class CardAPI(BaseAPI):
             ]
         }
         """
+        if idempotency_key:
+            return self.client.cached_call(self.client.idempotency_cache,
+                                           idempotency_cache_key(self.client, "send", idempotency_key),
+                                           partial(self.send_card, card, update_multi=update_multi,
+                                                   open_id=open_id, user_id=user_id, email=email,
+                                                   chat_id=chat_id, root_id=root_id, trusted=trusted),
+                                           expire=self.client.idempotency_ttl)
+
         api = "/message/v4/send/"
 
-        msg = CardMessage(
-            msg_type=SendMsgType.INTERACTIVE, card=card, update_multi=update_multi
-        )
-        if root_id:
-            msg.root_id = root_id
-
-        if chat_id:
-            msg.chat_id = chat_id
-        elif open_id:
-            msg.open_id = open_id
-        elif user_id:
-            msg.user_id = user_id
-        elif email:
-            msg.email = email
-
-        payload = msg.dict(exclude_none=True)
+        msg = create_card_message(card, update_multi=update_multi, root_id=root_id, chat_id=chat_id,
+                                  open_id=open_id, user_id=user_id, email=email, trusted=trusted)
+        # CardImgModule/CardImageElement的img_source先并发上传, 替换为img_key
+        payload = self.resolve_images(msg.dict(exclude_none=True))
+        result = self.client.request("POST", api=api, payload=preflight(payload, self.client.limits))
+        return result.get("data", {}).get("message_id")
+
+    @allow_async_call
+    def send_compiled_card(self, card: "CompiledCard", values: dict = {}, open_id: str = "", user_id: str = "",
+                           email: str = "", chat_id: str = "", root_id: str = "") -> Optional[str]:
+        """发送预编译的卡片, 不需要再构建和校验pydantic对象, 适合给大量用户发个性化卡片
+
+        Args:
+            card: feishu.templates.compile_card的结果
+            values: 卡片中{{name}}占位符的值
+            open_id, user_id, email, chat_id, root_id: 同send_card
+        Returns:
+            message_id
+        """
+        api = "/message/v4/send/"
+        payload = card.render(values, chat_id=chat_id, open_id=open_id, user_id=user_id, email=email, root_id=root_id)
+        check_stats(card.stats(payload), self.client.limits)
         result = self.client.request("POST", api=api, payload=payload)
         return result.get("data", {}).get("message_id")
 
+    @allow_async_call
     def send_ephemeral_card(self, card: Union[dict, CardMessage]) -> str:
         """发送临时卡片消息
 
@@ -135,6 +184,7 @@ class CardAPI(BaseAPI):
         result = self.client.request("POST", api=api, payload=payload)
         return result.get("data", {}).get("message_id")
 
+    @allow_async_call
     def delete_ephemeral_card(self, message_id: str):
         """删除临时卡片
 
@@ -188,7 +238,7 @@ def setup_action_blueprint(
 def flask_blueprint(
     blueprint: "flask.Blueprint",
     path: str,
-    on_action: Callable[[CardAction], Union[dict, CardContent]],
+    on_action: Callable[["CardAction"], Union[dict, CardContent]],
     verify_token: Optional[str] = None,
     encrypt_key: Optional[str] = None,
 ):
@@ -202,8 +252,9 @@ def flask_blueprint(
         encrypt_key: 加密key, 需和飞书后台配置一致, 不提供则无法解析加密数据
     """
     from flask import request, jsonify
+    from ..models import CardAction
 
-    def on_action_wrapper(action: Action):
+    def on_action_wrapper(action: "Action"):
         try:
             on_action(action)
         except Exception as e:
@@ -240,7 +291,7 @@ def flask_blueprint(
 def sanic_blueprint(
     blueprint: "sanic.Blueprint",
     path: str,
-    on_action: Callable[[CardAction], Awaitable[Union[dict, CardContent]]],
+    on_action: Callable[["CardAction"], Awaitable[Union[dict, CardContent]]],
     verify_token: Optional[str] = None,
     encrypt_key: Optional[str] = None,
 ):
@@ -255,6 +306,7 @@ def sanic_blueprint(
     """
     from sanic.request import Request
     from sanic import response
+    from ..models import CardAction
 
     @blueprint.route(path, methods=["POST"])
     async def handle_card_action(request: Request):
@@ -10,15 +10,28 @@
 
 注意，被动消息接收在event.py中
 """
+import hashlib
+import json
 from enum import Enum
-from typing import Optional, Union, Type, List
+from functools import partial
+from typing import Optional, Union, Type, List, Dict, Tuple, Iterable, Iterator, AsyncIterable, AsyncIterator, \
+    Callable
 
-from .base import BaseAPI, allow_async_call
-from ..consts import FEISHU_BATCH_SEND_SIZE
+from pydantic import BaseModel
+
+from .base import BaseAPI, allow_async_call, iter_id_slices, aiter_id_slices, failure_fields
+from ..concurrency import aiterate
+from ..consts import FEISHU_BATCH_SEND_SIZE, FEISHU_CONCURRENCY
 from ..errors import ERRORS, FeishuError
+from ..images import is_image_object
+from ..limits import check_ids, check_stats, preflight, serialize_payload, split_message
+from ..ratelimit import RateLimiter, call_with_rate_limit, call_with_rate_limit_async
+from ..responses import ResponseMode, LazyModel, build_response, convert_response, response_mode_of
 from ..models import (Message, TextMessage, TextContent, SendMsgType, Content, ImageMessage, PostMessage,
                       ShareChatMessage, ImageContent, I18nPost, PostContent, ShareChatContent, BatchSendResponse,
-                      BatchMessage)
+                      BatchMessage, BatchFailure, SendResult, Progress, ImageUploadResult, SplitSendResponse)
+from ..models.messages.message import RECIPIENT_FIELDS
+from ..templates import CompiledMessage, compile_message
 
 fileobj = Type
 Image = Type
@@ -33,17 +46,22 @@ class ImageType(str, Enum):
 
 
 def create_message(msg_type: SendMsgType, content: Content,
-                   chat_id: str, open_id: str, user_id: str, email: str, root_id: str) -> Message:
+                   chat_id: str, open_id: str, user_id: str, email: str, root_id: str,
+                   trusted: bool = False) -> Message:
+    """创建消息, trusted为True时不做校验(pydantic的construct), 调用方需要保证content是正确的"""
     message_cls = {
         SendMsgType.TEXT: TextMessage,
         SendMsgType.IMAGE: ImageMessage,
         SendMsgType.POST: PostMessage,
         SendMsgType.SHARE_CHAT: ShareChatMessage,
     }[msg_type]
-    msg = message_cls(
-        msg_type=msg_type,
-        content=content
-    )
+    if trusted:
+        msg = message_cls.construct(msg_type=msg_type, content=content)
+    else:
+        msg = message_cls(
+            msg_type=msg_type,
+            content=content
+        )
     if root_id:
         msg.root_id = root_id
 
@@ -59,6 +77,143 @@ def create_message(msg_type: SendMsgType, content: Content,
     return msg
 
 
+def slice_response(index: int, ids: Dict[str, List[str]],
+                   result: Union[BatchSendResponse, Exception]) -> BatchSendResponse:
+    """把batch_send某一批的结果或FeishuError统一成BatchSendResponse, 失败的批次记录在failures中"""
+    if isinstance(result, FeishuError):
+        return BatchSendResponse(failures=[BatchFailure(index=index, code=result.code, msg=result.msg, **ids)])
+    if isinstance(result, BaseException):
+        raise result
+    result.message_ids = [result.message_id]
+    return result
+
+
+def merge_batch_send_responses(responses: Iterable[BatchSendResponse]) -> BatchSendResponse:
+    """按批次顺序合并slice_response的结果"""
+    response = BatchSendResponse()
+    for resp in responses:
+        if resp.message_id:
+            response.message_id = resp.message_id
+        response.message_ids.extend(resp.message_ids)
+        response.invalid_department_ids.extend(resp.invalid_department_ids)
+        response.invalid_open_ids.extend(resp.invalid_open_ids)
+        response.invalid_user_ids.extend(resp.invalid_user_ids)
+        response.failures.extend(resp.failures)
+    return response
+
+
+def idempotency_cache_key(client, kind: str, idempotency_key: str) -> str:
+    """幂等key在缓存中的key, 按app和接口区分"""
+    return f"idempotency:{client.app_id}:{kind}:{idempotency_key}"
+
+
+def image_cache_key(client, digest: str, image_type: ImageType) -> str:
+    """图片在image_cache中的key, digest为图片内容的sha256"""
+    return f"image:{client.app_id}:{ImageType(image_type)}:{digest}"
+
+
+def to_target(target: Union[str, dict]) -> dict:
+    """把fan_out的接收者统一成dict
+
+    dict原样使用(e.g. {"open_id": "ou_xxx", "root_id": "om_xxx"}),
+    字符串按前缀判断类型: oc_为chat_id, ou_为open_id, 含@的为email, 其余为user_id
+    """
+    if isinstance(target, dict):
+        return target
+    if target.startswith("oc_"):
+        return {"chat_id": target}
+    if target.startswith("ou_"):
+        return {"open_id": target}
+    if "@" in target:
+        return {"email": target}
+    return {"user_id": target}
+
+
+# fan_out的target中直接拼接到编译好的消息里的字段
+FAN_OUT_TARGET_FIELDS = RECIPIENT_FIELDS + ("root_id",)
+
+
+def fan_out_payload(message: CompiledMessage, target: dict) -> bytes:
+    """把编译好的消息渲染给target
+
+    接收者字段和root_id直接拼接到序列化好的消息中; 其他字段(e.g. update_multi)和send的payload一样合并到消息中,
+    这时需要重新序列化一次
+    """
+    body = message.render(**{field: target[field] for field in FAN_OUT_TARGET_FIELDS if field in target})
+    extra = {key: value for key, value in target.items() if key not in FAN_OUT_TARGET_FIELDS}
+    if not extra:
+        return body
+    return serialize_payload({**json.loads(body), **extra})
+
+
+def send_result(index: int, target: dict, result: Union[str, Exception], progress: Progress) -> SendResult:
+    """把send的返回或异常统一成SendResult, 并更新progress"""
+    progress.done += 1
+    failure = failure_fields(result)
+    if failure is not None:
+        progress.failed += 1
+        return SendResult(index=index, target=target, **failure)
+    progress.succeeded += 1
+    return SendResult(index=index, target=target, message_id=result or '')
+
+
+def image_source_kwargs(image: Union[bytes, str, "fileobj", "Image"]) -> dict:
+    """把图片来源转换为_get_image_key的参数: 以http(s)://开头的字符串是url, 其他字符串是文件路径"""
+    if isinstance(image, str):
+        if image.startswith(("http://", "https://")):
+            return {"image_url": image}
+        return {"image_file": image}
+    return {"image": image}
+
+
+def image_upload_result(index: int, result: Union[str, Exception]) -> ImageUploadResult:
+    """把_get_image_key的返回或异常统一成ImageUploadResult"""
+    failure = failure_fields(result)
+    if failure is not None:
+        return ImageUploadResult(index=index, **failure)
+    if not result:
+        return ImageUploadResult(index=index, ok=False, code=ERRORS.INVALID_IMAGE_FILE_OR_CONTENT, msg="没有提供图片")
+    return ImageUploadResult(index=index, image_key=result)
+
+
+# 消息中图片来源的字段 -> 上传后填入的image_key字段, 见CardImgModule.img_source/PostImgElement.image_source
+IMAGE_SOURCE_FIELDS = {"img_source": "img_key", "image_source": "image_key"}
+
+
+def find_image_sources(payload: Union[dict, list]) -> List[dict]:
+    """找出payload中所有带图片来源字段的dict"""
+    nodes = []
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if any(node.get(field) is not None for field in IMAGE_SOURCE_FIELDS):
+                nodes.append(node)
+            stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(value for value in node if isinstance(value, (dict, list)))
+    return nodes
+
+
+def image_source_id(source) -> Union[str, bytes, int]:
+    """相同的路径/链接/bytes只需要上传一次, 其他对象(fileobj/PIL.Image)按对象区分"""
+    return source if isinstance(source, (str, bytes)) else id(source)
+
+
+def fill_image_keys(nodes: List[dict], sources: list, results: List[ImageUploadResult]):
+    """把上传结果填回nodes, 去掉图片来源字段, 有图片上传失败时raise FeishuError"""
+    image_keys = {}
+    for source, result in zip(sources, results):
+        if not result.ok:
+            raise FeishuError(result.code, f"上传消息中的图片失败: {result.msg}")
+        image_keys[image_source_id(source)] = result.image_key
+    for node in nodes:
+        for source_field, key_field in IMAGE_SOURCE_FIELDS.items():
+            source = node.pop(source_field, None)
+            if source is not None:
+                node[key_field] = image_keys[image_source_id(source)]
+
+
 class MessageAPI(BaseAPI):
     """消息管理相关API
 
@@ -66,11 +221,14 @@ class MessageAPI(BaseAPI):
     """
 
     @allow_async_call
-    def send(self, message: Union[Message, dict]) -> Optional[str]:
+    def send(self, message: Union[Message, dict, CompiledMessage, bytes], idempotency_key: str = '') -> Optional[str]:
         """发送/v4/send请求, 返回message_id
 
         Args:
-            message: Message类型或者一个简单的dict
+            message: Message类型, 一个简单的dict, 编译好的CompiledMessage(见compile_message), 或者序列化好的json.
+                除了序列化好的json, 发送前都会按client.limits检查大小和元素数, 超过时raise FeishuError(LIMIT_EXCEEDED)
+            idempotency_key: 幂等key, 在client.idempotency_ttl内用同一个key重复发送时,
+                直接返回第一次发送的message_id, 不会再发一次
 
         Returns:
             str: message_id
@@ -86,17 +244,29 @@ class MessageAPI(BaseAPI):
         >>> client = FeishuClient(...)
         >>> client.send(msg)
         """
+        if idempotency_key:
+            return self.client.cached_call(self.client.idempotency_cache,
+                                           idempotency_cache_key(self.client, "send", idempotency_key),
+                                           partial(self.send, message), expire=self.client.idempotency_ttl)
+
         api = "/message/v4/send/"
-        if isinstance(message, Message):
-            payload = message.dict(exclude_none=True)
+        if isinstance(message, BaseModel):
+            payload = preflight(message.dict(exclude_none=True), self.client.limits)
+        elif isinstance(message, CompiledMessage):
+            payload = message.render()
+            check_stats(message.stats(payload), self.client.limits)
+        elif isinstance(message, dict):
+            payload = preflight(message, self.client.limits)
         else:
+            # 序列化好的json原样发送
             payload = message
         result = self.client.request("POST", api=api, payload=payload)
         return result.get("data", {}).get("message_id")
 
     @allow_async_call
     def send_text(self, text: str, open_id: str = '', user_id: str = '', email: str = '',
-                  chat_id: str = '', root_id: str = '') -> Optional[str]:
+                  chat_id: str = '', root_id: str = '', idempotency_key: str = '',
+                  split: bool = False, trusted: bool = False) -> Union[Optional[str], SplitSendResponse]:
         """发送文本消息
 
         Args:
@@ -106,12 +276,20 @@ class MessageAPI(BaseAPI):
             email: 用户的邮箱
             chat_id: 群ID, 以上4种ID必须提供一种, 优先级为chat_id>open_id>user_id>email
             root_id: 回复消息所对应的呃消息id, 可选
+            idempotency_key: 幂等key, 见send
+            split: 超过client.limits时按行拆分成多条依次发送, 而不是raise FeishuError(LIMIT_EXCEEDED),
+                此时返回SplitSendResponse, 见send_chunks
+            trusted: 为True时不校验TextMessage(pydantic的construct), 调用方需要保证text是str
         """
-        msg = create_message(SendMsgType.TEXT, content=TextContent(text=text),
-                             root_id=root_id, chat_id=chat_id, open_id=open_id, user_id=user_id, email=email)
-
-        if text.strip():
-            return self.send(msg)
+        content = TextContent.construct(text=text) if trusted else TextContent(text=text)
+        msg = create_message(SendMsgType.TEXT, content=content, root_id=root_id, chat_id=chat_id,
+                             open_id=open_id, user_id=user_id, email=email, trusted=trusted)
+
+        if text.strip() and split:
+            messages = split_message(msg.dict(exclude_none=True), self.client.limits)
+            return self.send_chunks(messages, idempotency_key=idempotency_key)
+        elif text.strip():
+            return self.send(msg, idempotency_key=idempotency_key)
         else:
             self.logger.warning(f"text为空, 文本消息未发送: msg={msg}")
 
@@ -123,7 +301,7 @@ class MessageAPI(BaseAPI):
         """发送文本消息
 
         Args:
-            image: 待发送的图片，可以是PIL.Image, bytes, fileobj
+            image: 待发送的图片，可以是PIL.Image, numpy数组, bytes, fileobj, 图片会按client.image_options预处理
             image_file: 待发送图片文件路径
             image_url: 待发送图片的url
             image_key: 待发送图片的key, 飞书专用，以上4个必须提供一种，优先级为: image_key>image>image_file>image_url
@@ -148,16 +326,20 @@ class MessageAPI(BaseAPI):
     @allow_async_call
     def send_post(self, post: Union[dict, I18nPost],
                   open_id: str = '', user_id: str = '', email: str = '',
-                  chat_id: str = '', root_id: str = '') -> Optional[str]:
+                  chat_id: str = '', root_id: str = '', split: bool = False,
+                  trusted: bool = False) -> Union[Optional[str], SplitSendResponse]:
         """发送富文本消息
 
         Args:
-            post: dict或者I18nPost类型
+            post: dict或者I18nPost类型(作为zh_cn), PostImgElement可以用image_source代替image_key
             open_id: 用户的飞信ID(自建应用)
             user_id: 用户的应用ID(三方应用)
             email: 用户的邮箱
             chat_id: 群ID, 以上4种ID必须提供一种, 优先级为chat_id>open_id>user_id>email
             root_id: 回复消息所对应的呃消息id, 可选
+            split: 超过client.limits时按行/元素拆分成多条依次发送, 标题只在第一条中, 此时返回SplitSendResponse,
+                见send_chunks
+            trusted: 为True时不构建和校验PostContent/I18nPost等pydantic对象, post(dict)原样发送, 调用方需要保证post是正确的
 
         post参数示例
         {
@@ -184,12 +366,49 @@ class MessageAPI(BaseAPI):
             }
         }
         """
-        msg = create_message(msg_type=SendMsgType.POST, content=PostContent(post=post),
-                             root_id=root_id, chat_id=chat_id, open_id=open_id, user_id=user_id, email=email)
+        if isinstance(post, I18nPost):
+            post = {"zh_cn": post}
+        content = PostContent.construct(post=post) if trusted else PostContent(post=post)
+        msg = create_message(msg_type=SendMsgType.POST, content=content, root_id=root_id, chat_id=chat_id,
+                             open_id=open_id, user_id=user_id, email=email, trusted=trusted)
         if not post.get('zh_cn') and not post.get('en_us'):
             self.logger.warning(f"没有提供zh_cn/en_us内容, 富文本未发送: msg={msg}")
         else:
-            return self.send(msg)
+            # PostImgElement.image_source先并发上传, 替换为image_key
+            payload = self.resolve_images(msg.dict(exclude_none=True))
+            if split:
+                return self.send_chunks(split_message(payload, self.client.limits))
+            return self.send(payload)
+
+    @allow_async_call
+    def send_chunks(self, messages: List[Union[Message, dict]], idempotency_key: str = '') -> SplitSendResponse:
+        """按顺序逐条发送同一个接收者的多条消息, 通常是split_message拆分出的多段
+
+        消息没有指定root_id时, 从第二条开始都回复在第一条下面, 形成一个话题.
+        某一条失败时不再发送后面的, 结果中ok为False, 带有code/msg, message_ids为已经发送的那些
+
+        Args:
+            messages: Message或者/message/v4/send/的dict
+            idempotency_key: 幂等key, 每一条用"{idempotency_key}:{序号}", 失败后用同一个key重试时,
+                已经发送过的段不会重复发送
+
+        Returns:
+            SplitSendResponse
+        """
+        response = SplitSendResponse(chunks=len(messages))
+        for index, message in enumerate(messages):
+            if isinstance(message, BaseModel):
+                message = message.dict(exclude_none=True)
+            if response.message_id and not message.get("root_id"):
+                message = {**message, "root_id": response.message_id}
+            try:
+                message_id = self.send(message, idempotency_key=f"{idempotency_key}:{index}" if idempotency_key else '')
+            except FeishuError as e:
+                response.ok, response.code, response.msg = False, e.code, e.msg
+                break
+            response.message_ids.append(message_id)
+            response.message_id = response.message_id or message_id
+        return response
 
     @allow_async_call
     def send_share_chat(self, share_chat_id: str,
@@ -213,64 +432,276 @@ class MessageAPI(BaseAPI):
             self.logger.warning(f"share_chat_id为空, 群名片未分享: msg={msg}")
 
     @allow_async_call
-    def batch_send_all(self, message: Union[Message, dict], department_ids: List[str], open_ids: List[str],
-                       user_ids: List[str]) -> BatchSendResponse:
+    def batch_send_all(self, message: Union[Message, dict], department_ids: List[str] = [],
+                       open_ids: List[str] = [], user_ids: List[str] = [],
+                       concurrency: int = FEISHU_CONCURRENCY,
+                       response_mode: Optional[ResponseMode] = None) -> Union[BatchSendResponse, dict, LazyModel]:
         """批量发送消息
 
+        API有200个id的限制, 这里按200个一批拆分成多个请求并发发送, 按批次顺序合并结果,
+        某一批失败不会影响其他批次, 失败的批次记录在response.failures中
+
         Args:
             message: 消息可以是文本/图片/富文本/群名片/卡片
-            department_ids: API有200个的限制，这里取消了200个的限制，改为多次发送，并合并结果
-            open_ids: API有200个的限制，这里取消了200个的限制，改为多次发送，并合并结果
-            user_ids: API有200个的限制，这里取消了200个的限制，改为多次发送，并合并结果
+            department_ids: 部门id, 不限数量
+            open_ids: 用户open_id, 不限数量
+            user_ids: 用户user_id, 不限数量
+            concurrency: 同时发送的最大请求数
+            response_mode: 合并后结果的形式, 默认用client.response_mode. 结果是在本地合并构建的,
+                lazy时直接返回BatchSendResponse, raw时返回dict
         """
-        slice_size = FEISHU_BATCH_SEND_SIZE
-        response = BatchSendResponse()
-        while department_ids or open_ids or user_ids:
-            resp = self.batch_send(message, department_ids=department_ids, open_ids=open_ids, user_ids=user_ids)
-            response.message_id = resp.message_id
-            response.message_ids.append(resp.message_id)
-            response.invalid_department_ids.extend(resp.invalid_department_ids)
-            response.invalid_open_ids.extend(resp.invalid_open_ids)
-            response.invalid_user_ids.extend(resp.invalid_user_ids)
+        # 消息只序列化一次, 每一批只拼接id列表
+        message = compile_message(message, placeholders=False)
+        # 消息本身超过限制时, 每一批都会失败, 在发出任何请求之前就raise
+        check_stats(message.stats(message.render_batch()), self.client.limits)
+        slices = list(iter_id_slices(FEISHU_BATCH_SEND_SIZE, department_ids=department_ids,
+                                     open_ids=open_ids, user_ids=user_ids))
+        calls = [partial(self.batch_send, message, response_mode=ResponseMode.TYPED, **ids) for ids in slices]
+        results = self.client.gather(calls, concurrency=concurrency, return_exceptions=True)
+        response = merge_batch_send_responses(slice_response(index, ids, result)
+                                              for index, (ids, result) in enumerate(zip(slices, results)))
+        return convert_response(response, response_mode_of(self.client, response_mode))
+
+    def batch_send_stream(self, message: Union[Message, dict],
+                          department_ids: Union[Iterable[str], AsyncIterable[str]] = (),
+                          open_ids: Union[Iterable[str], AsyncIterable[str]] = (),
+                          user_ids: Union[Iterable[str], AsyncIterable[str]] = (),
+                          concurrency: int = FEISHU_CONCURRENCY) \
+            -> Union[Iterator[BatchSendResponse], AsyncIterator[BatchSendResponse]]:
+        """流式的批量发送, 适合几十万接收者的广播
+
+        id可以是任意iterable(e.g. 数据库游标), 异步模式下也可以是async iterable,
+        边读取边按200个一批并发发送, 每一批发送完就按顺序返回这一批的结果, 内存占用和接收者数量无关.
+        同步模式下返回iterator, 异步模式下返回async iterator, 结果可以用merge_batch_send_responses合并,
+        所以不受response_mode影响, 总是BatchSendResponse
+
+        Usage::
+
+        >>> for resp in client.batch_send_stream(message, open_ids=(row.open_id for row in cursor)):
+        ...     for failure in resp.failures:
+        ...         retry_later(failure.open_ids)
 
-            department_ids = department_ids[slice_size:]
-            open_ids = open_ids[slice_size:]
-            user_ids = user_ids[slice_size:]
+        Args:
+            message: 同batch_send_all
+            department_ids: 部门id
+            open_ids: 用户open_id
+            user_ids: 用户user_id
+            concurrency: 同时发送的最大请求数
+        """
+        message = compile_message(message, placeholders=False)
+        check_stats(message.stats(message.render_batch()), self.client.limits)
 
-        return response
+        def send(ids: Dict[str, List[str]]):
+            return self.batch_send(message, response_mode=ResponseMode.TYPED, **ids)
+
+        if self.client.run_async:
+            slices = aiter_id_slices(FEISHU_BATCH_SEND_SIZE, department_ids=department_ids,
+                                     open_ids=open_ids, user_ids=user_ids)
+            return self._batch_send_stream_async(self.client.imap(send, slices, concurrency=concurrency))
+
+        slices = iter_id_slices(FEISHU_BATCH_SEND_SIZE, department_ids=department_ids,
+                                open_ids=open_ids, user_ids=user_ids)
+        return (slice_response(index, ids, result)
+                for index, (ids, result) in enumerate(self.client.imap(send, slices, concurrency=concurrency)))
+
+    @staticmethod
+    async def _batch_send_stream_async(results: AsyncIterator[tuple]) -> AsyncIterator[BatchSendResponse]:
+        index = 0
+        async for ids, result in results:
+            yield slice_response(index, ids, result)
+            index += 1
 
     @allow_async_call
-    def batch_send(self, message: Union[Message, dict], department_ids: List[str], open_ids: List[str],
-                   user_ids: List[str]) -> BatchSendResponse:
-        """和batch_send_all的区别是id有200个的限制"""
+    def batch_send(self, message: Union[Message, dict], department_ids: List[str] = [],
+                   open_ids: List[str] = [], user_ids: List[str] = [],
+                   idempotency_key: str = '', response_mode: Optional[ResponseMode] = None,
+                   trusted: bool = False) -> Union[BatchSendResponse, dict, LazyModel]:
+        """和batch_send_all的区别是id有200个的限制, 超过client.limits.max_ids时raise FeishuError(LIMIT_EXCEEDED)
+
+        idempotency_key: 幂等key, 在client.idempotency_ttl内用同一个key重复发送时, 直接返回第一次发送的结果
+        response_mode: 返回结果的构建方式, 默认用client.response_mode, 见feishu.responses.ResponseMode
+        trusted: 为True时不检查client.limits(id个数, 请求体大小等), message原样发送, 调用方需要保证不超过飞书的限制
+        """
+        if idempotency_key:
+            response = self.client.cached_call(self.client.idempotency_cache,
+                                               idempotency_cache_key(self.client, "batch_send", idempotency_key),
+                                               partial(self.batch_send, message, department_ids, open_ids, user_ids,
+                                                       response_mode=ResponseMode.TYPED, trusted=trusted),
+                                               expire=self.client.idempotency_ttl, model=BatchSendResponse)
+            return convert_response(response, response_mode_of(self.client, response_mode))
+
         api = "/message/v4/batch_send/"
-        batch_msg = BatchMessage(
-            department_ids=department_ids,
-            open_ids=open_ids,
-            user_ids=user_ids,
-            msg_type=message.msg_type,
-            content=message.content,
-        )
-        result = self.client.request(method="POST", api=api, payload=batch_msg.dict())
-        return BatchSendResponse(**(result.get("data") or {}))
+        limits = None if trusted else self.client.limits
+        if limits is not None:
+            check_ids({"department_ids": department_ids, "open_ids": open_ids, "user_ids": user_ids}, limits)
+        if isinstance(message, CompiledMessage):
+            payload = message.render_batch(department_ids=department_ids, open_ids=open_ids, user_ids=user_ids)
+            if limits is not None:
+                check_stats(message.stats(payload), limits)
+        elif isinstance(message, Message):
+            # message已经校验过了, 不需要再校验一遍
+            payload = BatchMessage.construct(
+                department_ids=department_ids,
+                open_ids=open_ids,
+                user_ids=user_ids,
+                msg_type=message.msg_type,
+                content=message.content,
+            ).dict()
+        else:
+            # dict(或CardMessage等)原样发送(e.g. 卡片消息的card字段), 只替换接收者
+            if isinstance(message, BaseModel):
+                message = message.dict(exclude_none=True)
+            payload = {key: value for key, value in message.items() if key not in RECIPIENT_FIELDS + ("root_id",)}
+            payload.update(department_ids=department_ids, open_ids=open_ids, user_ids=user_ids)
+        if isinstance(payload, dict):
+            payload = preflight(payload, limits)
+        result = self.client.request(method="POST", api=api, payload=payload)
+        return build_response(BatchSendResponse, result.get("data") or {}, response_mode_of(self.client, response_mode))
+
+    def fan_out(self, message: Union[Message, BaseModel, dict],
+                targets: Union[Iterable[Union[str, dict]], AsyncIterable[Union[str, dict]]],
+                concurrency: int = FEISHU_CONCURRENCY,
+                rate_limiter: Optional[RateLimiter] = None,
+                max_retries: int = 3,
+                on_progress: Optional[Callable[[Progress], None]] = None) \
+            -> Union[Iterator[SendResult], AsyncIterator[SendResult]]:
+        """把同一条消息逐个发给每个接收者
+
+        和batch_send不同, 可以发给群(chat_id)/email, 可以给每个接收者单独指定root_id, 也可以发卡片(CardMessage).
+        消息只序列化一次, targets边发送边读取, 按输入顺序逐个返回SendResult, 某个接收者失败不影响其他接收者.
+        同步模式下返回iterator, 异步模式下返回async iterator(targets也可以是async iterable)
+
+        Usage::
+
+        >>> message = TextMessage(content=TextContent(text="上线通知"))
+        >>> for result in client.fan_out(message, ["oc_xxx", "ou_xxx", {"email": "a@b.com", "root_id": "om_xxx"}],
+        ...                              rate_limiter=RateLimiter(50), on_progress=print):
+        ...     if not result.ok:
+        ...         print(result.target, result.msg)
+
+        Args:
+            message: Message/CardMessage或者dict, 其中的接收者字段会被忽略
+            targets: 接收者, 字符串或者dict, 见to_target; dict中接收者字段和root_id以外的字段(e.g. update_multi)会合并到消息中
+            concurrency: 同时发送的最大请求数
+            rate_limiter: 限制请求速率, 多个批量任务可以共享一个RateLimiter
+            max_retries: 被飞书限流时的最大重试次数
+            on_progress: 每发送完一个接收者回调一次, 参数为Progress
+        """
+        # 消息只序列化一次, 每个接收者只拼接接收者字段
+        compiled = compile_message(message, placeholders=False).without_recipient()
+        check_stats(compiled.stats(compiled.render()), self.client.limits)
+        total = len(targets) if hasattr(targets, "__len__") else None
+        progress = Progress(total=total)
+
+        if self.client.run_async:
+            async def send_async(target: dict):
+                return await call_with_rate_limit_async(self.send, fan_out_payload(compiled, target),
+                                                        rate_limiter=rate_limiter, max_retries=max_retries)
+
+            targets = (to_target(target) async for target in aiterate(targets))
+            results = self.client.imap(send_async, targets, concurrency=concurrency)
+            return self._fan_out_async(results, progress, on_progress)
+
+        def send(target: dict):
+            return call_with_rate_limit(self.send, fan_out_payload(compiled, target),
+                                        rate_limiter=rate_limiter, max_retries=max_retries)
+
+        results = self.client.imap(send, (to_target(target) for target in targets), concurrency=concurrency)
+        return self._fan_out_sync(results, progress, on_progress)
+
+    @staticmethod
+    def _fan_out_sync(results: Iterator[Tuple[dict, Union[str, Exception]]], progress: Progress,
+                      on_progress: Optional[Callable[[Progress], None]]) -> Iterator[SendResult]:
+        for index, (target, result) in enumerate(results):
+            response = send_result(index, target, result, progress)
+            if on_progress:
+                on_progress(progress)
+            yield response
+
+    @staticmethod
+    async def _fan_out_async(results: AsyncIterator[Tuple[dict, Union[str, Exception]]], progress: Progress,
+                             on_progress: Optional[Callable[[Progress], None]]) -> AsyncIterator[SendResult]:
+        index = 0
+        async for target, result in results:
+            response = send_result(index, target, result, progress)
+            index += 1
+            if on_progress:
+                on_progress(progress)
+            yield response
 
     @allow_async_call
-    def upload_image(self, image: Union[bytes, "fileobj"], image_type: ImageType = "message") -> Optional[str]:
+    def upload_image(self, image: Union[bytes, "fileobj"], image_type: ImageType = "message",
+                     use_cache: bool = True) -> Optional[str]:
         """上传图片
 
+        相同内容(sha256)的图片只会上传一次, 之后直接返回client.image_cache中的image_key,
+        同时上传的相同图片也只会上传一次
+
         Args:
             image: 可以是bytes或fileobj
             image_type: 图片类型, 可以是message/avatar
+            use_cache: 是否使用client.image_cache
 
         Returns:
             str: image_key
         """
+        if hasattr(image, "read"):
+            image = image.read()
+        if use_cache:
+            return self.client.cached_call(self.client.image_cache,
+                                           image_cache_key(self.client, hashlib.sha256(image).hexdigest(), image_type),
+                                           partial(self.upload_image, image, image_type, use_cache=False))
+
         api = "/image/v4/put/"
         data = {"image_type": image_type}
         files = {"image": image}
         result = self.client.request(method="POST", api=api, data=data, files=files)
         return result.get("data", {}).get("image_key")
 
+    @allow_async_call
+    def upload_images(self, images: Iterable[Union[bytes, str, "fileobj", "Image"]],
+                      concurrency: int = FEISHU_CONCURRENCY) -> List[ImageUploadResult]:
+        """并发上传多张图片, 按输入顺序返回结果, 某一张失败不影响其他图片
+
+        Usage::
+
+        >>> results = client.upload_images(["logo.png", "https://example.com/chart.png", chart_bytes])
+        >>> image_keys = [r.image_key for r in results if r.ok]
+
+        Args:
+            images: 图片, 可以是bytes, fileobj, PIL.Image, numpy数组, 文件路径或者http(s)链接.
+                相同内容的图片只会上传一次, 见upload_image
+            concurrency: 最大并发数
+
+        Returns:
+            每张图片的ImageUploadResult, 失败时ok为False, 带有code和msg
+        """
+        calls = [partial(self._get_image_key, **image_source_kwargs(image)) for image in images]
+        results = self.client.gather(calls, concurrency=concurrency, return_exceptions=True)
+        return [image_upload_result(index, result) for index, result in enumerate(results)]
+
+    @allow_async_call
+    def resolve_images(self, payload: dict, concurrency: int = FEISHU_CONCURRENCY) -> dict:
+        """上传payload中所有的图片来源(img_source/image_source), 替换为img_key/image_key
+
+        所有图片一起并发上传, 相同的来源只上传一次, 并且会用到image_cache. payload会被原地修改
+
+        Args:
+            payload: 消息的dict, e.g. CardMessage.dict(exclude_none=True)
+            concurrency: 最大并发数
+
+        Returns:
+            payload本身
+        """
+        nodes = find_image_sources(payload)
+        sources = list({image_source_id(source): source
+                        for node in nodes for source in (node.get(field) for field in IMAGE_SOURCE_FIELDS)
+                        if source is not None}.values())
+        if sources:
+            results = self.upload_images(sources, concurrency=concurrency)
+            fill_image_keys(nodes, sources, results)
+        return payload
+
     @allow_async_call
     def get_image(self, image_key: str) -> bytes:
         """获取图片数据"""
@@ -293,33 +724,41 @@ class MessageAPI(BaseAPI):
             image_key, 如果失败则raise FeishuError
         """
         image_key = ''
-        if image:
+        if is_image_object(image) or image:
             try:
-                if hasattr(image, "tobytes"):
-                    image = image.tobytes()
-
+                if hasattr(image, "read"):
+                    image = image.read()
+                # PIL.Image/numpy数组编码为PNG/JPEG, 异步模式下在线程池中执行
+                image = self.client.encode_image(image)
                 image_key = self.upload_image(image)
                 assert image_key
             except Exception as e:
                 raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT,
-                                  f"上传图片失败: {str(e)} image={image[:20]}...")
+                                  f"上传图片失败: {str(e)} image={image[:20] if isinstance(image, bytes) else image}...")
         elif image_file:
             try:
-                image_key = self.upload_image(open(image_file, "rb"))
+                with open(image_file, "rb") as f:
+                    image = f.read()
+                image_key = self.upload_image(image)
             except Exception as e:
                 raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT,
                                   f"上传图片失败: {str(e)} image_file={image_file}")
         elif image_url:
             try:
-                content = self.client.fetch(method="GET", url=image_url)
+                response = self.client.fetch_cached(image_url)
             except Exception as e:
                 raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT,
                                   f"下载图片失败: {str(e)} image_url={image_url}")
+            if response.status >= 400:
+                raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT,
+                                  f"下载图片失败: status={response.status} image_url={image_url}")
             try:
-                image_key = self.upload_image(content)
-                print("image_key", image_key)
+                # 图片没有变化(304)时digest和上次一样, 直接命中image_cache, 不会再上传
+                image_key = self.client.cached_call(
+                    self.client.image_cache, image_cache_key(self.client, response.digest, ImageType.MESSAGE),
+                    partial(self.upload_image, response.body, use_cache=False))
             except Exception as e:
                 raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT,
-                                  f"上传图片失败: {str(e)} content={content[:20]}...")
+                                  f"上传图片失败: {str(e)} content={response.body[:20]}...")
 
         return image_key
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""原生异步的飞书客户端"""
+import asyncio
+from typing import Optional, Union, Iterable, Callable, Any, Type
+
+from pydantic import BaseModel
+
+from .apis.base import create_async_apis, to_be_created
+from .caches import Cache
+from .client import FeishuClient
+from .concurrency import Call, gather_async
+from .consts import AppType, FEISHU_CONCURRENCY, FEISHU_IDEMPOTENCY_TTL
+from .errors import FeishuError, ERRORS
+from .httpcache import HTTPCache, CachedResponse
+from .images import ImageOptions
+from .limits import MessageLimits
+from .responses import ResponseMode
+from .stores import TokenStore
+
+
+class AsyncFeishuClient(FeishuClient):
+    """原生异步的飞书客户端
+
+    和FeishuClient(run_async=True)的区别:
+
+    - 所有API都是真正的`async def`, 直接await, 不经过asyncio.ensure_future, 也不需要event_loop参数
+    - 调用方的task被cancel时, 正在进行的请求也会被cancel
+    - 支持`async with`, 退出时会await关闭aiohttp的session
+
+    Usage::
+
+    >>> async with AsyncFeishuClient(app_id=..., app_secret=...) as client:
+    ...     bot_info = await client.get_bot_info()
+    ...     message_ids = await client.gather(client.send_text("hello", open_id=open_id)
+    ...                                       for open_id in open_ids)
+    """
+    native_async = True
+
+    def __init__(self, app_id: Optional[str] = None, app_secret: Optional[str] = None,
+                 app_type: AppType = AppType.TENANT,
+                 endpoint: str = "https://open.feishu.cn/open-apis/",
+                 timeout: float = 5,
+                 token_store: Optional[TokenStore] = None,
+                 idempotency_cache: Optional[Cache] = None,
+                 idempotency_ttl: float = FEISHU_IDEMPOTENCY_TTL,
+                 image_cache: Optional[Cache] = None,
+                 http_cache: Optional[HTTPCache] = None,
+                 image_options: Optional[ImageOptions] = None,
+                 response_mode: ResponseMode = ResponseMode.TYPED,
+                 limits: Optional[MessageLimits] = None):
+        """初始化, 参数同FeishuClient"""
+        super().__init__(app_id=app_id, app_secret=app_secret, app_type=app_type, run_async=True,
+                         endpoint=endpoint, timeout=timeout, token_store=token_store,
+                         idempotency_cache=idempotency_cache, idempotency_ttl=idempotency_ttl,
+                         image_cache=image_cache, http_cache=http_cache, image_options=image_options,
+                         response_mode=response_mode, limits=limits)
+        # 同一时间只有一个请求去刷新token, 其他请求等它的结果
+        self._token_task: Optional[asyncio.Future] = None
+        _bind_async_apis(self.__class__)
+
+    def _reset_after_fork(self):
+        super()._reset_after_fork()
+        self._token_task = None
+
+    async def _call_store(self, method: Callable, *args) -> Any:
+        if not self.token_store.blocking:
+            return method(*args)
+        return await asyncio.get_event_loop().run_in_executor(self.executor, method, *args)
+
+    async def _refresh_token(self) -> str:
+        token, expire = await self.get_tenant_access_token()
+        await self._call_store(self.token_store.set, "token", token, expire)
+        return token
+
+    async def get_token(self) -> str:
+        token = await self._call_store(self.token_store.get, "token")
+        if token:
+            return token
+
+        if self._token_task is None or self._token_task.done() \
+                or self._token_task.get_loop() is not asyncio.get_event_loop():
+            self._token_task = asyncio.ensure_future(self._refresh_token())
+        # shield: 某一个调用方被cancel不应该影响其他在等token的请求
+        return await asyncio.shield(self._token_task)
+
+    async def request(self,
+                      method: str,
+                      api: str,
+                      params: dict = {},
+                      payload: Union[dict, bytes] = {},
+                      data: dict = {},
+                      files: dict = {},
+                      auth: str = True) -> Union[dict, bytes]:
+        """发起请求, 参数和返回见FeishuClient.request"""
+        url, headers, timeout_pair = self._prepare_request(api, files)
+        if auth:
+            headers['Authorization'] = f"Bearer {await self.get_token()}"
+        return await self._async_request(method=method, url=url, timeout_pair=timeout_pair, headers=headers,
+                                         params=params, payload=payload, data=data, files=files)
+
+    async def fetch(self, url: str, params: dict = {}, data: dict = {}, json: dict = {},
+                    headers: dict = {}, method: str = "GET", timeout: Union[float, tuple] = 2) -> bytes:
+        """简易HTTP请求, 参数见FeishuClient.fetch"""
+        if self.closed:
+            raise FeishuError(ERRORS.CLIENT_CLOSED, "client对象已被关闭")
+        return await self._async_fetch(url=url, params=params, data=data, json=json,
+                                       headers=headers, method=method, timeout=timeout)
+
+    async def fetch_cached(self, url: str, headers: dict = {}, timeout: Union[float, tuple] = 2) -> CachedResponse:
+        """带条件请求缓存的GET, 参数见FeishuClient.fetch_cached"""
+        if self.closed:
+            raise FeishuError(ERRORS.CLIENT_CLOSED, "client对象已被关闭")
+        return await self._async_fetch_cached(url, headers, timeout)
+
+    async def encode_image(self, image: Union[bytes, Any]) -> bytes:
+        """在线程池中编码图片, 见FeishuClient.encode_image"""
+        return await self._async_encode_image(image)
+
+    async def gather(self, calls: Iterable[Call], concurrency: int = FEISHU_CONCURRENCY,
+                     return_exceptions: bool = False) -> list:
+        """并发执行, 同时最多concurrency个请求, 按输入顺序返回结果
+
+        Args:
+            calls: awaitable, 或者返回awaitable的无参函数(e.g. functools.partial(client.send_text, ...))
+            concurrency: 最大并发数
+            return_exceptions: 为True时出错的调用返回异常对象, 否则取消其余调用并raise第一个异常
+        """
+        return await gather_async(calls, concurrency=concurrency, return_exceptions=return_exceptions)
+
+    async def cached_call(self, cache: Cache, key: str, call: Callable, expire: Optional[float] = None,
+                          model: Optional[Type[BaseModel]] = None) -> Any:
+        """带缓存和并发去重的调用, 参数见FeishuClient.cached_call"""
+        return await self._cached_call_async(cache, key, call, expire, model)
+
+    async def close(self):
+        if not self.closed:
+            await super().close()
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> "AsyncFeishuClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+def _bind_async_apis(cls: type):
+    """把生成的xxx_async挂到cls的xxx上, 这样client.xxx本身就是async def"""
+    if cls.__dict__.get("_async_apis_bound"):
+        return
+
+    create_async_apis(cls)
+    for newname in to_be_created:
+        name = newname[:-len("_async")]
+        if hasattr(cls, name):
+            setattr(cls, name, getattr(cls, newname))
+    cls._async_apis_bound = True
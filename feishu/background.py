@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""在同步代码中并发调用API
+
+所有ConcurrentFeishuClient共享一个后台event_loop线程, API用AsyncFeishuClient(aiohttp)执行,
+调用方(Flask/Celery等)不需要接触asyncio, 拿到的是concurrent.futures.Future
+"""
+import asyncio
+import inspect
+import os
+import threading
+import weakref
+from concurrent.futures import Future
+from functools import wraps
+from typing import Optional, Awaitable, Callable, Any, AsyncIterable, Iterator, Tuple
+
+from .asyncclient import AsyncFeishuClient
+from .caches import Cache
+from .consts import AppType, FEISHU_IDEMPOTENCY_TTL
+from .httpcache import HTTPCache
+from .images import ImageOptions
+from .limits import MessageLimits
+from .responses import ResponseMode
+from .stores import TokenStore
+
+
+class BackgroundLoop:
+    """一个在daemon线程中运行的event_loop, 第一次submit时才启动"""
+
+    def __init__(self, name: str = "feishu-background-loop"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        _live_loops.add(self)
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self._run, args=(self.loop,), name=self.name, daemon=True)
+                self.thread.start()
+            return self.loop
+
+    @staticmethod
+    def _run(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def submit(self, coro: Awaitable) -> Future:
+        """在后台线程中运行coroutine, 立即返回concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+
+    def _reset_after_fork(self):
+        """子进程中没有后台线程, 锁也可能被父进程的其他线程持有, 全部重置, 下次submit时重新启动"""
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+
+    def stop(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join()
+            self.thread = None
+
+
+# 所有BackgroundLoop, fork之后要在子进程中重置
+_live_loops: "weakref.WeakSet[BackgroundLoop]" = weakref.WeakSet()
+
+
+def _reset_loops_after_fork():
+    for background_loop in list(_live_loops):
+        background_loop._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_loops_after_fork)
+
+_shared_loop = BackgroundLoop()
+
+
+async def _next_item(iterator) -> Tuple[bool, Any]:
+    """在后台event_loop中取下一个元素, 返回(是否还有元素, 元素)"""
+    try:
+        return True, await iterator.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+
+async def _close_iterator(iterator):
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+class BackgroundIterator:
+    """在同步代码中遍历async iterable, 每个元素都在后台event_loop中取, e.g. ConcurrentFeishuClient.imap的返回值
+
+    和Paginator一样, 每次for都从头开始遍历; 提前break时会关闭async generator
+    """
+
+    def __init__(self, background_loop: BackgroundLoop, iterable: AsyncIterable):
+        self.background_loop = background_loop
+        self.iterable = iterable
+
+    def __iter__(self) -> Iterator[Any]:
+        iterator = self.iterable.__aiter__()
+        exhausted = False
+        try:
+            while True:
+                has_item, item = self.background_loop.submit(_next_item(iterator)).result()
+                if not has_item:
+                    exhausted = True
+                    return
+                yield item
+        finally:
+            if not exhausted:
+                self.background_loop.submit(_close_iterator(iterator)).result()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """进程内共享的后台event_loop"""
+    return _shared_loop
+
+
+class ConcurrentFeishuClient:
+    """同步代码中的并发客户端
+
+    API和FeishuClient一样, 但每个调用都会立即返回一个concurrent.futures.Future,
+    请求在共享的后台event_loop线程中并发执行, 适合批量发送等fire-and-collect的场景
+
+    Usage::
+
+    >>> client = ConcurrentFeishuClient(app_id=..., app_secret=...)
+    >>> futures = [client.send_text("hello", open_id=open_id) for open_id in open_ids]
+    >>> message_ids = [future.result() for future in futures]
+    >>> response = client.batch_send_all(message, open_ids=open_ids).result()
+
+    返回async iterator的API(imap, fan_out, iter_chats等)返回BackgroundIterator, 可以直接for遍历
+
+    >>> for open_id, result in client.fan_out(message, open_ids):
+    ...     print(open_id, result)
+    """
+
+    def __init__(self, app_id: Optional[str] = None, app_secret: Optional[str] = None,
+                 app_type: AppType = AppType.TENANT,
+                 endpoint: str = "https://open.feishu.cn/open-apis/",
+                 timeout: float = 5,
+                 token_store: Optional[TokenStore] = None,
+                 idempotency_cache: Optional[Cache] = None,
+                 idempotency_ttl: float = FEISHU_IDEMPOTENCY_TTL,
+                 image_cache: Optional[Cache] = None,
+                 http_cache: Optional[HTTPCache] = None,
+                 image_options: Optional[ImageOptions] = None,
+                 response_mode: ResponseMode = ResponseMode.TYPED,
+                 limits: Optional[MessageLimits] = None,
+                 background_loop: Optional[BackgroundLoop] = None):
+        """初始化
+
+        Args:
+            background_loop: 执行请求的后台event_loop, 默认为进程内共享的get_background_loop()
+            其余参数同FeishuClient
+        """
+        self.background_loop = background_loop or get_background_loop()
+        self.async_client = AsyncFeishuClient(app_id=app_id, app_secret=app_secret, app_type=app_type,
+                                              endpoint=endpoint, timeout=timeout, token_store=token_store,
+                                              idempotency_cache=idempotency_cache,
+                                              idempotency_ttl=idempotency_ttl, image_cache=image_cache,
+                                              http_cache=http_cache, image_options=image_options,
+                                              response_mode=response_mode, limits=limits)
+
+    def submit(self, coro: Awaitable) -> Future:
+        """在后台event_loop中执行任意coroutine, e.g. client.submit(client.async_client.gather(...))"""
+        return self.background_loop.submit(coro)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.async_client, name)
+        if inspect.iscoroutinefunction(attr):
+            method = self._wrap(attr)
+        elif inspect.ismethod(attr):
+            method = self._wrap_iterable(attr)
+        else:
+            return attr
+        setattr(self, name, method)
+        return method
+
+    def _wrap(self, method: Callable[..., Awaitable]) -> Callable[..., Future]:
+        @wraps(method)
+        def submit(*args, **kwargs) -> Future:
+            return self.background_loop.submit(method(*args, **kwargs))
+
+        return submit
+
+    def _wrap_iterable(self, method: Callable) -> Callable:
+        """普通方法返回async iterable(async generator, Paginator)时, 转换为BackgroundIterator"""
+        @wraps(method)
+        def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            if hasattr(result, "__aiter__"):
+                return BackgroundIterator(self.background_loop, result)
+            return result
+
+        return call
+
+    def close(self, timeout: Optional[float] = None):
+        """关闭aiohttp的session, 会等待关闭完成"""
+        if not self.async_client.closed:
+            self.submit(self.async_client.close()).result(timeout)
+
+    def __enter__(self) -> "ConcurrentFeishuClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
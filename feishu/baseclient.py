@@ -13,6 +13,8 @@ class FeishuBaseClient(ABC):
     app_secret: str
     run_async: bool
     event_loop: AbstractEventLoop
+    # API是否直接返回coroutine(而不是绑定在event_loop上的Future), 见AsyncFeishuClient
+    native_async: bool = False
 
     @abstractmethod
     def request(self, method: str, api: str, params: dict = {}, payload: dict = {},
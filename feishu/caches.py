@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""客户端缓存
+
+用于幂等发送(idempotency key -> message_id), 图片去重(图片内容的hash -> image_key)等场景, 值都是字符串, 可以设置过期时间
+
+client.cached_call执行前会用reserve原子地占用key(写入PENDING), 共享同一个缓存的多个进程/机器中只有一个会执行,
+其他的等待它的结果. 自定义的Cache没有实现reserve时, 只能保证同一个进程内不重复执行
+"""
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# cached_call执行中的key的值, 执行完成后被结果覆盖, 出错时被删除
+PENDING = "__feishu_pending__"
+
+
+class Cache(ABC):
+    # get/set是否会阻塞(网络/磁盘IO), 异步client会把阻塞的调用放到线程池中执行
+    blocking = True
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: str, expire: Optional[float] = None):
+        """expire为过期的秒数, None表示不过期"""
+        pass
+
+    def reserve(self, key: str, value: str, expire: float) -> bool:
+        """key不存在(或已过期)时写入value并返回True, 否则返回False, 必须是原子操作
+
+        默认不支持, 直接返回True且不写入, 这时cached_call的去重只在进程内有效
+        """
+        return True
+
+    def delete(self, key: str):
+        pass
+
+
+class MemoryCache(Cache):
+    """进程内的LRU缓存, 超过maxsize时淘汰最久没有用到的"""
+    blocking = False
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.data: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            value, expired_at = item
+            if expired_at is not None and expired_at < time.time():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, expire: Optional[float] = None):
+        with self.lock:
+            self.data[key] = (value, None if expire is None else time.time() + expire)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def reserve(self, key: str, value: str, expire: float) -> bool:
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and (item[1] is None or item[1] >= time.time()):
+                return False
+            self.data[key] = (value, time.time() + expire)
+            self.data.move_to_end(key)
+            return True
+
+    def delete(self, key: str):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+class SQLiteCache(Cache):
+    """SQLite缓存, 进程重启后依然有效, 同一台机器上的多个进程可以共享"""
+
+    def __init__(self, path: str = "feishu_cache.sqlite3"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expired_at REAL)")
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.db.execute("SELECT value, expired_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expired_at = row
+            if expired_at is not None and expired_at < time.time():
+                self.db.execute("DELETE FROM cache WHERE key = ? AND expired_at = ?", (key, expired_at))
+                return None
+            return value
+
+    def set(self, key: str, value: str, expire: Optional[float] = None):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO cache (key, value, expired_at) VALUES (?, ?, ?)",
+                            (key, value, None if expire is None else time.time() + expire))
+
+    def reserve(self, key: str, value: str, expire: float) -> bool:
+        now = time.time()
+        with self.lock:
+            # 一条语句完成, 多个进程同时reserve时只有一个能写入
+            cursor = self.db.execute("INSERT INTO cache (key, value, expired_at) VALUES (?, ?, ?) "
+                                     "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                                     "expired_at = excluded.expired_at "
+                                     "WHERE cache.expired_at IS NOT NULL AND cache.expired_at < ?",
+                                     (key, value, now + expire, now))
+            return cursor.rowcount == 1
+
+    def delete(self, key: str):
+        with self.lock:
+            self.db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def close(self):
+        self.db.close()
+
+
+class RedisCache(Cache):
+    """Redis缓存, 多个进程/机器可以共享"""
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: str = "feishu:"):
+        import redis
+        if redis_url:
+            self.client = redis.Redis.from_url(redis_url)
+        else:
+            self.client = redis.Redis()
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str, expire: Optional[float] = None):
+        self.client.set(self.prefix + key, value, px=None if expire is None else int(expire * 1000))
+
+    def reserve(self, key: str, value: str, expire: float) -> bool:
+        return bool(self.client.set(self.prefix + key, value, nx=True, px=int(expire * 1000)))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""批量操作的断点文件"""
+import json
+import os
+from typing import Dict
+
+from pydantic import BaseModel
+
+
+class Checkpoint:
+    """JSON lines格式的断点文件, 每完成一项就追加一行结果
+
+    重新运行同一批操作时, 已经成功的项(按序号)会被跳过, 失败的项会重新执行.
+    文件本身也就是一份逐项的执行报告
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[int, dict] = {}
+        incomplete = False
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    incomplete = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 上次崩溃时可能只写了半行
+                        continue
+                    if record.get("ok"):
+                        self.done[record["index"]] = record
+        self.file = open(path, "a", encoding="utf-8")
+        if incomplete:
+            self.file.write("\n")
+
+    def is_done(self, index: int) -> bool:
+        return index in self.done
+
+    def record(self, result: BaseModel):
+        self.file.write(result.json() + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
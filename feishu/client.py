@@ -4,21 +4,44 @@ import asyncio
 import logging
 import os
 import secrets
+import threading
+import time
+import weakref
 from asyncio import Future, AbstractEventLoop
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, Union, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future as ConcurrentFuture
+from typing import Optional, Union, Tuple, Dict, AsyncGenerator, Iterable, Iterator, AsyncIterator, Callable, Type, \
+    Any
 
-import aiohttp
-import requests
+from pydantic import BaseModel
 
-from .apis import FeishuAPI, _get_or_create_event_loop
+from .apis.api import FeishuAPI
+from .apis.base import _get_call_loop
 from .baseclient import FeishuBaseClient
-from .consts import AppType, FEISHU_APP_ID, FEISHU_APP_SECRET
+from .caches import Cache, MemoryCache, PENDING
+from .concurrency import gather_async, gather_threaded, imap_async, imap_threaded
+from .consts import (AppType, FEISHU_APP_ID, FEISHU_APP_SECRET, FEISHU_CONCURRENCY, FEISHU_GATHER_THREADS,
+                     FEISHU_IDEMPOTENCY_TTL, FEISHU_CACHE_PENDING_TTL)
 from .errors import FeishuError, ERRORS
+from .httpcache import HTTPCache, CachedResponse, to_cached_response
+from .images import ImageOptions, encode_image, needs_encoding
+from .limits import MessageLimits
+from .responses import ResponseMode
 from .stores import TokenStore, MemoryStore
 
 logger = logging.getLogger("feishu")
 
+# 所有存活的client, fork之后要在子进程中重置它们的连接池等状态
+_live_clients: "weakref.WeakSet[FeishuClient]" = weakref.WeakSet()
+
+
+def _reset_clients_after_fork():
+    for client in list(_live_clients):
+        client._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
 
 class FeishuClient(FeishuBaseClient, FeishuAPI):
     """飞书开放平台客户端"""
@@ -29,7 +52,14 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
                  event_loop: Optional[AbstractEventLoop] = None,
                  endpoint: str = "https://open.feishu.cn/open-apis/",
                  timeout: float = 5,
-                 token_store: Optional[TokenStore] = None):
+                 token_store: Optional[TokenStore] = None,
+                 idempotency_cache: Optional[Cache] = None,
+                 idempotency_ttl: float = FEISHU_IDEMPOTENCY_TTL,
+                 image_cache: Optional[Cache] = None,
+                 http_cache: Optional[HTTPCache] = None,
+                 image_options: Optional[ImageOptions] = None,
+                 response_mode: ResponseMode = ResponseMode.TYPED,
+                 limits: Optional[MessageLimits] = None):
         """初始化
 
         Args:
@@ -39,9 +69,19 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
             run_async: 是否异步模式, 异步模式下所有外部调用都返回一个asyncio.Future, 默认为False
             event_loop: 若run_async=True, 可以提供event_loop作为async方法的loop
                 如果不提供的话，请确保在执行API请求前设置默认loop: asyncio.set_event_loop(loop)
+                在coroutine中调用API时总是用正在运行的loop, 不受这个参数影响
             timeout: 连接超时，其中timeout/3为连接超时，timeout*2/3为读取超时
             endpoint: 飞书平台的endpoint, 一般默认就好
             token_store: 飞书的access_token会在2小时后过期，这里
+            idempotency_cache: 带idempotency_key发送时, 记录key -> message_id的缓存, 默认为进程内的MemoryCache,
+                多进程/多机器部署时可以用RedisCache
+            idempotency_ttl: idempotency_key的有效期(秒)
+            image_cache: 上传图片时, 记录图片内容的sha256 -> image_key的缓存, 相同的图片不会重复上传,
+                默认为进程内的MemoryCache, 也可以用SQLiteCache/RedisCache
+            http_cache: fetch_cached(e.g. 用image_url发送图片时下载图片)的条件请求缓存, 默认不缓存
+            image_options: 上传PIL.Image/numpy图片前的编码、缩小尺寸等预处理配置, 见feishu.images.ImageOptions
+            response_mode: API返回结果的默认构建方式, typed/raw/lazy, 见feishu.responses.ResponseMode
+            limits: 发送消息前在本地检查的大小/元素数/id数量限制, 默认为飞书的限制, 见feishu.limits.MessageLimits
         """
         allowed_types = AppType.__dict__["_value2member_map_"]
         if app_type not in allowed_types or app_type == "user":
@@ -72,35 +112,119 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
 
         if self.run_async:
             self.event_loop = event_loop  # lazy initialize in self.request/self.fetch
-            self.session_async = None  # lazy initialize in self.request/self.fetch
             self.executor = ThreadPoolExecutor(2)
         else:
-            self.session = requests.Session()
             self.executor = None
+        # requests.Session不是线程安全的, 每个线程用自己的session和连接池, 见self.session
+        self._local = threading.local()
+        self._token_lock = threading.Lock()
+        # aiohttp的session只能在创建它的event_loop中使用, 所以每个loop一个session(和连接池), 见_get_async_session
+        self._async_sessions: Dict[AbstractEventLoop, Tuple["aiohttp.ClientSession", AsyncGenerator]] = {}
+        self._async_sessions_lock = threading.Lock()
         self.closed = False
+        self._dispatcher: Optional["Dispatcher"] = None
+        self._dispatcher_lock = threading.Lock()
+        self._gather_executor: Optional[ThreadPoolExecutor] = None
+        self._gather_executor_lock = threading.Lock()
         if not token_store:
             token_store = MemoryStore()
         self.token_store = token_store
+        self.idempotency_cache = idempotency_cache or MemoryCache()
+        self.idempotency_ttl = idempotency_ttl
+        self.image_cache = image_cache or MemoryCache(maxsize=1000)
+        self.http_cache = http_cache
+        self.image_options = image_options or ImageOptions()
+        self.response_mode = ResponseMode(response_mode)
+        self.limits = limits or MessageLimits()
+        # 正在进行中的cached_call, 相同key的并发调用只执行一次
+        self._inflight: Dict[str, ConcurrentFuture] = {}
+        self._inflight_lock = threading.Lock()
+        self._inflight_async: Dict[Tuple[AbstractEventLoop, str], Future] = {}
+        _live_clients.add(self)
+
+    @property
+    def session(self) -> "requests.Session":
+        """当前线程的requests.Session"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            # requests/aiohttp都比较重, 只import当前模式真正用到的那个
+            import requests
+            session = self._local.session = requests.Session()
+        return session
+
+    @property
+    def gather_executor(self) -> ThreadPoolExecutor:
+        """同步模式下gather/imap共用的线程池, 第一次用到时创建, close时关闭
+
+        线程是长期存在的, 每个线程的requests.Session(连接池)在多次gather之间可以复用
+        """
+        if self._gather_executor is None:
+            with self._gather_executor_lock:
+                if self._gather_executor is None:
+                    self._gather_executor = ThreadPoolExecutor(FEISHU_GATHER_THREADS,
+                                                               thread_name_prefix="feishu-gather")
+        return self._gather_executor
+
+    @property
+    def dispatcher(self) -> "Dispatcher":
+        """后台发送器, client.dispatcher.send_text(...)立即返回concurrent.futures.Future
+
+        第一次访问时按默认参数创建, 也可以直接赋值一个自定义参数的Dispatcher, 见feishu.dispatcher
+        """
+        if self._dispatcher is None:
+            with self._dispatcher_lock:
+                if self._dispatcher is None:
+                    from .dispatcher import Dispatcher
+                    self._dispatcher = Dispatcher(self)
+        return self._dispatcher
+
+    @dispatcher.setter
+    def dispatcher(self, dispatcher: "Dispatcher"):
+        self._dispatcher = dispatcher
+
+    def _reset_after_fork(self):
+        """在fork出来的子进程中调用
+
+        父进程的连接池(socket)、线程池、aiohttp session以及锁都不能在子进程中继续使用,
+        这里直接丢弃(不close, 以免影响父进程中的连接), 之后用到时会重新创建
+        """
+        self._local = threading.local()
+        self._token_lock = threading.Lock()
+        self._dispatcher_lock = threading.Lock()
+        self._gather_executor = None
+        self._gather_executor_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._inflight_async = {}
+        self._async_sessions = {}
+        self._async_sessions_lock = threading.Lock()
+        if self.run_async:
+            self.executor = ThreadPoolExecutor(2)
 
     def get_token(self) -> Union[str, Future]:
         if self.run_async:
             async def _get_token_async():
-                token_ = await self.event_loop.run_in_executor(self.executor, self.token_store.get, "token")
+                loop = asyncio.get_event_loop()
+                token_ = await loop.run_in_executor(self.executor, self.token_store.get, "token")
                 if not token_:
                     token_, expire_ = await self.api.get_tenant_access_token()
-                    await self.event_loop.run_in_executor(self.executor, self.token_store.set,
-                                                          "token", token_, expire_)
+                    await loop.run_in_executor(self.executor, self.token_store.set, "token", token_, expire_)
                 return token_
 
-            return asyncio.ensure_future(_get_token_async(), loop=self.event_loop)
+            return asyncio.ensure_future(_get_token_async(), loop=_get_call_loop(self))
         else:
             token = self.token_store.get("token")
             if not token:
-                if self.app_type == AppType.TENANT:
-                    token, expire = self.api.get_tenant_access_token()
-                    self.token_store.set("token", token, expire)
-                else:
-                    raise NotImplementedError
+                with self._token_lock:
+                    # 多个线程同时发现token过期时, 只由第一个线程去刷新
+                    token = self.token_store.get("token")
+                    if token:
+                        return token
+                    if self.app_type == AppType.TENANT:
+                        token, expire = self.api.get_tenant_access_token()
+                        self.token_store.set("token", token, expire)
+                    else:
+                        raise NotImplementedError
 
             return token
 
@@ -108,7 +232,7 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
                 method: str,
                 api: str,
                 params: dict = {},
-                payload: dict = {},
+                payload: Union[dict, bytes] = {},
                 data: dict = {},
                 files: dict = {},
                 auth: str = True) -> Union[dict, bytes, Future]:
@@ -118,7 +242,7 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
             method: "GET" or "POST"
             api: 对应功能的API Path, e.g. "/user/v1/union_id/batch_get/list"
             params: HTTP的URL参数
-            payload: Body的参数, 会序列化为json
+            payload: Body的参数, 会序列化为json, 如果是bytes则认为是已经序列化好的json, 直接发送
             data: Form-Data格式的参数
             files: Multipart-encoded格式的文件参数
             auth: 是否需要验证, 只有token类API需要设为False
@@ -132,17 +256,7 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
         Raises:
             FeishuException
         """
-        if self.closed:
-            raise FeishuError(ERRORS.CLIENT_CLOSED, "client对象已被关闭")
-
-        headers = {
-            "Content-Type": "application/json",
-        }
-
-        url = self.endpoint + api
-        timeout_pair = (self.timeout / 3, self.timeout * 2 / 3)
-        if files:
-            headers.pop("Content-Type")
+        url, headers, timeout_pair = self._prepare_request(api, files)
 
         if self.run_async:
             async def do_request_async():
@@ -155,7 +269,7 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
 
             future = asyncio.ensure_future(
                 do_request_async(),
-                loop=self.event_loop,
+                loop=_get_call_loop(self),
             )
             return future
         else:
@@ -165,20 +279,91 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
             return self._sync_request(method=method, url=url, timeout_pair=timeout_pair,
                                       headers=headers, params=params, payload=payload, data=data, files=files)
 
+    def _prepare_request(self, api: str, files: dict) -> Tuple[str, dict, Tuple[float, float]]:
+        """检查client状态, 并返回请求的url, headers(不含Authorization), 以及(连接超时, 读取超时)"""
+        if self.closed:
+            raise FeishuError(ERRORS.CLIENT_CLOSED, "client对象已被关闭")
+
+        headers = {
+            "Content-Type": "application/json",
+        }
+
+        url = self.endpoint + api
+        timeout_pair = (self.timeout / 3, self.timeout * 2 / 3)
+        if files:
+            headers.pop("Content-Type")
+        return url, headers, timeout_pair
+
+    @property
+    def session_async(self) -> Optional["aiohttp.ClientSession"]:
+        """当前event_loop的aiohttp session, 还没有创建过则为None"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        entry = self._async_sessions.get(loop)
+        return entry[0] if entry else None
+
+    async def _get_async_session(self) -> "aiohttp.ClientSession":
+        """获取当前event_loop的aiohttp session, 没有则创建
+
+        同一个client可以同时在多个线程的多个loop中使用, 每个loop有自己的session和连接池;
+        loop关闭(asyncio.run结束, 或者调用了loop.shutdown_asyncgens)时, 对应的session会被自动关闭
+        """
+        import aiohttp
+
+        loop = asyncio.get_event_loop()
+        entry = self._async_sessions.get(loop)
+        if entry is not None and not entry[0].closed:
+            return entry[0]
+
+        self._purge_async_sessions()
+        session = aiohttp.ClientSession()
+        keeper = _close_on_loop_shutdown(session)
+        # 启动一下这个async generator, 它就会被注册到loop的asyncgens中
+        await keeper.__anext__()
+        with self._async_sessions_lock:
+            self._async_sessions[loop] = (session, keeper)
+        return session
+
+    def _purge_async_sessions(self):
+        """清理已经关闭的loop的session"""
+        with self._async_sessions_lock:
+            for loop in [loop for loop in self._async_sessions if loop.is_closed()]:
+                session, _ = self._async_sessions.pop(loop)
+                if not session.closed:
+                    # loop已经关了, 没法再await session.close(), 只能直接丢弃
+                    session.detach()
+
+    async def _close_async_sessions(self):
+        """关闭所有loop中的session, 其他线程中正在运行的loop会在它自己的线程里关闭"""
+        current = asyncio.get_event_loop()
+        with self._async_sessions_lock:
+            entries = list(self._async_sessions.items())
+            self._async_sessions.clear()
+        for loop, (session, _) in entries:
+            if session.closed:
+                continue
+            if loop is current:
+                await session.close()
+            elif loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+            else:
+                session.detach()
+
     async def _async_request(self, method: str, url: str, timeout_pair: Tuple[float, float],
-                             headers: dict, params: dict, payload: dict, data: dict, files: dict) -> Future:
+                             headers: dict, params: dict, payload: Union[dict, bytes], data: dict,
+                             files: dict) -> Future:
+        import aiohttp
 
-        if not self.session_async:
-            self.session_async = aiohttp.ClientSession()
-        if not self.event_loop or self.event_loop.is_closed():
-            self.event_loop = _get_or_create_event_loop()
+        session = await self._get_async_session()
         request_id = secrets.token_hex(4)
 
         try:
             timeout = aiohttp.ClientTimeout(sock_connect=timeout_pair[0], sock_read=timeout_pair[1])
             if method == "GET":
                 self.logger.debug(f"GET url={url} params={params} headers={headers} (id={request_id})")
-                resp = await self.session_async.get(url, params=params, headers=headers, timeout=timeout)
+                resp = await session.get(url, params=params, headers=headers, timeout=timeout)
             elif method == "POST":
                 if data or files:
                     # multipart/form-data
@@ -186,17 +371,20 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
                     for key, value in data.items():
                         form.add_field(key, value)
                     for filename, content in files.items():
-                        form.add_field(filename, content)
+                        form.add_field(filename, content, filename=filename)
                     self.logger.debug(f"POST(form-data) url={url} params={params} "
                                       f"headers={headers} (id={request_id})")
-                    resp = await self.session_async.post(url, params=params, data=form, headers=headers,
-                                                         timeout=timeout)
+                    resp = await session.post(url, params=params, data=form, headers=headers, timeout=timeout)
+                elif isinstance(payload, bytes):
+                    # 已经序列化好的json
+                    self.logger.debug(f"POST url={url} params={params} json={payload} "
+                                      f"headers={headers} (id={request_id})")
+                    resp = await session.post(url, params=params, data=payload, headers=headers, timeout=timeout)
                 else:
                     # application/json
                     self.logger.debug(f"POST url={url} params={params} json={payload} "
                                       f"headers={headers} (id={request_id})")
-                    resp = await self.session_async.post(url, params=params, json=payload, headers=headers,
-                                                         timeout=timeout)
+                    resp = await session.post(url, params=params, json=payload, headers=headers, timeout=timeout)
             else:
                 raise FeishuError(ERRORS.UNSUPPORTED_METHOD,
                                   f"不支持的请求method: {method}, 调用上下文: "
@@ -218,7 +406,9 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
         return result
 
     def _sync_request(self, method: str, url: str, timeout_pair: Tuple[float, float],
-                      headers: dict, params: dict, payload: dict, data: dict, files: dict) -> dict:
+                      headers: dict, params: dict, payload: Union[dict, bytes], data: dict, files: dict) -> dict:
+        import requests
+
         request_id = secrets.token_hex(4)
         try:
             if method == "GET":
@@ -227,8 +417,12 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
             elif method == "POST":
                 self.logger.debug(f"POST url={url} params={params} json={payload} data={data} "
                                   f"files.keys={files.keys()} headers={headers} (id={request_id})")
-                resp = self.session.post(url, params=params, json=payload, data=data, files=files,
-                                         headers=headers, timeout=timeout_pair)
+                if isinstance(payload, bytes):
+                    # 已经序列化好的json
+                    resp = self.session.post(url, params=params, data=payload, headers=headers, timeout=timeout_pair)
+                else:
+                    resp = self.session.post(url, params=params, json=payload, data=data, files=files,
+                                             headers=headers, timeout=timeout_pair)
             else:
                 raise FeishuError(ERRORS.UNSUPPORTED_METHOD,
                                   f"不支持的请求method: {method}, 调用上下文: "
@@ -271,23 +465,11 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
             raise FeishuError(ERRORS.CLIENT_CLOSED, "client对象已被关闭")
 
         if self.run_async:
-            if not self.session_async:
-                self.session_async = aiohttp.ClientSession()
-            if not self.event_loop or self.event_loop.is_closed():
-                self.event_loop = _get_or_create_event_loop()
-
-            async def async_fetch():
-                if data:
-                    resp = await self.session_async.request(method=method, url=url, params=params, data=data,
-                                                            headers=headers, timeout=timeout)
-                else:
-                    resp = await self.session_async.request(method=method, url=url, params=params, json=json,
-                                                            headers=headers, timeout=timeout)
-                return await resp.read()
 
             return asyncio.ensure_future(
-                async_fetch(),
-                loop=self.event_loop
+                self._async_fetch(url=url, params=params, data=data, json=json,
+                                  headers=headers, method=method, timeout=timeout),
+                loop=_get_call_loop(self)
             )
         else:
             if data:
@@ -298,8 +480,257 @@ class FeishuClient(FeishuBaseClient, FeishuAPI):
                                             headers=headers, timeout=timeout)
             return resp.content
 
+    async def _async_fetch(self, url: str, params: dict, data: dict, json: dict,
+                           headers: dict, method: str, timeout: Union[float, tuple]) -> bytes:
+        import aiohttp
+
+        session = await self._get_async_session()
+        if isinstance(timeout, tuple):
+            timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        else:
+            timeout = aiohttp.ClientTimeout(total=timeout)
+        if data:
+            resp = await session.request(method=method, url=url, params=params, data=data,
+                                         headers=headers, timeout=timeout)
+        else:
+            resp = await session.request(method=method, url=url, params=params, json=json,
+                                         headers=headers, timeout=timeout)
+        return await resp.read()
+
+    def fetch_cached(self, url: str, headers: dict = {}, timeout: Union[float, tuple] = 2) \
+            -> Union[CachedResponse, Future]:
+        """GET请求, 配置了http_cache时带上ETag/Last-Modified做条件请求, 服务端返回304时直接用本地缓存的内容
+
+        和fetch一样, 在allow_async_call的方法里写成`response = self.client.fetch_cached(...)`
+        """
+        if self.closed:
+            raise FeishuError(ERRORS.CLIENT_CLOSED, "client对象已被关闭")
+
+        if self.run_async:
+            return asyncio.ensure_future(self._async_fetch_cached(url, headers, timeout), loop=_get_call_loop(self))
+
+        cached = self.http_cache.get(url) if self.http_cache else None
+        resp = self.session.get(url, headers={**headers, **(cached.validators() if cached else {})}, timeout=timeout)
+        if resp.status_code == 304 and cached:
+            return cached.copy(update={"not_modified": True})
+        response = to_cached_response(url, resp.status_code, resp.headers, resp.content)
+        if resp.status_code == 200 and self.http_cache:
+            self.http_cache.set(response)
+        return response
+
+    async def _async_fetch_cached(self, url: str, headers: dict, timeout: Union[float, tuple]) -> CachedResponse:
+        import aiohttp
+
+        loop = asyncio.get_event_loop()
+        cached = await loop.run_in_executor(self.executor, self.http_cache.get, url) if self.http_cache else None
+        session = await self._get_async_session()
+        if isinstance(timeout, tuple):
+            timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        else:
+            timeout = aiohttp.ClientTimeout(total=timeout)
+        async with session.get(url, headers={**headers, **(cached.validators() if cached else {})},
+                               timeout=timeout) as resp:
+            body = await resp.read()
+        if resp.status == 304 and cached:
+            return cached.copy(update={"not_modified": True})
+        response = to_cached_response(url, resp.status, resp.headers, body)
+        if resp.status == 200 and self.http_cache:
+            await loop.run_in_executor(self.executor, self.http_cache.set, response)
+        return response
+
+    def encode_image(self, image: Union[bytes, Any]) -> Union[bytes, Future]:
+        """按image_options把图片编码为适合上传的bytes, 见feishu.images.encode_image
+
+        编码是CPU密集的, 异步模式下在线程池中执行, 不会卡住event_loop.
+        在allow_async_call的方法里写成`image = self.client.encode_image(image)`
+        """
+        if self.run_async:
+            return asyncio.ensure_future(self._async_encode_image(image), loop=_get_call_loop(self))
+        return encode_image(image, self.image_options)
+
+    async def _async_encode_image(self, image: Union[bytes, Any]) -> bytes:
+        if not needs_encoding(image, self.image_options):
+            return bytes(image)
+        return await asyncio.get_event_loop().run_in_executor(self.executor, encode_image, image, self.image_options)
+
+    def gather(self, calls: Iterable[Callable], concurrency: int = FEISHU_CONCURRENCY,
+               return_exceptions: bool = False) -> Union[list, Future]:
+        """并发执行多个API调用, 同时最多concurrency个, 按输入顺序返回结果
+
+        同步模式下用client.gather_executor执行(每个线程有自己的session), 异步模式下返回一个Future,
+        在allow_async_call的方法里可以直接写`results = self.client.gather(...)`
+
+        Usage::
+
+        >>> calls = [partial(client.send_text, "hello", open_id=open_id) for open_id in open_ids]
+        >>> message_ids = client.gather(calls, concurrency=5)
+
+        Args:
+            calls: 无参函数, e.g. functools.partial(client.send_text, ...)
+            concurrency: 最大并发数
+            return_exceptions: 为True时出错的调用返回异常对象, 否则raise第一个异常
+        """
+        if self.run_async:
+            return asyncio.ensure_future(gather_async(calls, concurrency, return_exceptions), loop=_get_call_loop(self))
+        return gather_threaded(calls, concurrency, return_exceptions, executor=self.gather_executor)
+
+    def imap(self, func: Callable, items: Iterable, concurrency: int = FEISHU_CONCURRENCY) \
+            -> Union[Iterator[tuple], AsyncIterator[tuple]]:
+        """惰性的并发执行, 按输入顺序逐个返回 (item, 结果或异常)
+
+        和gather不同, items是边执行边读取的, 可以是很长的generator(异步模式下也可以是async iterable),
+        同时最多concurrency个调用在执行. 同步模式下返回iterator, 异步模式下返回async iterator
+
+        Usage::
+
+        >>> for open_id, result in client.imap(lambda open_id: client.send_text("hi", open_id=open_id), open_ids):
+        ...     if isinstance(result, FeishuError):
+        ...         print(open_id, result)
+        """
+        if self.run_async:
+            return imap_async(func, items, concurrency)
+        return imap_threaded(func, items, concurrency, executor=self.gather_executor)
+
+    def cached_call(self, cache: Cache, key: str, call: Callable, expire: Optional[float] = None,
+                    model: Optional[Type[BaseModel]] = None) -> Union[Any, Future]:
+        """先查缓存, 没有的话执行call()并缓存结果, 相同key正在执行中的调用会等待同一个结果, 而不是再执行一次
+
+        执行前用cache.reserve占用key, 共享同一个缓存(Redis/SQLite)的其他进程会等待这个结果, 而不是再执行一次;
+        缓存不支持reserve时只在进程内去重, 见feishu.caches.
+        和request/gather一样, 在allow_async_call的方法里可以直接写`result = self.client.cached_call(...)`.
+        结果为None时不缓存, 出错时也不缓存
+
+        Args:
+            cache: 缓存, 见feishu.caches
+            key: 缓存的key
+            call: 无参函数, 异步模式下返回awaitable
+            expire: 缓存的有效期(秒), None表示不过期
+            model: 结果是pydantic model时传入类型, 缓存中保存json, 否则结果必须是字符串
+        """
+        if self.run_async:
+            return asyncio.ensure_future(self._cached_call_async(cache, key, call, expire, model),
+                                         loop=_get_call_loop(self))
+
+        value = cache.get(key)
+        if value is not None and value != PENDING:
+            return _decode_cached(value, model)
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = ConcurrentFuture()
+        if not leader:
+            return future.result()
+
+        try:
+            result = _reserve_and_call(cache, key, call, expire, model)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    async def _cached_call_async(self, cache: Cache, key: str, call: Callable, expire: Optional[float],
+                                 model: Optional[Type[BaseModel]]) -> Any:
+        async def run_cache(method: Callable, *args):
+            if not cache.blocking:
+                return method(*args)
+            return await asyncio.get_event_loop().run_in_executor(None, method, *args)
+
+        value = await run_cache(cache.get, key)
+        if value is not None and value != PENDING:
+            return _decode_cached(value, model)
+
+        inflight_key = (asyncio.get_event_loop(), key)
+        future = self._inflight_async.get(inflight_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._inflight_async[inflight_key] = asyncio.get_event_loop().create_future()
+        try:
+            result = await _reserve_and_call_async(run_cache, cache, key, call, expire, model)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 没有其他调用方在等时, 避免asyncio报"exception was never retrieved"
+            raise
+        finally:
+            self._inflight_async.pop(inflight_key, None)
+
     async def close(self):
         """不关闭一下aiohttp会发warning有点烦, 强迫症适用"""
-        if not self.closed and self.session_async:
-            self.session_async.close()
+        if not self.closed:
             self.closed = True
+            if self._gather_executor is not None:
+                self._gather_executor.shutdown(wait=False)
+            await self._close_async_sessions()
+
+
+# 其他进程正在执行时, 检查它是否执行完的间隔
+PENDING_POLL_INTERVAL = 0.05
+
+
+def _reserve_and_call(cache: Cache, key: str, call: Callable, expire: Optional[float],
+                      model: Optional[Type[BaseModel]]) -> Any:
+    """占用key后执行call(), 结果写入缓存; 其他进程已经占用时等待它的结果"""
+    while True:
+        # 可能在get之后、成为leader之前, 前一个leader(也可能是其他进程)刚好执行完
+        value = cache.get(key)
+        if value is None and cache.reserve(key, PENDING, FEISHU_CACHE_PENDING_TTL):
+            break
+        if value is not None and value != PENDING:
+            return _decode_cached(value, model)
+        time.sleep(PENDING_POLL_INTERVAL)
+    try:
+        result = call()
+    except BaseException:
+        cache.delete(key)
+        raise
+    if result is None:
+        cache.delete(key)
+    else:
+        cache.set(key, _encode_cached(result), expire)
+    return result
+
+
+async def _reserve_and_call_async(run_cache: Callable, cache: Cache, key: str, call: Callable,
+                                  expire: Optional[float], model: Optional[Type[BaseModel]]) -> Any:
+    """异步版本的_reserve_and_call, 阻塞的缓存操作通过run_cache执行"""
+    while True:
+        value = await run_cache(cache.get, key)
+        if value is None and await run_cache(cache.reserve, key, PENDING, FEISHU_CACHE_PENDING_TTL):
+            break
+        if value is not None and value != PENDING:
+            return _decode_cached(value, model)
+        await asyncio.sleep(PENDING_POLL_INTERVAL)
+    try:
+        result = await call()
+    except BaseException:
+        await run_cache(cache.delete, key)
+        raise
+    if result is None:
+        await run_cache(cache.delete, key)
+    else:
+        await run_cache(cache.set, key, _encode_cached(result), expire)
+    return result
+
+
+def _encode_cached(result: Any) -> str:
+    return result.json() if isinstance(result, BaseModel) else result
+
+
+def _decode_cached(value: str, model: Optional[Type[BaseModel]]) -> Any:
+    return model.parse_raw(value) if model else value
+
+
+async def _close_on_loop_shutdown(session: "aiohttp.ClientSession") -> AsyncGenerator[None, None]:
+    """loop关闭前会调用shutdown_asyncgens来aclose所有async generator, 借此关闭对应的session"""
+    try:
+        yield
+    finally:
+        await session.close()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""并发执行多个API调用的工具, FeishuClient/AsyncFeishuClient的gather都基于这里"""
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+from typing import (Optional, Union, List, Tuple, Iterable, Iterator, AsyncIterable, AsyncIterator, Callable,
+                    Awaitable, TypeVar, Any)
+
+# awaitable, 或者返回awaitable的无参函数
+Call = Union[Callable[[], Awaitable], Awaitable]
+T = TypeVar("T")
+
+# 线程池中的线程记录自己属于哪个executor, 用来发现嵌套调用, 见_own_executor
+_worker = threading.local()
+
+
+def check_concurrency(concurrency: int):
+    if concurrency < 1:
+        raise ValueError(f"concurrency必须大于等于1, 实际为{concurrency}")
+
+
+def _run_in_worker(executor: Executor, func: Callable, *args) -> Any:
+    _worker.executor = executor
+    return func(*args)
+
+
+def _own_executor(executor: Optional[Executor]) -> bool:
+    """是否需要临时创建线程池: 没有提供executor, 或者是在executor的线程中嵌套调用
+
+    嵌套调用时如果继续用同一个executor, 外层的调用占满线程后会等待排在后面的内层调用, 造成死锁
+    """
+    return executor is None or getattr(_worker, "executor", None) is executor
+
+
+class TaskGroup:
+    """简易版的asyncio.TaskGroup(python3.11才有), 用于结构化并发
+
+    - 退出async with时等待所有task完成
+    - 任意一个task出错时, 取消其余task, 并raise第一个出错的异常
+    - 外层被cancel时, 取消所有task后再抛出CancelledError
+
+    Usage::
+
+    >>> async with TaskGroup() as tg:
+    ...     task1 = tg.create_task(client.send_text("a", open_id=open_id))
+    ...     task2 = tg.create_task(client.send_text("b", open_id=open_id))
+    >>> message_ids = [task1.result(), task2.result()]
+    """
+
+    def __init__(self):
+        self.tasks: List[asyncio.Future] = []
+
+    def create_task(self, coro: Awaitable) -> asyncio.Future:
+        task = asyncio.ensure_future(coro)
+        self.tasks.append(task)
+        return task
+
+    def cancel(self):
+        for task in self.tasks:
+            if not task.done():
+                task.cancel()
+
+    def first_error(self) -> Optional[BaseException]:
+        """按创建顺序返回第一个出错task的异常, 并取出所有异常以免asyncio打warning"""
+        error = None
+        for task in self.tasks:
+            if task.done() and not task.cancelled() and task.exception() is not None and error is None:
+                error = task.exception()
+        return error
+
+    async def __aenter__(self) -> "TaskGroup":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.cancel()
+
+        try:
+            while True:
+                pending = [task for task in self.tasks if not task.done()]
+                if not pending:
+                    break
+                await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+                if self.first_error() is not None:
+                    self.cancel()
+        except asyncio.CancelledError:
+            self.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            raise
+
+        error = self.first_error()
+        if exc_type is None and error is not None:
+            raise error
+        return False
+
+
+async def gather_async(calls: Iterable[Call], concurrency: int, return_exceptions: bool = False) -> list:
+    """在当前event_loop中并发执行, 同时最多concurrency个, 按输入顺序返回结果
+
+    return_exceptions为False时, 任意一个出错就取消其余调用并raise第一个异常
+    """
+    check_concurrency(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(call: Call):
+        async with semaphore:
+            return await (call() if callable(call) else call)
+
+    if return_exceptions:
+        return await asyncio.gather(*[run(call) for call in calls], return_exceptions=True)
+
+    async with TaskGroup() as tg:
+        tasks = [tg.create_task(run(call)) for call in calls]
+    return [task.result() for task in tasks]
+
+
+def gather_threaded(calls: Iterable[Callable], concurrency: int, return_exceptions: bool = False,
+                    executor: Optional[Executor] = None) -> list:
+    """同步版本的gather_async, 用线程池执行无参函数, 按输入顺序返回结果
+
+    return_exceptions为False时, 任意一个出错就不再执行尚未开始的调用, 等正在执行的结束后raise第一个异常
+
+    Args:
+        executor: 执行调用的线程池, 一般是client.gather_executor, 线程是长期存在的, 每个线程的requests.Session可以复用.
+            同时最多concurrency个调用在执行(也不会超过线程池的大小). 不提供时临时创建一个线程池
+    """
+    check_concurrency(concurrency)
+    calls = list(calls)
+    if not calls:
+        return []
+    if concurrency == 1 or len(calls) == 1:
+        if not return_exceptions:
+            return [call() for call in calls]
+        results = []
+        for call in calls:
+            try:
+                results.append(call())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    if _own_executor(executor):
+        with ThreadPoolExecutor(min(concurrency, len(calls)), thread_name_prefix="feishu-gather") as executor:
+            futures = _submit_bounded(executor, calls, concurrency, return_exceptions)
+    else:
+        futures = _submit_bounded(executor, calls, concurrency, return_exceptions)
+        wait(futures)
+
+    if return_exceptions:
+        return [future.exception() or future.result() for future in futures]
+
+    for future in futures:
+        if future.exception() is not None:
+            raise future.exception()
+    return [future.result() for future in futures]
+
+
+def _submit_bounded(executor: Executor, calls: List[Callable], concurrency: int,
+                    return_exceptions: bool) -> List[Future]:
+    """逐个提交到executor, 同时最多concurrency个在执行; return_exceptions为False时出错后不再提交"""
+    semaphore = threading.Semaphore(concurrency)
+    failed = threading.Event()
+
+    def done(future: Future):
+        if not return_exceptions and future.exception() is not None:
+            failed.set()
+        semaphore.release()
+
+    futures = []
+    for call in calls:
+        semaphore.acquire()
+        if failed.is_set():
+            semaphore.release()
+            break
+        future = executor.submit(_run_in_worker, executor, call)
+        future.add_done_callback(done)
+        futures.append(future)
+    return futures
+
+
+def imap_threaded(func: Callable[[T], Any], items: Iterable[T], concurrency: int,
+                  executor: Optional[Executor] = None) -> Iterator[Tuple[T, Union[Any, Exception]]]:
+    """惰性版本的gather_threaded, 按输入顺序逐个yield (item, 结果或异常)
+
+    items只在有空闲并发时才被读取, 同时最多concurrency个调用在执行, 所以items可以是无限长的generator,
+    内存占用和items的长度无关. executor同gather_threaded
+    """
+    check_concurrency(concurrency)
+    if _own_executor(executor):
+        return _imap_own_executor(func, items, concurrency)
+    return _imap_threaded(func, items, concurrency, executor)
+
+
+def _imap_own_executor(func: Callable[[T], Any], items: Iterable[T],
+                       concurrency: int) -> Iterator[Tuple[T, Union[Any, Exception]]]:
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="feishu-imap") as executor:
+        yield from _imap_threaded(func, items, concurrency, executor)
+
+
+def _imap_threaded(func: Callable[[T], Any], items: Iterable[T], concurrency: int,
+                   executor: Executor) -> Iterator[Tuple[T, Union[Any, Exception]]]:
+    window = deque()
+    try:
+        for item in items:
+            if len(window) >= concurrency:
+                yield _future_result(*window.popleft())
+            window.append((item, executor.submit(_run_in_worker, executor, func, item)))
+        while window:
+            yield _future_result(*window.popleft())
+    finally:
+        # 调用方提前break时, 尚未开始的调用不再执行
+        for _, future in window:
+            future.cancel()
+
+
+def _future_result(item, future) -> tuple:
+    try:
+        return item, future.result()
+    except Exception as e:
+        return item, e
+
+
+def imap_async(func: Callable[[T], Awaitable], items: Union[Iterable[T], AsyncIterable[T]],
+               concurrency: int) -> AsyncIterator[Tuple[T, Union[Any, Exception]]]:
+    """惰性版本的gather_async, 按输入顺序逐个yield (item, 结果或异常), items也可以是async iterable"""
+    check_concurrency(concurrency)
+    return _imap_async(func, items, concurrency)
+
+
+async def _imap_async(func: Callable[[T], Awaitable], items: Union[Iterable[T], AsyncIterable[T]],
+                      concurrency: int) -> AsyncIterator[Tuple[T, Union[Any, Exception]]]:
+    window = deque()
+    try:
+        async for item in aiterate(items):
+            if len(window) >= concurrency:
+                yield await _task_result(*window.popleft())
+            window.append((item, asyncio.ensure_future(func(item))))
+        while window:
+            yield await _task_result(*window.popleft())
+    finally:
+        for _, task in window:
+            task.cancel()
+
+
+async def _task_result(item, task) -> tuple:
+    try:
+        return item, await task
+    except Exception as e:
+        return item, e
+
+
+async def aiterate(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[T]:
+    """把普通的iterable也当作async iterable遍历"""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
@@ -5,6 +5,14 @@ from enum import Enum
 FEISHU_TOKEN_EXPIRE_TIME = 7200  # token时效, https://open.feishu.cn/document/ukTMukTMukTM/uIjNz4iM2MjLyYzM
 FEISHU_TOKEN_UPDATE_TIME = 600  # token提前更新的时间
 FEISHU_BATCH_SEND_SIZE = 200  # 批量发送消息列表的大小限制
+FEISHU_CONCURRENCY = 10  # 批量/并发调用时默认的最大并发请求数
+FEISHU_GATHER_THREADS = 32  # 同步模式下gather/imap共用的线程池大小, 也是这两者实际能达到的最大并发数
+FEISHU_IDEMPOTENCY_TTL = 86400  # 幂等key的默认有效期
+FEISHU_CACHE_PENDING_TTL = 60  # cached_call执行期间占用key的有效期, 执行的进程崩溃时, 过期后其他进程才会重新执行
+FEISHU_RATE_LIMIT_ERROR = 99991400  # 飞书返回的请求频率超限错误码, 批量调用时会退避重试
+FEISHU_MAX_TEXT_BYTES = 150 * 1024  # 文本消息请求体的大小上限
+FEISHU_MAX_CARD_BYTES = 30 * 1024  # 卡片和富文本消息请求体的大小上限
+FEISHU_MAX_CARD_ELEMENTS = 50  # 卡片(每种语言)的模块数上限
 
 # 环境变量名
 FEISHU_APP_ID = "FEISHU_APP_ID"
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""同步应用中的后台发送
+
+Flask等同步应用里直接调用send_text会阻塞在飞书的网络延迟上,
+client.dispatcher把调用放进内存队列, 由后台线程池执行, 调用方立即拿到concurrent.futures.Future
+"""
+import atexit
+import os
+import queue
+import threading
+import weakref
+from concurrent.futures import Future
+from enum import Enum
+from functools import partial
+from typing import Optional, Callable, List
+
+from .errors import FeishuError, ERRORS
+
+# 放进队列表示worker应该退出
+_STOP = object()
+
+
+class OverflowPolicy(str, Enum):
+    """队列满了之后的处理方式"""
+    BLOCK = "block"  # 等待队列有空位, 最多等put_timeout秒, 超时则同RAISE
+    RAISE = "raise"  # 立即raise FeishuError(ERRORS.QUEUE_FULL)
+    DROP_NEWEST = "drop_newest"  # 丢弃新的调用, 返回的Future带有FeishuError(ERRORS.QUEUE_FULL)
+    DROP_OLDEST = "drop_oldest"  # 丢弃队列中最早的调用, 它的Future带有FeishuError(ERRORS.QUEUE_FULL)
+    CALLER_RUNS = "caller_runs"  # 在调用方线程中同步执行, 自然地给调用方降速
+
+    def __str__(self):
+        return self.value
+
+
+class Dispatcher:
+    """后台发送器, 通常通过client.dispatcher使用
+
+    Usage::
+
+    >>> future = client.dispatcher.send_text("hello", open_id=open_id)  # 立即返回
+    >>> future.add_done_callback(lambda f: print(f.result()))
+
+    >>> client.dispatcher = Dispatcher(client, workers=8, queue_size=10000, overflow="drop_oldest")
+    """
+
+    def __init__(self, client, workers: int = 4, queue_size: int = 1000,
+                 overflow: OverflowPolicy = OverflowPolicy.BLOCK, put_timeout: Optional[float] = None):
+        """初始化
+
+        Args:
+            client: FeishuClient, run_async必须为False
+            workers: 后台线程数
+            queue_size: 队列长度
+            overflow: 队列满了之后的处理方式, 见OverflowPolicy
+            put_timeout: overflow为BLOCK时最多等待的秒数, 默认一直等
+        """
+        assert not client.run_async, "异步模式的client不会阻塞调用方, 不需要dispatcher"
+        self.client = client
+        self.workers = workers
+        self.queue_size = queue_size
+        self.overflow = OverflowPolicy(overflow)
+        self.put_timeout = put_timeout
+        self.closed = False
+        self._reset()
+        _live_dispatchers.add(self)
+
+    def _reset(self):
+        self.queue: "queue.Queue" = queue.Queue(self.queue_size)
+        self.threads: List[threading.Thread] = []
+        self.lock = threading.Lock()
+
+    def _ensure_workers(self):
+        """调用方需要持有self.lock"""
+        for i in range(len(self.threads), self.workers):
+            thread = threading.Thread(target=self._work, name=f"feishu-dispatcher-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            future, fn = item
+            _run(future, fn)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """在后台执行fn(*args, **kwargs), 立即返回Future"""
+        future = Future()
+        item = (future, partial(fn, *args, **kwargs))
+        error = FeishuError(ERRORS.QUEUE_FULL, f"dispatcher队列已满(queue_size={self.queue_size})")
+        # 检查closed和放进队列都在self.lock中, shutdown放_STOP时也持有self.lock, 调用不会排在_STOP后面
+        with self.lock:
+            if self.closed:
+                raise FeishuError(ERRORS.DISPATCHER_CLOSED, "dispatcher已关闭")
+            self._ensure_workers()
+            try:
+                if self.overflow == OverflowPolicy.BLOCK:
+                    self.queue.put(item, timeout=self.put_timeout)
+                else:
+                    self.queue.put_nowait(item)
+                return future
+            except queue.Full:
+                pass
+            if self.overflow == OverflowPolicy.DROP_OLDEST:
+                self._put_dropping_oldest(item, error)
+                return future
+
+        if self.overflow in (OverflowPolicy.BLOCK, OverflowPolicy.RAISE):
+            raise error
+        if self.overflow == OverflowPolicy.CALLER_RUNS:
+            _run(*item)
+        elif self.overflow == OverflowPolicy.DROP_NEWEST:
+            self.client.logger.warning(f"dispatcher队列已满, 丢弃调用: {fn}")
+            future.set_exception(error)
+        return future
+
+    def _put_dropping_oldest(self, item: tuple, error: FeishuError):
+        """调用方需要持有self.lock"""
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            try:
+                dropped = self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            if dropped is _STOP:
+                # 不能丢弃worker的退出信号, 放回去; 正在关闭的dispatcher也不再接受新的调用
+                self.queue.put_nowait(_STOP)
+                item[0].set_exception(FeishuError(ERRORS.DISPATCHER_CLOSED, "dispatcher已关闭"))
+                return
+            dropped_future, dropped_fn = dropped
+            self.client.logger.warning(f"dispatcher队列已满, 丢弃最早的调用: {dropped_fn.func}")
+            if dropped_future.set_running_or_notify_cancel():
+                dropped_future.set_exception(error)
+
+    def __getattr__(self, name: str) -> Callable[..., Future]:
+        """client.dispatcher.send_text(...)相当于client.dispatcher.submit(client.send_text, ...)"""
+        if name.startswith("_") or name == "client":
+            raise AttributeError(name)
+        method = getattr(self.client, name)
+        if not callable(method):
+            raise AttributeError(name)
+        return partial(self.submit, method)
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """不再接受新的调用, wait为True时等待队列中的调用全部执行完"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            for _ in self.threads:
+                self.queue.put(_STOP)
+        if wait:
+            for thread in self.threads:
+                thread.join(timeout)
+
+    def _reset_after_fork(self):
+        """子进程中没有worker线程了, 父进程队列中的调用由父进程负责, 子进程从空队列重新开始"""
+        self._reset()
+
+
+def _run(future: Future, fn: Callable):
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(fn())
+    except BaseException as e:
+        future.set_exception(e)
+
+
+# 所有Dispatcher, 退出时把队列中的调用执行完, fork之后在子进程中重置
+_live_dispatchers: "weakref.WeakSet[Dispatcher]" = weakref.WeakSet()
+
+
+def _shutdown_dispatchers():
+    for dispatcher in list(_live_dispatchers):
+        dispatcher.shutdown(wait=True)
+
+
+def _reset_dispatchers_after_fork():
+    for dispatcher in list(_live_dispatchers):
+        dispatcher._reset_after_fork()
+
+
+atexit.register(_shutdown_dispatchers)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_dispatchers_after_fork)
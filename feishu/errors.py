@@ -22,3 +22,7 @@ class ERRORS(int, Enum):
     INVALID_IMAGE_FILE_OR_CONTENT = -5
     VALIDATION_ERROR = -6
     MISSING_ENCRYPT_KEY = -7
+    CLIENT_CLOSED = -8
+    QUEUE_FULL = -9
+    DISPATCHER_CLOSED = -10
+    LIMIT_EXCEEDED = -11
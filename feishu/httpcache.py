@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""HTTP条件请求缓存
+
+client.fetch_cached记录响应的ETag/Last-Modified, 下次请求同一个url时带上If-None-Match/If-Modified-Since,
+服务端返回304时直接使用本地保存的内容, 不用再下载一遍.
+响应内容按sha256保存在磁盘目录中, 总大小超过max_bytes时淘汰最久没有用到的
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from pydantic import BaseModel
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class CachedResponse(BaseModel):
+    """fetch_cached的结果"""
+    url: str
+    status: int
+    body: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    digest: str = ''  # body的sha256
+    not_modified: bool = False  # 服务端返回了304, body来自本地缓存
+
+    def validators(self) -> dict:
+        """条件请求的header"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HTTPCache:
+    """保存在磁盘目录中的HTTP缓存, 只缓存带ETag或Last-Modified的200响应
+
+    Usage::
+
+    >>> client = FeishuClient(http_cache=HTTPCache("/var/cache/feishu", max_bytes=100 * 1024 * 1024))
+    >>> client.send_image(image_url="https://example.com/logo.png", open_id=open_id)
+    """
+    blocking = True
+
+    def __init__(self, path: str = "feishu_http_cache", max_bytes: int = 256 * 1024 * 1024):
+        """初始化
+
+        Args:
+            path: 缓存目录, 不存在时会创建
+            max_bytes: 缓存内容的总大小上限
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite3"), isolation_level=None, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def _body_path(self, digest: str) -> str:
+        return os.path.join(self.path, digest)
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self.lock:
+            row = self.db.execute("SELECT etag, last_modified, digest FROM responses WHERE url = ?",
+                                  (url,)).fetchone()
+            if row is None:
+                return None
+            etag, last_modified, digest = row
+            try:
+                with open(self._body_path(digest), "rb") as f:
+                    body = f.read()
+            except FileNotFoundError:
+                self.db.execute("DELETE FROM responses WHERE url = ?", (url,))
+                return None
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        return CachedResponse(url=url, status=200, body=body, etag=etag, last_modified=last_modified, digest=digest)
+
+    def set(self, response: CachedResponse):
+        size = len(response.body)
+        if size > self.max_bytes or not (response.etag or response.last_modified):
+            return
+        with self.lock:
+            body_path = self._body_path(response.digest)
+            if not os.path.exists(body_path):
+                tmp_path = f"{body_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(response.body)
+                os.replace(tmp_path, body_path)
+            old = self.db.execute("SELECT digest FROM responses WHERE url = ?", (response.url,)).fetchone()
+            self.db.execute("INSERT OR REPLACE INTO responses (url, etag, last_modified, digest, size, accessed_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (response.url, response.etag, response.last_modified, response.digest, size, time.time()))
+            if old and old[0] != response.digest:
+                self._remove_body(old[0])
+            self._evict()
+
+    def _remove_body(self, digest: str):
+        """没有url再用到这个内容时删除文件, 调用方需要持有self.lock"""
+        if self.db.execute("SELECT 1 FROM responses WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+            return
+        try:
+            os.remove(self._body_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """总大小超过max_bytes时, 淘汰最久没有用到的, 调用方需要持有self.lock"""
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total > self.max_bytes:
+            url, digest, size = self.db.execute(
+                "SELECT url, digest, size FROM responses ORDER BY accessed_at LIMIT 1").fetchone()
+            self.db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._remove_body(digest)
+            total -= size
+
+    def close(self):
+        self.db.close()
+
+
+def to_cached_response(url: str, status: int, headers, body: bytes) -> CachedResponse:
+    """把HTTP响应转换为CachedResponse, headers需要大小写不敏感(requests和aiohttp的headers都是)"""
+    return CachedResponse(url=url, status=status, body=body, etag=headers.get("ETag"),
+                          last_modified=headers.get("Last-Modified"), digest=hashlib.sha256(body).hexdigest())
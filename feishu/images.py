@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""上传前的图片预处理
+
+PIL.Image/numpy数组编码成PNG或者JPEG(而不是tobytes()得到的原始像素), 按需缩小尺寸, 去掉EXIF等元数据,
+超过大小预算时依次尝试JPEG降低质量、缩小尺寸. 需要安装Pillow, bytes/fileobj不需要
+"""
+import io
+from enum import Enum
+from typing import Optional, Union, Any
+
+from pydantic import BaseModel
+
+from .errors import FeishuError, ERRORS
+
+# 飞书上传图片的大小上限
+FEISHU_MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+
+class ImageFormat(str, Enum):
+    AUTO = "auto"  # 默认PNG, 超过大小预算且没有透明通道时改用JPEG
+    PNG = "PNG"
+    JPEG = "JPEG"
+
+    def __str__(self):
+        return self.value
+
+
+class ImageOptions(BaseModel):
+    """图片预处理的配置"""
+    format: ImageFormat = ImageFormat.AUTO
+    max_dimension: Optional[int] = None  # 长边的最大像素数, 超过时等比缩小
+    max_bytes: Optional[int] = FEISHU_MAX_IMAGE_BYTES  # 编码后的大小预算
+    jpeg_quality: int = 85
+    min_jpeg_quality: int = 50  # 为了满足max_bytes最多把JPEG质量降到多少, 再不行就缩小尺寸
+
+
+def is_image_object(image: Any) -> bool:
+    """是否是需要编码的PIL.Image或numpy数组"""
+    module = type(image).__module__ or ''
+    return module.startswith("PIL.") or module == "numpy"
+
+
+def needs_encoding(image: Union[bytes, Any], options: ImageOptions) -> bool:
+    """是否需要(解码)编码, 在预算内的bytes直接上传"""
+    if isinstance(image, (bytes, bytearray)):
+        return options.max_bytes is not None and len(image) > options.max_bytes
+    return True
+
+
+def encode_image(image: Union[bytes, Any], options: Optional[ImageOptions] = None) -> bytes:
+    """把图片编码为适合上传的bytes
+
+    Args:
+        image: PIL.Image, numpy数组(HxW或HxWxC, uint8), 或者已经编码好的bytes.
+            bytes只有在超过max_bytes时才会解码重新编码
+        options: 预处理配置, 默认为ImageOptions()
+    """
+    options = options or ImageOptions()
+    if not needs_encoding(image, options):
+        return bytes(image)
+    if isinstance(image, (bytes, bytearray)):
+        image = _open(image)
+    elif not is_image_object(image):
+        raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT, f"不支持的图片类型: {type(image)}")
+    else:
+        image = _to_pil(image)
+
+    if options.max_dimension and max(image.size) > options.max_dimension:
+        image = _resize(image, options.max_dimension / max(image.size))
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    fmt = options.format
+    if fmt == ImageFormat.AUTO:
+        data = _save(image, ImageFormat.PNG, options.jpeg_quality)
+        if options.max_bytes is None or len(data) <= options.max_bytes or has_alpha:
+            fmt = ImageFormat.PNG
+        else:
+            fmt = ImageFormat.JPEG
+    if fmt == ImageFormat.JPEG and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    quality = options.jpeg_quality
+    while True:
+        data = _save(image, fmt, quality)
+        if options.max_bytes is None or len(data) <= options.max_bytes:
+            return data
+        if fmt == ImageFormat.JPEG and quality - 10 >= options.min_jpeg_quality:
+            quality -= 10
+        elif min(image.size) > 16:
+            image = _resize(image, 0.75)
+        else:
+            raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT,
+                              f"图片无法压缩到{options.max_bytes}字节以内: {len(data)}")
+
+
+def _pil():
+    try:
+        from PIL import Image
+    except ImportError:
+        raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT, "处理PIL.Image/numpy图片需要安装Pillow: pip install Pillow")
+    return Image
+
+
+def _open(data: bytes) -> "Image":
+    Image = _pil()
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception as e:
+        raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT, f"无法解析图片: {str(e)}")
+    return image
+
+
+def _to_pil(image: Any) -> "Image":
+    Image = _pil()
+    if isinstance(image, Image.Image):
+        return image
+    try:
+        return Image.fromarray(image)
+    except Exception as e:
+        raise FeishuError(ERRORS.INVALID_IMAGE_FILE_OR_CONTENT, f"无法把numpy数组转换为图片: {str(e)}")
+
+
+def _resize(image: "Image", scale: float) -> "Image":
+    Image = _pil()
+    size = (max(int(image.width * scale), 1), max(int(image.height * scale), 1))
+    return image.resize(size, Image.LANCZOS)
+
+
+def _save(image: "Image", fmt: ImageFormat, quality: int) -> bytes:
+    """编码, 除了透明色之外的元数据(EXIF/ICC/文本等)都不会写进去"""
+    buffer = io.BytesIO()
+    transparency = image.info.get("transparency")
+    image = image.copy()
+    image.info = {} if transparency is None else {"transparency": transparency}
+    if fmt == ImageFormat.JPEG:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    else:
+        if image.mode not in ("1", "L", "LA", "P", "RGB", "RGBA", "I", "I;16"):
+            image = image.convert("RGBA")
+        image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""发送前的本地限制检查
+
+飞书会拒绝过大的消息(文本超过150KB, 卡片/富文本超过30KB)、模块过多的卡片和超过200个的id列表,
+原来要等一次完整的HTTP往返才知道. 发送前把消息序列化一次, 同时得到请求体大小和元素数,
+超过client.limits时直接raise FeishuError(ERRORS.LIMIT_EXCEEDED), 不会发出请求, 序列化好的bytes直接作为请求体发送
+
+超长的文本和富文本也可以用split_message按行/元素拆分成多条, 见MessageAPI.send_text/send_post的split参数
+"""
+import json
+from typing import Optional, Dict, List, NamedTuple, Tuple, Any
+
+from pydantic import BaseModel
+
+from .consts import FEISHU_BATCH_SEND_SIZE, FEISHU_MAX_TEXT_BYTES, FEISHU_MAX_CARD_BYTES, FEISHU_MAX_CARD_ELEMENTS
+from .errors import FeishuError, ERRORS
+
+
+class MessageLimits(BaseModel):
+    """发送前检查的限制, 设为None表示不检查这一项
+
+    Usage::
+
+    >>> client = FeishuClient(limits=MessageLimits(max_card_elements=None))
+    """
+    max_text_bytes: Optional[int] = FEISHU_MAX_TEXT_BYTES
+    max_card_bytes: Optional[int] = FEISHU_MAX_CARD_BYTES
+    max_post_bytes: Optional[int] = FEISHU_MAX_CARD_BYTES
+    max_card_elements: Optional[int] = FEISHU_MAX_CARD_ELEMENTS  # 卡片每种语言的模块数
+    max_post_elements: Optional[int] = None  # 富文本每种语言的元素数
+    max_ids: Optional[int] = FEISHU_BATCH_SEND_SIZE  # batch_send每种id列表的长度
+
+    def max_bytes(self, msg_type: str) -> Optional[int]:
+        if msg_type == "text":
+            return self.max_text_bytes
+        if msg_type == "interactive":
+            return self.max_card_bytes
+        if msg_type == "post":
+            return self.max_post_bytes
+        return None
+
+    def max_elements(self, msg_type: str) -> Optional[int]:
+        if msg_type == "interactive":
+            return self.max_card_elements
+        if msg_type == "post":
+            return self.max_post_elements
+        return None
+
+
+class MessageStats(NamedTuple):
+    """消息的请求体大小和元素数"""
+    msg_type: str
+    size: int  # 请求体的字节数
+    elements: int  # 卡片的模块数/富文本的元素数, 多语言时取最多的那种语言
+
+
+def serialize_payload(payload: dict) -> bytes:
+    """序列化为请求体, 和实际发送的完全一致"""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def count_elements(payload: dict) -> int:
+    """卡片的模块数或富文本的元素数, 只看列表长度, 不需要遍历元素"""
+    msg_type = payload.get("msg_type")
+    if msg_type == "interactive":
+        card = payload.get("card") or {}
+        groups = [card.get("elements")] + list((card.get("i18n_elements") or {}).values())
+        return max(len(group or []) for group in groups)
+    if msg_type == "post":
+        post = (payload.get("content") or {}).get("post") or {}
+        return max([sum(len(row) for row in (lang or {}).get("content") or []) for lang in post.values()] or [0])
+    return 0
+
+
+def check_ids(ids: Dict[str, List[str]], limits: MessageLimits):
+    for name, values in ids.items():
+        if limits.max_ids is not None and len(values) > limits.max_ids:
+            raise FeishuError(ERRORS.LIMIT_EXCEEDED,
+                              f"{name}最多{limits.max_ids}个, 实际{len(values)}个, 可以用batch_send_all自动拆分")
+
+
+def check_stats(stats: MessageStats, limits: MessageLimits):
+    max_bytes = limits.max_bytes(stats.msg_type)
+    if max_bytes is not None and stats.size > max_bytes:
+        raise FeishuError(ERRORS.LIMIT_EXCEEDED,
+                          f"{stats.msg_type}消息的请求体最大{max_bytes}字节, 实际{stats.size}字节")
+    max_elements = limits.max_elements(stats.msg_type)
+    if max_elements is not None and stats.elements > max_elements:
+        raise FeishuError(ERRORS.LIMIT_EXCEEDED,
+                          f"{stats.msg_type}消息最多{max_elements}个元素, 实际{stats.elements}个")
+
+
+# 分段发送时第二段开始会加上root_id, 给它预留的字节数
+ROOT_ID_RESERVE = len(',"root_id":""') + 64
+
+
+def json_size(value: Any) -> int:
+    """序列化后的字节数"""
+    return len(serialize_payload(value))
+
+
+def _char_size(char: str) -> int:
+    if char in '"\\' or char < " ":
+        return json_size(char) - 2
+    return len(char.encode("utf-8", "surrogatepass"))
+
+
+def _split_line(line: str, max_bytes: int) -> List[Tuple[str, int]]:
+    """按字符拆分一行, 返回(片段, 片段的字节数)"""
+    pieces, start, size = [], 0, 0
+    for i, char in enumerate(line):
+        char_size = _char_size(char)
+        if size + char_size > max_bytes and i > start:
+            pieces.append((line[start:i], size))
+            start, size = i, 0
+        size += char_size
+    pieces.append((line[start:], size))
+    return pieces
+
+
+def split_text(text: str, max_bytes: int) -> List[str]:
+    """按行把文本拆分成多段, 每段作为json字符串(不含引号)不超过max_bytes字节
+
+    单独一行就超过时再按字符拆分, 所有段拼起来和原文完全一致
+    """
+    chunks, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        line_size = json_size(line) - 2
+        pieces = [(line, line_size)] if line_size <= max_bytes else _split_line(line, max_bytes)
+        for piece, piece_size in pieces:
+            if current and size + piece_size > max_bytes:
+                chunks.append("".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += piece_size
+    if current or not chunks:
+        chunks.append("".join(current))
+    return chunks
+
+
+def _split_row(row: List[dict], max_bytes: int, max_elements: Optional[int]) -> List[List[dict]]:
+    """把富文本的一行按元素拆分成多行, 单个文本元素就超过时再拆分它的text"""
+    if json_size(row) <= max_bytes and (max_elements is None or len(row) <= max_elements):
+        return [row]
+    rows, current, size = [], [], 2
+    for element in row:
+        elements = [element]
+        element_size = json_size(element) + 1
+        if element_size + 2 > max_bytes and isinstance(element.get("text"), str):
+            budget = max_bytes - json_size({**element, "text": ""}) - 3
+            elements = [{**element, "text": text} for text in split_text(element["text"], budget)]
+        for element in elements:
+            element_size = json_size(element) + 1
+            if current and (size + element_size > max_bytes or (max_elements and len(current) >= max_elements)):
+                rows.append(current)
+                current, size = [], 2
+            current.append(element)
+            size += element_size
+    if current:
+        rows.append(current)
+    return rows
+
+
+def _split_post_body(body: dict, max_bytes: int, max_elements: Optional[int]) -> List[dict]:
+    """拆分一种语言的富文本, 标题只放在第一段"""
+    title = body.get("title")
+    extra = {key: value for key, value in body.items() if key not in ("title", "content")}
+    budgets = [max_bytes - (json_size(title) + len(',"title":') if title else 0), max_bytes]
+    chunks, current, size, elements = [], [], 2, 0
+    for row in body.get("content") or []:
+        for piece in _split_row(row, max_bytes - 2, max_elements):
+            piece_size = json_size(piece) + 1
+            budget = budgets[1 if chunks else 0]
+            if current and (size + piece_size > budget or (max_elements and elements + len(piece) > max_elements)):
+                chunks.append(current)
+                current, size, elements = [], 2, 0
+            current.append(piece)
+            size += piece_size
+            elements += len(piece)
+    if current or not chunks:
+        chunks.append(current)
+    return [{**({"title": title} if title and index == 0 else {}), "content": rows, **extra}
+            for index, rows in enumerate(chunks)]
+
+
+def split_post(post: dict, max_bytes: int, max_elements: Optional[int] = None) -> List[dict]:
+    """按行/元素把富文本(Post的dict, e.g. {"zh_cn": {...}})拆分成多段
+
+    每种语言平分max_bytes, 分别拆分, 第i段包含每种语言的第i段(某种语言段数较少时后面的段就没有这种语言)
+    """
+    languages = {lang: body for lang, body in post.items() if body}
+    budget = max_bytes // max(len(languages), 1)
+    per_language = {lang: _split_post_body(body, budget, max_elements) for lang, body in languages.items()}
+    count = max([len(chunks) for chunks in per_language.values()] or [1])
+    return [{lang: chunks[index] for lang, chunks in per_language.items() if index < len(chunks)}
+            for index in range(count)]
+
+
+def split_message(payload: dict, limits: MessageLimits) -> List[dict]:
+    """把超过limits的文本/富文本消息(/message/v4/send/的dict)拆分成多条, 没有超过时返回[payload]
+
+    每一条都按第二条之后要加上root_id来预留空间, 其他类型的消息不拆分
+    """
+    msg_type = payload.get("msg_type", "")
+    msg_type = getattr(msg_type, "value", msg_type)
+    stats = message_stats(payload, serialize_payload(payload))
+    max_bytes = limits.max_bytes(msg_type)
+    max_elements = limits.max_elements(msg_type)
+    if (max_bytes is None or stats.size <= max_bytes) and (max_elements is None or stats.elements <= max_elements):
+        return [payload]
+    if max_bytes is None:
+        max_bytes = stats.size + ROOT_ID_RESERVE
+
+    content = payload.get("content") or {}
+    if msg_type == "text":
+        empty = {**payload, "content": {**content, "text": ""}}
+        budget = max_bytes - json_size(empty) - ROOT_ID_RESERVE
+        if budget > 0:
+            return [{**payload, "content": {**content, "text": text}} for text in split_text(content["text"], budget)]
+    elif msg_type == "post":
+        post = content.get("post") or {}
+        # 标题和内容都算在拆分的预算里, 其余部分是每一段都有的开销
+        empty_post = {lang: {**{key: value for key, value in body.items() if key != "title"}, "content": []}
+                      for lang, body in post.items() if body}
+        empty = {**payload, "content": {**content, "post": empty_post}}
+        budget = max_bytes - json_size(empty) - ROOT_ID_RESERVE
+        if budget > 0:
+            return [{**payload, "content": {**content, "post": chunk}}
+                    for chunk in split_post(post, budget, max_elements)]
+    else:
+        return [payload]
+    raise FeishuError(ERRORS.LIMIT_EXCEEDED, f"{msg_type}消息除了内容之外就已经超过了{max_bytes}字节, 无法拆分")
+
+
+def message_stats(payload: dict, body: bytes) -> MessageStats:
+    msg_type = payload.get("msg_type", "")
+    return MessageStats(getattr(msg_type, "value", msg_type), len(body), count_elements(payload))
+
+
+def preflight(payload: dict, limits: Optional[MessageLimits], ids: Optional[Dict[str, List[str]]] = None) -> bytes:
+    """检查限制并序列化, 返回请求体
+
+    Args:
+        payload: /message/v4/send/或/message/v4/batch_send/的dict
+        limits: 为None时只序列化, 不检查
+        ids: batch_send的id列表, 检查长度
+    """
+    if limits is not None and ids:
+        check_ids(ids, limits)
+    body = serialize_payload(payload)
+    if limits is not None:
+        check_stats(message_stats(payload, body), limits)
+    return body
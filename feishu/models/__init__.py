@@ -1,3 +1,55 @@
-from .events import *
-from .messages import *
-from .bots import *
\ No newline at end of file
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""飞书的各种数据类型
+
+models有几百个pydantic类, 全部import一遍很慢, 所以这里按名字懒加载:
+只用到事件回调的服务不会加载消息卡片, 只发消息的脚本也不会加载事件类型
+"""
+from importlib import import_module
+
+_bots = ("AddChatterResponse", "BotActivateStatus", "BotChatType", "BotInfo", "ChatInfo", "ChatMember", "ChatOp",
+         "ChatOperation", "ChatOperationResult", "ChatPagination", "ChatUpdateRequest", "CreateChatRequest",
+         "CreateChatResponse", "CreateChatResult", "I18Names", "RemoveChatterResponse")
+
+_events = ("Action", "AddBotEvent", "AppOpenEvent", "AppStatus", "AppStatusChangeEvent", "AppTicketEvent",
+           "AppUninstalledEvent", "Applicant", "Attendee", "BuyType", "CardAction", "ChatDisbandEvent",
+           "ChatI18Names", "ContactScopeChangeEvent", "DeptAddEvent", "Event", "EventChatType", "EventContent",
+           "EventMsgType", "EventReplyEvent", "EventType", "FileMessageEvent", "GroupSetting",
+           "GroupSettingUpdateEvent", "I18nResource", "ImageMessageEvent", "Installer", "LeaveApprovalEvent",
+           "LeaveApprovalV2Event", "MergeForwardMessageEvent", "MessageEvent", "MessageReadEvent", "Msg",
+           "Operator", "OrderPaidEvent", "OutApprovalEvent", "P2PChatCreateEvent", "PostMessageEvent",
+           "PricePlanType", "RemedyApprovalEvent", "RemoveBotEvent", "Schedule", "ShiftApprovalEvent",
+           "TextMessageEvent", "TimeUnit", "TripApprovalEvent", "User", "UserAddEvent", "UserChatEvent",
+           "UserChatEventType", "UserStatus", "UserStatusChangeEvent", "WorkApprovalEvent")
+
+_batch = ("BatchFailure", "ImageUploadResult", "Progress", "SendResult")
+
+# 名字 -> 子模块, 其余的名字默认在messages中, 找不到再依次查找其他子模块
+_lazy_attrs = dict([(name, ".bots") for name in _bots] + [(name, ".events") for name in _events]
+                   + [(name, ".batch") for name in _batch])
+
+_submodules = (".messages", ".bots", ".events", ".batch")
+
+
+def __getattr__(name: str):
+    if name == "__all__":
+        names = []
+        for submodule in _submodules:
+            module = import_module(submodule, __name__)
+            names.extend(n for n in dir(module) if not n.startswith("_"))
+        return names
+
+    submodules = _submodules
+    if name in _lazy_attrs:
+        submodules = (_lazy_attrs[name],)
+    elif name in ("batch", "bots", "events", "messages"):
+        return import_module("." + name, __name__)
+
+    for submodule in submodules:
+        module = import_module(submodule, __name__)
+        if hasattr(module, name):
+            value = getattr(module, name)
+            globals()[name] = value
+            return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
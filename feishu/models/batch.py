@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""批量接口的公共类型"""
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class BatchFailure(BaseModel):
+    """批量接口拆分后, 某一批请求的失败信息, 其他批次不受影响, 可以只重试失败的这一批"""
+    index: int  # 第几批, 从0开始
+    code: int
+    msg: str
+    department_ids: List[str] = []
+    open_ids: List[str] = []
+    user_ids: List[str] = []
+
+
+class SendResult(BaseModel):
+    """逐个发送(fan out)时, 一个接收者的结果, 见MessageAPI.fan_out"""
+    index: int  # 在targets中的序号, 从0开始
+    target: dict  # 接收者, e.g. {"open_id": "ou_xxx"}
+    ok: bool = True
+    message_id: str = ''
+    code: int = 0
+    msg: str = ''
+
+
+class ImageUploadResult(BaseModel):
+    """批量上传图片时, 一张图片的结果, 见MessageAPI.upload_images"""
+    index: int  # 在images中的序号, 从0开始
+    ok: bool = True
+    image_key: str = ''
+    code: int = 0
+    msg: str = ''
+
+
+class Progress(BaseModel):
+    """长时间批量任务的进度"""
+    total: Optional[int] = None  # targets不知道长度(e.g. generator)时为None
+    done: int = 0
+    succeeded: int = 0
+    failed: int = 0
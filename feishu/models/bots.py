@@ -2,10 +2,12 @@
 # -*- coding: utf-8 -*-
 """Bot类型"""
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Dict
 
 from pydantic import BaseModel
 
+from .batch import BatchFailure
+
 
 class BotActivateStatus(int, Enum):
     """
@@ -81,7 +83,7 @@ class CreateChatRequest(BaseModel):
     description: str = ''
     open_ids: List[str] = []
     user_ids: List[str] = []
-    i18_names: I18Names
+    i18n_names: Dict[str, str] = {}
     only_owner_add: bool = False
     share_allowed: bool = True
     only_owner_at_all: bool = False
@@ -103,12 +105,22 @@ class CreateChatResponse(BaseModel):
     chat_id: str = ''
     invalid_open_ids: List[str] = []
     invalid_user_ids: List[str] = []
+    failures: List[BatchFailure] = []  # 拆分成多个请求时, 失败的那些批次
 
 
 AddChatterResponse = CreateChatResponse
 RemoveChatterResponse = CreateChatResponse
 
 
+class CreateChatResult(BaseModel):
+    """按清单批量创建群时, 一个群的结果, 见BotAPI.create_chats"""
+    index: int  # 在清单中的序号, 从0开始
+    ok: bool = True
+    code: int = 0
+    msg: str = ''
+    response: Optional[CreateChatResponse] = None
+
+
 class ChatMember(BaseModel):
     open_id: str
     user_id: str
@@ -186,3 +198,36 @@ class ChatUpdateRequest(BaseModel):
     share_allowed: Optional[bool] = None
     only_owner_at_all: Optional[bool] = None
     only_owner_edit: Optional[bool] = None
+
+
+class ChatOp(str, Enum):
+    """批量群管理支持的操作, 见BotAPI.bulk_chat_operations"""
+    ADD_BOT = "add_bot"
+    REMOVE_BOT = "remove_bot"
+    UPDATE = "update"  # params同update_chat_info
+    RENAME = "rename"  # params: name, i18n_names
+    TRANSFER_OWNER = "transfer_owner"  # params: owner_open_id或owner_user_id
+    DISBAND = "disband"
+
+    def __str__(self):
+        return self.value
+
+
+class ChatOperation(BaseModel):
+    """一个群管理操作
+
+    e.g. ChatOperation(op="rename", params={"name": "新群名"})
+    """
+    op: ChatOp
+    params: dict = {}
+
+
+class ChatOperationResult(BaseModel):
+    """批量群管理中一项操作的结果"""
+    index: int  # 在输入中的序号, 从0开始
+    chat_id: str
+    op: Optional[ChatOp] = None  # 操作的格式不对时为None
+    ok: bool = True
+    skipped: bool = False  # 断点续跑时, 上次已经成功而跳过的项
+    code: int = 0
+    msg: str = ''
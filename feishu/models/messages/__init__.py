@@ -8,4 +8,5 @@ from .card import *
 from .message import (Message, TextMessage, ImageMessage, PostMessage, ShareChatMessage,
                       Content, PostContent, ImageContent, ShareChatContent, TextContent,
                       SendMsgType, ReadUser, PostTag, PostElement, Post, PostAElement, PostAtElement, PostImgElement,
-                      PostTextElement, I18nPost, BatchMessage, BatchSendResponse)
+                      PostTextElement, I18nPost, BatchMessage, BatchFailure, BatchSendResponse,
+                      SplitSendResponse)
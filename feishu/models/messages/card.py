@@ -5,13 +5,19 @@
 https://open.feishu.cn/document/ukTMukTMukTM/uczM3QjL3MzN04yNzcDN
 """
 from enum import Enum
-from typing import List, Optional, Union, Literal
+from typing import List, Optional, Union, Literal, Any
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, root_validator
 
 from .message import SendMsgType
 
 
+def _require_img_key(cls, values: dict) -> dict:
+    if not values.get("img_key") and values.get("img_source") is None:
+        raise ValueError("img_key和img_source必须提供一个")
+    return values
+
+
 class CardTag(str, Enum):
     # tag for TextObject
     PLAIN_TEXT = "plain_text"
@@ -197,8 +203,12 @@ class CardImageElement(CardElement):
     }
     """
     tag: Literal[CardTag.IMG] = CardTag.IMG
-    img_key: str
+    img_key: str = ''
     alt: CardTextObject
+    # 图片来源, 可以是本地路径, http(s)链接, bytes, fileobj或PIL.Image, send_card时会上传并替换为img_key
+    img_source: Any = None
+
+    _check_img_key = root_validator(skip_on_failure=True, allow_reuse=True)(_require_img_key)
 
 
 class CardButtonElement(CardElement):
@@ -462,10 +472,14 @@ class CardImgModule(CardModule):
     }
     """
     tag: Literal[CardTag.IMG] = CardTag.IMG
-    img_key: str
+    img_key: str = ''
     alt: CardTextObject
     title: Optional[CardTextObject] = None
     mode: Optional[CardImgMode] = None
+    # 同CardImageElement.img_source
+    img_source: Any = None
+
+    _check_img_key = root_validator(skip_on_failure=True, allow_reuse=True)(_require_img_key)
 
 
 class CardActionModule(CardModule):
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from enum import Enum
-from typing import List, Union, Optional
+from typing import List, Union, Optional, Literal, Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, root_validator, validator
+
+from ..batch import BatchFailure
 
 
 class SendMsgType(str, Enum):
@@ -49,7 +51,7 @@ class PostTextElement(PostElement):
         "text": "第一行&nbsp;:"
     }
     """
-    tag: PostTag = PostTag.TEXT
+    tag: Literal[PostTag.TEXT] = PostTag.TEXT
     text: str
     un_escape: Optional[bool] = None
 
@@ -62,7 +64,7 @@ class PostAElement(PostElement):
         "href": "http://www.feishu.cn"
     }
     """
-    tag: PostTag = PostTag.A
+    tag: Literal[PostTag.A] = PostTag.A
     text: str
     href: str
     un_escape: Optional[bool] = None
@@ -77,7 +79,7 @@ class PostAtElement(PostElement):
         "user_id": "ou_18eac85d35a26f989317ad4f02e8bbbb"
     }
     """
-    tag: PostTag = PostTag.AT
+    tag: Literal[PostTag.AT] = PostTag.AT
     user_id: str
 
 
@@ -91,10 +93,41 @@ class PostImgElement(PostElement):
         "height": 300
     }
     """
-    tag: PostTag = PostTag.IMG
-    image_key: str
+    tag: Literal[PostTag.IMG] = PostTag.IMG
+    image_key: str = ''
     height: int
     width: int
+    # 图片来源, 可以是本地路径, http(s)链接, bytes, fileobj或PIL.Image, send_post时会上传并替换为image_key
+    image_source: Any = None
+
+    @root_validator(skip_on_failure=True)
+    def require_image_key(cls, values: dict) -> dict:
+        if not values.get("image_key") and values.get("image_source") is None:
+            raise ValueError("image_key和image_source必须提供一个")
+        return values
+
+
+PostGenericElement = Union[PostTextElement, PostAElement, PostAtElement, PostImgElement]
+
+POST_ELEMENTS = {
+    PostTag.TEXT: PostTextElement,
+    PostTag.A: PostAElement,
+    PostTag.AT: PostAtElement,
+    PostTag.IMG: PostImgElement,
+}
+
+
+def parse_post_element(element: Any) -> PostElement:
+    """按tag解析成对应的元素, tag未知或者字段不对时raise"""
+    if isinstance(element, PostElement):
+        return element
+    if not isinstance(element, dict):
+        raise TypeError(f"富文本元素必须是dict, 实际为{type(element).__name__}")
+    try:
+        element_cls = POST_ELEMENTS[PostTag(element.get("tag"))]
+    except ValueError:
+        raise ValueError(f"未知的富文本元素tag: {element.get('tag')!r}, 可选值为{[tag.value for tag in PostTag]}")
+    return element_cls(**element)
 
 
 class I18nPost(BaseModel):
@@ -145,19 +178,36 @@ class I18nPost(BaseModel):
     }
     """
     title: Optional[str] = None
-    content: List[List[PostElement]]
+    content: List[List[PostGenericElement]]
+
+    @validator("content", pre=True)
+    def parse_elements(cls, content: Any) -> Any:
+        # 按tag分派, 而不是依次尝试Union中的每一种, 出错时只报告对应元素类型的错误
+        if not isinstance(content, list):
+            return content
+        return [[parse_post_element(element) for element in row] if isinstance(row, list) else row
+                for row in content]
 
 
 class Post(BaseModel):
     """ 这里暂未处理i18n相关, 其实可以都列一下 """
-    zh_cn: Optional[Union[I18nPost, dict]] = None
-    en_us: Optional[Union[I18nPost, dict]] = None
+    zh_cn: Optional[I18nPost] = None
+    en_us: Optional[I18nPost] = None
+
+    @validator("zh_cn", "en_us", pre=True)
+    def empty_as_none(cls, value: Any) -> Any:
+        # 空的语言当作没有提供, 格式不对的语言直接raise, 不会原样发给飞书
+        return value or None
 
 
 class PostContent(Content):
     post: Post
 
 
+# 接收者的字段, 优先级从高到低
+RECIPIENT_FIELDS = ("chat_id", "open_id", "user_id", "email")
+
+
 class Message(BaseModel):
     """消息基类
 
@@ -319,8 +369,19 @@ class BatchSendResponse(BaseModel):
         "message_id": "bm-d4be107c616aed9c1da8ed8068570a9f"
     }
     """
-    message_id: str
+    message_id: str = ''
     message_ids: List[str] = []  # 拆分成多个请求的话会有多个message_id
     invalid_department_ids: List[str] = []
     invalid_open_ids: List[str] = []
     invalid_user_ids: List[str] = []
+    failures: List[BatchFailure] = []  # 拆分成多个请求时, 失败的那些批次
+
+
+class SplitSendResponse(BaseModel):
+    """超长消息分段发送的结果, 见MessageAPI.send_chunks"""
+    message_id: str = ''  # 第一段的message_id, 没有指定root_id时之后的段都回复在它下面
+    message_ids: List[str] = []  # 按顺序每一段的message_id
+    chunks: int = 0  # 拆分成了几段
+    ok: bool = True
+    code: int = 0  # 某一段发送失败时的错误, 之后的段不再发送
+    msg: str = ''
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""基于SQLite的持久化发件箱
+
+send/send_card先写入本地SQLite, 立即返回outbox id, 再由后台的worker线程按限流速率发送, 失败时退避重试.
+进程重启或者被飞书限流时, 排队中的消息不会丢失, 突发的流量会被削平
+"""
+import json
+import sqlite3
+import threading
+import time
+from enum import Enum
+from typing import Optional, Union, List
+
+from pydantic import BaseModel
+
+from .apis.card import create_card_message
+from .apis.message import create_message
+from .consts import FEISHU_RATE_LIMIT_ERROR
+from .errors import FeishuError, ERRORS
+from .models import Message, SendMsgType, TextContent, CardContent
+from .ratelimit import RateLimiter
+
+# 这些错误重试可能会成功, 其他错误(e.g. 用户不存在)直接标记为失败
+RETRYABLE_ERRORS = (FEISHU_RATE_LIMIT_ERROR, ERRORS.FAILED_TO_ESTABLISH_CONNECTION,
+                    ERRORS.UNABLE_TO_PARSE_SERVER_RESPONSE, ERRORS.UNKNOWN_SERVER_ERROR)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    message_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, next_attempt_at);
+"""
+
+
+class OutboxStatus(str, Enum):
+    PENDING = "pending"  # 等待发送(包括等待重试)
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"  # 不可重试的错误, 或者重试次数用完
+
+    def __str__(self):
+        return self.value
+
+
+class OutboxRecord(BaseModel):
+    """发件箱中的一条消息"""
+    id: int
+    payload: dict
+    status: OutboxStatus
+    attempts: int = 0
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+class Outbox:
+    """持久化发件箱, 只支持同步模式的FeishuClient
+
+    消息至少发送一次: 如果进程在发送请求之后、记录结果之前崩溃, 重启后这条消息会再发一次
+
+    Usage::
+
+    >>> outbox = Outbox(client, "outbox.sqlite3", workers=4, rate_limiter=RateLimiter(50))
+    >>> outbox.start()
+    >>> outbox_id = outbox.send_text("hello", open_id="ou_xxx")  # 立即返回
+    >>> outbox.drain(timeout=60)
+    >>> outbox.get(outbox_id).message_id
+    >>> outbox.stop()
+    """
+
+    def __init__(self, client, path: str = "feishu_outbox.sqlite3", workers: int = 4,
+                 rate_limiter: Optional[RateLimiter] = None, max_attempts: int = 5,
+                 backoff: float = 1, poll_interval: float = 1):
+        """初始化
+
+        Args:
+            client: FeishuClient, run_async必须为False
+            path: SQLite文件路径
+            workers: 发送的线程数
+            rate_limiter: 限制发送速率
+            max_attempts: 每条消息最多尝试发送的次数
+            backoff: 第n次重试前等待backoff * 2 ** (n - 1)秒
+            poll_interval: 没有待发送消息时, 多久检查一次(等待重试的)消息
+        """
+        assert not client.run_async, "Outbox只支持同步模式的FeishuClient"
+        self.client = client
+        self.path = path
+        self.workers = workers
+        self.rate_limiter = rate_limiter
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.threads: List[threading.Thread] = []
+        self.stopping = False
+
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        # 上次进程崩溃时正在发送的消息, 不知道到底发出去没有, 重新排队
+        self.db.execute("UPDATE outbox SET status = ? WHERE status = ?", (OutboxStatus.PENDING, OutboxStatus.SENDING))
+
+    # ---- 入队 ----
+
+    def enqueue(self, payload: dict) -> int:
+        """把/message/v4/send/的payload写入发件箱, 返回outbox id"""
+        now = time.time()
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO outbox (payload, status, next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (json.dumps(payload, ensure_ascii=False), OutboxStatus.PENDING, now, now, now))
+            self.wakeup.notify()
+        return cursor.lastrowid
+
+    def send(self, message: Union[Message, BaseModel, dict]) -> int:
+        """同MessageAPI.send, 但是返回outbox id, message也可以是CardMessage"""
+        return self.enqueue(message.dict(exclude_none=True) if isinstance(message, BaseModel) else message)
+
+    def send_text(self, text: str, open_id: str = '', user_id: str = '', email: str = '',
+                  chat_id: str = '', root_id: str = '') -> int:
+        """同MessageAPI.send_text, 但是返回outbox id"""
+        msg = create_message(SendMsgType.TEXT, content=TextContent(text=text),
+                             root_id=root_id, chat_id=chat_id, open_id=open_id, user_id=user_id, email=email)
+        return self.send(msg)
+
+    def send_card(self, card: Union[dict, CardContent], update_multi: Optional[bool] = None,
+                  open_id: str = '', user_id: str = '', email: str = '', chat_id: str = '', root_id: str = '') -> int:
+        """同CardAPI.send_card, 但是返回outbox id, 卡片中的img_source会在入队前上传"""
+        msg = create_card_message(card, update_multi=update_multi, root_id=root_id,
+                                  chat_id=chat_id, open_id=open_id, user_id=user_id, email=email)
+        return self.enqueue(self.client.resolve_images(msg.dict(exclude_none=True)))
+
+    # ---- 查询 ----
+
+    def get(self, outbox_id: int) -> Optional[OutboxRecord]:
+        with self.lock:
+            row = self.db.execute("SELECT * FROM outbox WHERE id = ?", (outbox_id,)).fetchone()
+        if row is None:
+            return None
+        return OutboxRecord(**{**dict(row), "payload": json.loads(row["payload"])})
+
+    def count(self, *statuses: OutboxStatus) -> int:
+        """某些状态的消息数量, 不传则为全部"""
+        sql, args = "SELECT COUNT(*) FROM outbox", ()
+        if statuses:
+            sql += f" WHERE status IN ({', '.join('?' * len(statuses))})"
+            args = tuple(str(status) for status in statuses)
+        with self.lock:
+            return self.db.execute(sql, args).fetchone()[0]
+
+    # ---- 发送 ----
+
+    def start(self) -> "Outbox":
+        """启动worker线程"""
+        with self.lock:
+            self.stopping = False
+            self.threads = [t for t in self.threads if t.is_alive()]
+            for i in range(self.workers - len(self.threads)):
+                thread = threading.Thread(target=self._work, name=f"feishu-outbox-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        return self
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """取出一条到期的待发送消息, 标记为sending, 调用方需要持有self.lock"""
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute(
+                "SELECT id, payload, attempts FROM outbox WHERE status = ? AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT 1", (OutboxStatus.PENDING, now)).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE outbox SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                                (OutboxStatus.SENDING, now, row["id"]))
+        finally:
+            self.db.execute("COMMIT")
+        return row
+
+    def _work(self):
+        while True:
+            with self.lock:
+                row = None
+                while not self.stopping:
+                    row = self._claim()
+                    if row is not None:
+                        break
+                    self.wakeup.wait(self.poll_interval)
+                if row is None:
+                    return
+            self._deliver(row["id"], json.loads(row["payload"]), row["attempts"] + 1)
+
+    def _deliver(self, outbox_id: int, payload: dict, attempt: int):
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        try:
+            message_id = self.client.send(payload)
+        except FeishuError as e:
+            retry = e.code in RETRYABLE_ERRORS and attempt < self.max_attempts
+            self._update(outbox_id, status=OutboxStatus.PENDING if retry else OutboxStatus.FAILED,
+                         error=f"{e.code}: {e.msg}",
+                         next_attempt_at=time.time() + self.backoff * 2 ** (attempt - 1))
+        except Exception as e:
+            self.client.logger.exception(f"发件箱发送失败(id={outbox_id})")
+            self._update(outbox_id, status=OutboxStatus.FAILED, error=repr(e))
+        else:
+            self._update(outbox_id, status=OutboxStatus.SENT, message_id=message_id, error=None)
+
+    def _update(self, outbox_id: int, **values):
+        values["updated_at"] = time.time()
+        columns = ", ".join(f"{key} = ?" for key in values)
+        with self.lock:
+            self.db.execute(f"UPDATE outbox SET {columns} WHERE id = ?",
+                            tuple(str(v) if isinstance(v, Enum) else v for v in values.values()) + (outbox_id,))
+            # 重试的消息可能已经到期, 让空闲的worker重新检查
+            self.wakeup.notify()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """等待所有待发送(包括等待重试)的消息处理完, 返回是否在timeout内处理完"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.count(OutboxStatus.PENDING, OutboxStatus.SENDING):
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止worker线程, 正在发送的消息会发完, 未发送的消息留在发件箱中, 下次start时继续"""
+        with self.lock:
+            self.stopping = True
+            self.wakeup.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def close(self):
+        self.stop()
+        self.db.close()
+
+    def __enter__(self) -> "Outbox":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""分页接口的通用迭代器
+
+飞书的分页接口都是 page_size/page_token 入参, has_more/page_token 出参,
+Paginator把它们包装成一个逐条返回的iterator, 在调用方处理当前页时预取下一页
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Iterator, AsyncIterator, Any
+
+from .responses import get_field
+
+
+class Paginator:
+    """分页迭代器, 同步模式下用`for`, 异步模式下用`async for`, 可以重复遍历, 每次都从头开始
+
+    Usage::
+
+    >>> for chat in client.iter_chats(page_size=200, max_items=1000):
+    ...     print(chat.chat_id)
+
+    >>> async for chat in async_client.iter_chats():
+    ...     print(chat.chat_id)
+
+    >>> for page in client.iter_chats().pages():
+    ...     print(len(page.groups))
+    """
+
+    def __init__(self, fetch_page: Callable[[str, int], Any], items_field: str,
+                 page_size: int = 100, max_items: Optional[int] = None, prefetch: bool = True):
+        """初始化
+
+        Args:
+            fetch_page: fetch_page(page_token, page_size)返回一页, 页对象需要有has_more/page_token以及items_field字段,
+                可以是任意response_mode的结果(pydantic对象, LazyModel或dict), 异步模式下返回awaitable
+            items_field: 页对象中数据列表的字段名, e.g. ChatPagination的"groups"
+            page_size: 每页的数量
+            max_items: 最多返回多少条, 默认不限
+            prefetch: 是否在处理当前页时预取下一页
+        """
+        self.fetch_page = fetch_page
+        self.items_field = items_field
+        self.page_size = page_size
+        self.max_items = max_items
+        self.prefetch = prefetch
+
+    def _next_page_size(self, page, count: int) -> int:
+        """下一页要取多少条, 0表示没有下一页了"""
+        if page is not None and (not get_field(page, "has_more") or not get_field(page, "page_token")):
+            return 0
+        if self.max_items is None:
+            return self.page_size
+        return max(min(self.page_size, self.max_items - count), 0)
+
+    def pages(self) -> Iterator[Any]:
+        """逐页返回"""
+        executor = ThreadPoolExecutor(1, thread_name_prefix="feishu-paginator") if self.prefetch else None
+        future = None
+        try:
+            count = 0
+            page_token, page_size = '', self._next_page_size(None, 0)
+            while page_size:
+                page = future.result() if future else self.fetch_page(page_token, page_size)
+                future = None
+                count += len(get_field(page, self.items_field, []))
+                page_token, page_size = get_field(page, "page_token"), self._next_page_size(page, count)
+                if page_size and executor:
+                    future = executor.submit(self.fetch_page, page_token, page_size)
+                yield page
+        finally:
+            if future:
+                future.cancel()
+            if executor:
+                executor.shutdown(wait=False)
+
+    async def apages(self) -> AsyncIterator[Any]:
+        """逐页返回, 异步版本"""
+        task = None
+        try:
+            count = 0
+            page_token, page_size = '', self._next_page_size(None, 0)
+            while page_size:
+                page = await (task or self.fetch_page(page_token, page_size))
+                task = None
+                count += len(get_field(page, self.items_field, []))
+                page_token, page_size = get_field(page, "page_token"), self._next_page_size(page, count)
+                if page_size and self.prefetch:
+                    task = asyncio.ensure_future(self.fetch_page(page_token, page_size))
+                yield page
+        finally:
+            if task:
+                task.cancel()
+
+    def __iter__(self) -> Iterator[Any]:
+        pages = self.pages()
+        try:
+            count = 0
+            for page in pages:
+                for item in get_field(page, self.items_field, []):
+                    if self.max_items is not None and count >= self.max_items:
+                        return
+                    count += 1
+                    yield item
+        finally:
+            pages.close()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        pages = self.apages()
+        try:
+            count = 0
+            async for page in pages:
+                for item in get_field(page, self.items_field, []):
+                    if self.max_items is not None and count >= self.max_items:
+                        return
+                    count += 1
+                    yield item
+        finally:
+            await pages.aclose()
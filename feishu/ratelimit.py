@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""客户端限流
+
+飞书的API有频率限制(超限返回FEISHU_RATE_LIMIT_ERROR), 批量调用时用RateLimiter控制发送速率,
+call_with_rate_limit在被限流时退避重试
+"""
+import asyncio
+import threading
+import time
+from typing import Optional, Callable, Any
+
+from .consts import FEISHU_RATE_LIMIT_ERROR
+from .errors import FeishuError
+
+
+class RateLimiter:
+    """令牌桶限流, 线程安全, 同一个RateLimiter可以同时给同步和异步调用用
+
+    Usage::
+
+    >>> limiter = RateLimiter(50)  # 每秒50个请求
+    >>> limiter.acquire()  # 同步
+    >>> await limiter.acquire_async()  # 异步
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """初始化
+
+        Args:
+            rate: 每秒允许的请求数
+            burst: 允许的突发请求数, 默认为rate
+        """
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """预定一个令牌, 返回需要等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            # 令牌可以预支成负数, 后来的调用按顺序排在后面等待
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+def call_with_rate_limit(func: Callable, *args, rate_limiter: Optional[RateLimiter] = None,
+                         max_retries: int = 3, backoff: float = 1, **kwargs) -> Any:
+    """先从rate_limiter取令牌再调用func, 被飞书限流时按backoff指数退避, 最多重试max_retries次"""
+    for retry in range(max_retries + 1):
+        if rate_limiter:
+            rate_limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except FeishuError as e:
+            if e.code != FEISHU_RATE_LIMIT_ERROR or retry >= max_retries:
+                raise
+        time.sleep(backoff * 2 ** retry)
+
+
+async def call_with_rate_limit_async(func: Callable, *args, rate_limiter: Optional[RateLimiter] = None,
+                                     max_retries: int = 3, backoff: float = 1, **kwargs) -> Any:
+    """call_with_rate_limit的异步版本, func返回awaitable"""
+    for retry in range(max_retries + 1):
+        if rate_limiter:
+            await rate_limiter.acquire_async()
+        try:
+            return await func(*args, **kwargs)
+        except FeishuError as e:
+            if e.code != FEISHU_RATE_LIMIT_ERROR or retry >= max_retries:
+                raise
+        await asyncio.sleep(backoff * 2 ** retry)
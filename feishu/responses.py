@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""API返回结果的构建方式
+
+默认把飞书返回的data构建成pydantic对象(BotInfo, ChatPagination等), 遍历几万个群时, 构建对象会占掉大部分CPU.
+client或者单次调用可以指定response_mode:
+
+- typed: 构建pydantic对象, 默认
+- raw: 直接返回飞书返回的dict, 不做任何校验
+- lazy: 返回LazyModel, 访问某个字段时才校验这个字段, 嵌套的对象(e.g. ChatPagination.groups)也是LazyModel
+
+Usage::
+
+>>> client = FeishuClient(response_mode="lazy")
+>>> for chat in client.iter_chats():
+...     print(chat.chat_id)  # 只校验chat_id
+
+>>> page = client.list_chat(response_mode="raw")
+>>> page["groups"][0]["chat_id"]
+"""
+from enum import Enum
+from typing import Any, Type, Union, Optional
+
+from pydantic import BaseModel, ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import MissingError
+from pydantic.fields import SHAPE_SINGLETON, SHAPE_LIST
+
+
+class ResponseMode(str, Enum):
+    TYPED = "typed"
+    RAW = "raw"
+    LAZY = "lazy"
+
+    def __str__(self):
+        return self.value
+
+
+class LazyModel:
+    """按需校验的pydantic对象, 字段第一次被访问时才校验(和model(**data)一样的规则), 之后缓存
+
+    校验失败时raise pydantic.ValidationError, 和typed模式一致. 可以给字段赋值, 赋的值不做校验
+    """
+    __slots__ = ("_model", "_data", "_values")
+
+    def __init__(self, model: Type[BaseModel], data: dict):
+        object.__setattr__(self, "_model", model)
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_values", {})
+
+    def __getattr__(self, name: str) -> Any:
+        values = self._values
+        if name in values:
+            return values[name]
+        field = self._model.__fields__.get(name)
+        if field is None:
+            raise AttributeError(f"'{self._model.__name__}' object has no attribute '{name}'")
+        if field.alias in self._data:
+            value = _validate_field(self._model, field, self._data[field.alias])
+        elif field.required:
+            raise ValidationError([ErrorWrapper(MissingError(), loc=name)], self._model)
+        else:
+            value = field.get_default()
+        values[name] = value
+        return value
+
+    def __setattr__(self, name: str, value: Any):
+        if name not in self._model.__fields__:
+            raise AttributeError(f"'{self._model.__name__}' object has no field '{name}'")
+        self._values[name] = value
+
+    def __getitem__(self, name: str) -> Any:
+        return getattr(self, name)
+
+    def __repr__(self):
+        return f"Lazy{self._model.__name__}({self._data!r})"
+
+    def __eq__(self, other):
+        if isinstance(other, LazyModel):
+            return self.dict() == other.dict()
+        return NotImplemented
+
+    def dict(self) -> dict:
+        """返回飞书返回的原始数据, 赋过值的字段以赋的值为准"""
+        data = dict(self._data)
+        for name, value in self._values.items():
+            data[self._model.__fields__[name].alias] = _to_raw(value)
+        return data
+
+    def to_model(self) -> BaseModel:
+        """校验所有字段, 转换为pydantic对象"""
+        return self._model(**self.dict())
+
+
+def _validate_field(model: Type[BaseModel], field, raw: Any) -> Any:
+    sub_model = field.type_
+    if isinstance(sub_model, type) and issubclass(sub_model, BaseModel):
+        # 嵌套的对象也延迟校验
+        if field.shape == SHAPE_SINGLETON and isinstance(raw, dict):
+            return LazyModel(sub_model, raw)
+        if field.shape == SHAPE_LIST and isinstance(raw, list) and all(isinstance(item, dict) for item in raw):
+            return [LazyModel(sub_model, item) for item in raw]
+    value, errors = field.validate(raw, {}, loc=field.name, cls=model)
+    if errors:
+        raise ValidationError([errors], model)
+    return value
+
+
+def _to_raw(value: Any) -> Any:
+    if isinstance(value, (LazyModel, BaseModel)):
+        return value.dict()
+    if isinstance(value, list):
+        return [_to_raw(item) for item in value]
+    return value
+
+
+def build_response(model: Type[BaseModel], data: dict, mode: Union[ResponseMode, str]) -> Any:
+    """按response_mode构建API的返回结果"""
+    mode = ResponseMode(mode)
+    if mode == ResponseMode.RAW:
+        return data
+    if mode == ResponseMode.LAZY:
+        return LazyModel(model, data)
+    return model(**data)
+
+
+def convert_response(response: BaseModel, mode: Union[ResponseMode, str]) -> Any:
+    """把本地构建好的pydantic对象(e.g. 合并多个请求的结果)转换为response_mode的形式
+
+    已经校验过的对象不需要延迟校验, lazy模式下原样返回
+    """
+    if ResponseMode(mode) == ResponseMode.RAW:
+        return response.dict()
+    return response
+
+
+def get_field(response: Any, name: str, default: Any = None) -> Any:
+    """从任意response_mode的结果中取字段"""
+    if isinstance(response, dict):
+        return response.get(name, default)
+    return getattr(response, name, default)
+
+
+def response_mode_of(client, mode: Optional[Union[ResponseMode, str]] = None) -> ResponseMode:
+    """单次调用指定的response_mode, 没有指定时用client的"""
+    return ResponseMode(mode or getattr(client, "response_mode", ResponseMode.TYPED))
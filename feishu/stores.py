@@ -8,6 +8,9 @@ from .consts import FEISHU_TOKEN_EXPIRE_TIME, FEISHU_TOKEN_UPDATE_TIME
 
 
 class TokenStore(ABC):
+    # get/set是否会阻塞(网络/磁盘IO), 异步client会把阻塞的调用放到线程池中执行
+    blocking = True
+
     @abstractmethod
     def get(self, key: str, value: str, expire: float = FEISHU_TOKEN_EXPIRE_TIME):
         pass
@@ -19,6 +22,7 @@ class TokenStore(ABC):
 
 class MemoryStore(TokenStore):
     """ 内存存储 """
+    blocking = False
     cache = {}
     timings = {}
 
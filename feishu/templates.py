@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""预编译的消息和卡片模板
+
+send_card每次都要构建CardMessage -> CardContent -> modules -> elements的pydantic对象, 再序列化成dict和json,
+给大量用户发个性化卡片, 或者把同一条消息发给上万个接收者时, 这部分CPU开销是大头.
+compile_card/compile_message只在编译时校验和序列化一次, 得到带命名占位符的json片段,
+之后每次发送只是把接收者和转义后的值拼进去
+
+Usage::
+
+>>> card = compile_card(CardContent(elements=[CardDivModule(text={"tag": "lark_md", "content": "你好, {{name}}"})]))
+>>> for user in users:
+...     client.send_compiled_card(card, {"name": user.name}, open_id=user.open_id)
+
+>>> notice = compile_message(TextMessage(content=TextContent(text="上线通知")))
+>>> client.batch_send_all(notice, open_ids=open_ids)  # 消息内容只序列化一次
+"""
+import json
+import re
+from typing import Union, Optional, Mapping, Any, List
+
+from pydantic import BaseModel
+
+from .errors import FeishuError, ERRORS
+from .limits import MessageStats, count_elements
+from .models import CardContent
+from .models.messages.message import RECIPIENT_FIELDS
+
+# 占位符, e.g. {{name}}, 只能出现在字符串值中
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+def escape_json_string(value: Any) -> str:
+    """值转为字符串后按json字符串转义, 不含两边的引号"""
+    return json.dumps(str(value), ensure_ascii=False)[1:-1]
+
+
+class CompiledMessage:
+    """编译好的消息, 不可变, 可以在多个线程中共享, 通过compile_message/compile_card创建
+
+    MessageAPI.send/batch_send/batch_send_all/fan_out都可以直接发送CompiledMessage
+    """
+
+    def __init__(self, literals: List[str], names: List[str], recipient: Optional[dict] = None,
+                 msg_type: str = '', elements: int = 0):
+        # 渲染结果为 literals[0] + value(names[0]) + literals[1] + ... + literals[-1] + 接收者字段 + "}"
+        self.literals = tuple(literals)
+        self.names = tuple(names)
+        self.placeholders = frozenset(names)
+        # 编译时消息中带的接收者和root_id, 渲染时没有指定接收者则用这里的
+        self.recipient = dict(recipient or {})
+        # 用于发送前的限制检查, 元素数在编译时就确定了, 大小要看渲染结果
+        self.msg_type = msg_type
+        self.elements = elements
+        # 没有占位符时, 消息内容部分直接缓存下来
+        self._body = self.literals[0] if not self.names else None
+
+    def _render_body(self, values: Mapping[str, Any]) -> str:
+        if self._body is not None:
+            return self._body
+        parts = [self.literals[0]]
+        try:
+            for name, literal in zip(self.names, self.literals[1:]):
+                parts.append(escape_json_string(values[name]))
+                parts.append(literal)
+        except KeyError as e:
+            raise FeishuError(ERRORS.VALIDATION_ERROR, f"缺少消息模板的变量: {e.args[0]}")
+        return "".join(parts)
+
+    def render(self, values: Mapping[str, Any] = {}, chat_id: str = '', open_id: str = '', user_id: str = '',
+               email: str = '', root_id: str = '') -> bytes:
+        """渲染为/message/v4/send/的json body
+
+        Args:
+            values: 占位符的值, 会转为字符串
+            chat_id, open_id, user_id, email: 接收者, 优先级为chat_id>open_id>user_id>email,
+                都不提供时用编译时的接收者
+            root_id: 回复消息所对应的呃消息id, 可选
+        """
+        recipients = {"chat_id": chat_id, "open_id": open_id, "user_id": user_id, "email": email}
+        if not any(recipients.values()):
+            recipients = self.recipient
+        root_id = root_id or self.recipient.get("root_id")
+
+        parts = [self._render_body(values)]
+        if root_id:
+            parts.append(f',"root_id":"{escape_json_string(root_id)}"')
+        for field in RECIPIENT_FIELDS:
+            if recipients.get(field):
+                parts.append(f',"{field}":"{escape_json_string(recipients[field])}"')
+                break
+        parts.append("}")
+        return "".join(parts).encode("utf-8")
+
+    def render_batch(self, values: Mapping[str, Any] = {}, department_ids: List[str] = [],
+                     open_ids: List[str] = [], user_ids: List[str] = []) -> bytes:
+        """渲染为/message/v4/batch_send/的json body"""
+        ids = json.dumps({"department_ids": department_ids, "open_ids": open_ids, "user_ids": user_ids},
+                         ensure_ascii=False, separators=(",", ":"))
+        return f"{self._render_body(values)},{ids[1:]}".encode("utf-8")
+
+    def without_recipient(self) -> "CompiledMessage":
+        """去掉编译时记下的接收者和root_id"""
+        return CompiledMessage(self.literals, self.names, msg_type=self.msg_type, elements=self.elements)
+
+    def stats(self, body: bytes) -> MessageStats:
+        """渲染结果body的大小和元素数, 见feishu.limits"""
+        return MessageStats(self.msg_type, len(body), self.elements)
+
+    def render_dict(self, values: Mapping[str, Any] = {}, **recipient) -> dict:
+        """渲染为dict, 主要用于调试"""
+        return json.loads(self.render(values, **recipient))
+
+
+# compile_card的结果
+CompiledCard = CompiledMessage
+
+
+def _compile(payload: dict, placeholders: bool = True) -> CompiledMessage:
+    from .apis.message import find_image_sources
+
+    if find_image_sources(payload):
+        raise FeishuError(ERRORS.VALIDATION_ERROR, "消息模板中不能有图片来源, 请先用client.resolve_images上传图片")
+
+    recipient = {key: payload.pop(key) for key in RECIPIENT_FIELDS + ("root_id",) if payload.get(key)}
+    if not payload:
+        raise FeishuError(ERRORS.VALIDATION_ERROR, "消息不能为空")
+    text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    # 去掉最后的"}", 渲染时在后面加上接收者字段
+    pieces = PLACEHOLDER_PATTERN.split(text[:-1]) if placeholders else [text[:-1]]
+    msg_type = payload.get("msg_type", "")
+    return CompiledMessage(literals=pieces[0::2], names=pieces[1::2], recipient=recipient,
+                           msg_type=getattr(msg_type, "value", msg_type), elements=count_elements(payload))
+
+
+def compile_message(message: Union[BaseModel, dict], placeholders: bool = True) -> CompiledMessage:
+    """编译消息(Message, CardMessage或者/message/v4/send/格式的dict)
+
+    Args:
+        message: 消息, 其中的接收者和root_id会被记下来, 作为渲染时的默认值
+        placeholders: 是否解析字符串值中{{name}}形式的占位符, 为False时原样发送
+    """
+    if isinstance(message, CompiledMessage):
+        return message
+    if isinstance(message, BaseModel):
+        payload = message.dict(exclude_none=True)
+    elif isinstance(message, dict):
+        payload = dict(message)
+    else:
+        raise FeishuError(ERRORS.VALIDATION_ERROR, f"消息必须是Message, CardMessage或者dict, 实际是{type(message)}")
+    return _compile(payload, placeholders)
+
+
+def compile_card(card: Union[dict, CardContent], update_multi: Optional[bool] = None) -> CompiledMessage:
+    """校验并编译卡片, 卡片中的字符串值可以包含{{name}}形式的占位符
+
+    卡片中的图片必须已经是img_key, 可以先用client.resolve_images上传img_source
+    """
+    from .apis.card import create_card_message
+
+    return _compile(create_card_message(card, update_multi=update_multi).dict(exclude_none=True))
@@ -0,0 +1,74 @@
+"""对比AsyncFeishuClient和FeishuClient(run_async=True)的吞吐
+
+在本地子进程中起一个假飞书服务器(tests.fake_server), 两种client各并发发送N条文本消息, 输出calls/sec
+
+    python -m scripts.benchmark_async_client --calls 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from feishu import AsyncFeishuClient, FeishuClient
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="benchmark async clients against a local fake server")
+    parser.add_argument("--calls", type=int, default=5000, help="number of send_text calls per client")
+    parser.add_argument("--concurrency", type=int, default=50, help="max concurrent calls")
+    parser.add_argument("--latency", type=float, default=0, help="fake server latency in seconds")
+    return parser
+
+
+@contextmanager
+def fake_server(latency: float) -> Iterator[str]:
+    """在子进程中运行tests.fake_server, 返回endpoint"""
+    proc = subprocess.Popen([sys.executable, "-m", "tests.fake_server", str(latency)],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        yield proc.stdout.readline().strip()
+    finally:
+        proc.stdin.close()
+        proc.wait()
+
+
+async def bench_legacy(endpoint: str, calls: int, concurrency: int) -> float:
+    client = FeishuClient("cli_bench", "secret", run_async=True, event_loop=asyncio.get_event_loop(),
+                          endpoint=endpoint)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i: int):
+        async with semaphore:
+            return await client.send_text(str(i), open_id="ou_bench")
+
+    await client.get_token()
+    start = time.perf_counter()
+    await asyncio.gather(*[send(i) for i in range(calls)])
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return calls / elapsed
+
+
+async def bench_native(endpoint: str, calls: int, concurrency: int) -> float:
+    async with AsyncFeishuClient("cli_bench", "secret", endpoint=endpoint) as client:
+        await client.get_token()
+        start = time.perf_counter()
+        await client.gather((client.send_text(str(i), open_id="ou_bench") for i in range(calls)),
+                            concurrency=concurrency)
+        return calls / (time.perf_counter() - start)
+
+
+def main():
+    args = create_argument_parser().parse_args()
+    with fake_server(args.latency) as endpoint:
+        legacy = asyncio.run(bench_legacy(endpoint, args.calls, args.concurrency))
+        native = asyncio.run(bench_native(endpoint, args.calls, args.concurrency))
+    print(f"FeishuClient(run_async=True): {legacy:8.0f} calls/sec")
+    print(f"AsyncFeishuClient:            {native:8.0f} calls/sec ({native / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
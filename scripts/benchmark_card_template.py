@@ -0,0 +1,72 @@
+"""对比send_card的序列化路径和预编译卡片模板的渲染速度(只测CPU, 不发请求)
+
+两边的输入(每个用户的卡片dict/模板变量)都在计时之前构建好, 只计构建消息和序列化的时间
+
+    python -m scripts.benchmark_card_template --renders 20000 --modules 20
+"""
+import argparse
+import json
+import time
+from typing import List, Optional
+
+from feishu import CardContent, compile_card
+from feishu.apis.card import create_card_message
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="benchmark card serialization against compiled card templates")
+    parser.add_argument("--renders", type=int, default=20000, help="number of cards to render")
+    parser.add_argument("--modules", type=int, default=20, help="number of div modules in the card")
+    return parser
+
+
+def create_card(modules: int, name: str, metrics: Optional[List[int]] = None) -> dict:
+    """metrics为None时生成模板, 指标是{{metric_i}}占位符"""
+    metrics = [str(metric) for metric in metrics] if metrics else [f"{{{{metric_{i}}}}}" for i in range(modules)]
+    return {
+        "config": {"wide_screen_mode": True},
+        "header": {"title": {"tag": "plain_text", "content": f"{name}的日报"}},
+        "elements": [
+            {"tag": "div", "text": {"tag": "lark_md", "content": f"**{name}**, 第{i}项指标: {metrics[i]}"},
+             "fields": [{"is_short": True, "text": {"tag": "lark_md", "content": f"字段{j}"}} for j in range(2)]}
+            for i in range(modules)
+        ] + [{"tag": "hr"}, {"tag": "action", "actions": [
+            {"tag": "button", "text": {"tag": "plain_text", "content": "查看"}, "type": "primary",
+             "url": f"https://example.com/{name}"}]}],
+    }
+
+
+def create_values(renders: int, modules: int) -> List[dict]:
+    """每个用户的模板变量"""
+    return [{"name": f"user{i}", **{f"metric_{j}": j * i for j in range(modules)}} for i in range(renders)]
+
+
+def bench_send_card_path(values: List[dict], modules: int) -> float:
+    """send_card的做法: 每次构建CardMessage, 再dict()和json序列化"""
+    cards = [create_card(modules, value["name"], [value[f"metric_{j}"] for j in range(modules)]) for value in values]
+    start = time.perf_counter()
+    for i, card in enumerate(cards):
+        payload = create_card_message(CardContent(**card), open_id=f"ou_{i}").dict(exclude_none=True)
+        json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return len(cards) / (time.perf_counter() - start)
+
+
+def bench_compiled(values: List[dict], modules: int) -> float:
+    card = compile_card(create_card(modules, "{{name}}"))
+    start = time.perf_counter()
+    for i, value in enumerate(values):
+        card.render(value, open_id=f"ou_{i}")
+    return len(values) / (time.perf_counter() - start)
+
+
+def main():
+    args = create_argument_parser().parse_args()
+    values = create_values(args.renders, args.modules)
+    slow = bench_send_card_path(values, args.modules)
+    fast = bench_compiled(values, args.modules)
+    print(f"CardMessage + dict():  {slow:10.0f} renders/sec")
+    print(f"compile_card + render: {fast:10.0f} renders/sec ({fast / slow:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import pytest
+
+from .fake_server import FakeFeishuServer
+
+
+@pytest.fixture
+def server():
+    with FakeFeishuServer() as server:
+        yield server
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""一个本地的假飞书服务器, 给测试和benchmark用
+
+在后台线程里跑一个aiohttp.web的服务, 按API路径返回飞书格式的数据,
+并记录收到的所有请求, 不需要FEISHU_APP_ID等环境变量, 也不需要访问外网
+
+Usage::
+
+>>> with FakeFeishuServer(latency=0.01) as server:
+...     client = FeishuClient(app_id="cli_test", app_secret="secret", endpoint=server.endpoint)
+...     client.send_text("hello", open_id="ou_xxx")
+...     assert server.requests[-1]["path"] == "/message/v4/send/"
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import threading
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import web
+
+# path -> handler(payload) -> data, handler可以raise FakeError来模拟飞书返回的错误
+Handler = Callable[[dict], dict]
+
+
+class FakeError(Exception):
+    def __init__(self, code: int, msg: str = "fake error"):
+        self.code = code
+        self.msg = msg
+
+
+class FakeFeishuServer:
+    def __init__(self, latency: float = 0, handlers: Optional[Dict[str, Handler]] = None):
+        self.latency = latency
+        self.requests: List[dict] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.handlers: Dict[str, Handler] = {
+            "/auth/v3/tenant_access_token/internal/": self.handle_token,
+            "/message/v4/send/": self.handle_send,
+            "/message/v4/batch_send/": self.handle_batch_send,
+            "/chat/v4/chatter/add/": self.handle_chatter,
+            "/chat/v4/chatter/delete/": self.handle_chatter,
+            "/chat/v4/create/": self.handle_create_chat,
+            "/chat/v4/list": self.handle_list_chat,
+            "/image/v4/put/": self.handle_upload_image,
+            "/bot/v4/add": self.handle_empty,
+            "/bot/v4/remove": self.handle_empty,
+            "/chat/v4/update/": self.handle_update_chat,
+            "/chat/v4/disband": self.handle_empty,
+        }
+        self.handlers.update(handlers or {})
+        self.chats: List[dict] = []
+        # /files/{name}下的静态文件, 带ETag, 支持If-None-Match
+        self.files: Dict[str, bytes] = {}
+        self.counter = itertools.count(1)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.port = 0
+        self.lock = threading.Lock()
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.port}/open-apis"
+
+    def file_url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.port}/files/{name}"
+
+    def paths(self) -> List[str]:
+        return [r["path"] for r in self.requests]
+
+    def next_id(self, prefix: str) -> str:
+        with self.lock:
+            return f"{prefix}_{next(self.counter)}"
+
+    # ---- 默认的handlers ----
+
+    def handle_empty(self, payload: dict) -> dict:
+        return {}
+
+    def handle_update_chat(self, payload: dict) -> dict:
+        return {"data": {"chat_id": payload["chat_id"]}}
+
+    def handle_token(self, payload: dict) -> dict:
+        return {"tenant_access_token": "t-fake", "expire": 7200}
+
+    def handle_send(self, payload: dict) -> dict:
+        return {"data": {"message_id": self.next_id("om")}}
+
+    def handle_batch_send(self, payload: dict) -> dict:
+        return {"data": {
+            "message_id": self.next_id("bm"),
+            "invalid_open_ids": [i for i in payload.get("open_ids", []) if i.startswith("invalid")],
+            "invalid_user_ids": [i for i in payload.get("user_ids", []) if i.startswith("invalid")],
+            "invalid_department_ids": [i for i in payload.get("department_ids", []) if i.startswith("invalid")],
+        }}
+
+    def handle_chatter(self, payload: dict) -> dict:
+        return {"data": {
+            "invalid_open_ids": [i for i in payload.get("open_ids", []) if i.startswith("invalid")],
+            "invalid_user_ids": [i for i in payload.get("user_ids", []) if i.startswith("invalid")],
+        }}
+
+    def handle_create_chat(self, payload: dict) -> dict:
+        return {"data": {"chat_id": self.next_id("oc"), "invalid_open_ids": [], "invalid_user_ids": []}}
+
+    def handle_list_chat(self, payload: dict) -> dict:
+        page_size = int(payload.get("page_size", 100))
+        start = int(payload.get("page_token") or 0)
+        groups = self.chats[start:start + page_size]
+        has_more = start + page_size < len(self.chats)
+        return {"data": {"groups": groups, "has_more": has_more, "page_token": str(start + page_size)}}
+
+    def handle_upload_image(self, payload: dict) -> dict:
+        return {"data": {"image_key": self.next_id("img")}}
+
+    # ---- aiohttp ----
+
+    async def dispatch(self, request: web.Request) -> web.Response:
+        path = request.path[len("/open-apis"):]
+        if request.content_type == "application/json" and request.body_exists:
+            payload = await request.json()
+        elif request.method == "POST":
+            form = await request.post()
+            payload = {key: (value if isinstance(value, str) else value.file.read()) for key, value in form.items()}
+        else:
+            payload = dict(request.query)
+        with self.lock:
+            self.requests.append({"path": path, "payload": payload, "headers": dict(request.headers)})
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            handler = self.handlers.get(path)
+            if handler is None:
+                body = {"code": 404, "msg": f"unknown api {path}"}
+            else:
+                try:
+                    body = {"code": 0, "msg": "ok", **(handler(payload) or {})}
+                except FakeError as e:
+                    body = {"code": e.code, "msg": e.msg}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        return web.Response(text=json.dumps(body), content_type="application/json")
+
+    async def serve_file(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        with self.lock:
+            self.requests.append({"path": request.path, "payload": {}, "headers": dict(request.headers)})
+        if name not in self.files:
+            return web.Response(status=404)
+        body = self.files[name]
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, headers={"ETag": etag}, content_type="image/png")
+
+    def start(self) -> "FakeFeishuServer":
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            app = web.Application()
+            app.router.add_route("*", "/open-apis/{tail:.*}", self.dispatch)
+            app.router.add_get("/files/{name}", self.serve_file)
+            runner = web.AppRunner(app, access_log=None)
+            self.loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            self.loop.run_until_complete(site.start())
+            self.port = site._server.sockets[0].getsockname()[1]
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(runner.cleanup())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self.loop and self.thread:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self) -> "FakeFeishuServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    # 单独进程运行, benchmark用, 以免和client抢GIL
+    import sys
+
+    with FakeFeishuServer(latency=float(sys.argv[1]) if len(sys.argv) > 1 else 0) as server:
+        print(server.endpoint, flush=True)
+        sys.stdin.read()
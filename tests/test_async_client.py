@@ -0,0 +1,71 @@
+import asyncio
+import inspect
+
+import pytest
+
+from feishu import AsyncFeishuClient, FeishuError, TaskGroup
+from .fake_server import FakeError
+
+
+def test_native_async_methods(server):
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            assert inspect.iscoroutinefunction(client.send_text)
+            message_id = await client.send_text("hello", open_id="ou_1")
+            await client.add_bot("oc_1")
+            resp = await client.create_chat_all(open_ids=[f"ou_{i}" for i in range(250)])
+            session = client.session_async
+        assert client.closed and session.closed
+        return message_id, resp
+
+    server.handlers["/bot/v4/add"] = lambda payload: {}
+    message_id, resp = asyncio.run(main())
+    assert message_id.startswith("om_")
+    assert resp.chat_id.startswith("oc_")
+    assert server.paths().count("/auth/v3/tenant_access_token/internal/") == 1
+    assert "/bot/v4/add" in server.paths()
+    assert "/chat/v4/chatter/add/" in server.paths()
+
+
+def test_gather_fan_out(server):
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return await client.gather((client.send_text(str(i), open_id="ou_1") for i in range(20)),
+                                       concurrency=5)
+
+    server.latency = 0.01
+    message_ids = asyncio.run(main())
+    assert len(set(message_ids)) == 20
+    assert server.max_in_flight <= 5 + 1  # 加上token请求
+
+
+def test_gather_cancels_siblings_on_error(server):
+    def fail_on_bad(payload):
+        if payload["content"]["text"] == "bad":
+            raise FakeError(230002, "bot not in chat")
+        return {"data": {"message_id": "om_x"}}
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            calls = [client.send_text("bad", chat_id="oc_1")] + [
+                client.send_text("slow", chat_id="oc_1") for _ in range(3)]
+            with pytest.raises(FeishuError) as e:
+                await client.gather(calls)
+            return e.value
+
+    server.handlers["/message/v4/send/"] = fail_on_bad
+    assert asyncio.run(main()).code == 230002
+
+
+def test_cancellation_propagates(server):
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            async with TaskGroup() as tg:
+                task = tg.create_task(client.send_text("hello", open_id="ou_1"))
+                await asyncio.sleep(0.05)
+                task.cancel()
+            return task
+
+    server.latency = 1
+    task = asyncio.run(main())
+    assert task.cancelled()
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+from functools import partial
+
+import pytest
+
+from feishu import AsyncFeishuClient, FeishuClient, TextMessage, TextContent
+from feishu.apis.message import merge_batch_send_responses
+from feishu.concurrency import gather_threaded, imap_threaded
+from feishu.consts import FEISHU_GATHER_THREADS
+from .fake_server import FakeError
+
+MESSAGE = TextMessage(content=TextContent(text="hello"))
+
+
+def fail_on(bad_id: str, handler):
+    def handle(payload):
+        if bad_id in payload.get("open_ids", []):
+            raise FakeError(99991400, "rate limited")
+        return handler(payload)
+
+    return handle
+
+
+def check_slices(server, open_ids, user_ids):
+    batches = [r["payload"] for r in server.requests if r["path"] == "/message/v4/batch_send/"]
+    assert all(len(b["open_ids"]) <= 200 and len(b["user_ids"]) <= 200 for b in batches)
+    assert sorted(i for b in batches for i in b["open_ids"]) == sorted(open_ids)
+    assert sorted(i for b in batches for i in b["user_ids"]) == sorted(user_ids)
+    return batches
+
+
+def test_batch_send_all_slices_concurrently(server):
+    open_ids = [f"ou_{i}" for i in range(1000)] + ["invalid_1", "invalid_2"]
+    user_ids = [f"invalid_u{i}" if i % 100 == 0 else f"u_{i}" for i in range(450)]
+    server.latency = 0.02
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    resp = client.batch_send_all(MESSAGE, open_ids=open_ids, user_ids=user_ids, concurrency=4)
+
+    batches = check_slices(server, open_ids, user_ids)
+    assert len(batches) == 6
+    assert 1 < server.max_in_flight <= 4
+    assert resp.invalid_open_ids == ["invalid_1", "invalid_2"]
+    assert resp.invalid_user_ids == [f"invalid_u{i}" for i in range(0, 450, 100)]
+    assert len(resp.message_ids) == 6 and not resp.failures
+
+
+def test_batch_send_all_reports_failed_slices(server):
+    open_ids = [f"ou_{i}" for i in range(500)]
+    server.handlers["/message/v4/batch_send/"] = fail_on("ou_250", server.handle_batch_send)
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    resp = client.batch_send_all(MESSAGE, open_ids=open_ids)
+
+    assert len(resp.message_ids) == 2
+    assert [(f.index, f.code) for f in resp.failures] == [(1, 99991400)]
+    assert resp.failures[0].open_ids == open_ids[200:400]
+
+
+def test_batch_send_all_async(server):
+    open_ids = [f"ou_{i}" for i in range(450)]
+    server.handlers["/message/v4/batch_send/"] = fail_on("ou_0", server.handle_batch_send)
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return await client.batch_send_all(MESSAGE.dict(), open_ids=open_ids)
+
+    resp = asyncio.run(main())
+    check_slices(server, open_ids, [])
+    assert len(resp.message_ids) == 2
+    assert [f.index for f in resp.failures] == [0]
+    batch = server.requests[-1]["payload"]
+    assert batch["msg_type"] == "text" and batch["content"] == {"text": "hello"}
+
+
+def test_batch_send_stream_reads_ids_lazily(server):
+    consumed = []
+
+    def open_ids():
+        for i in range(5000):
+            consumed.append(i)
+            yield f"ou_{i}"
+
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    stream = client.batch_send_stream(MESSAGE, open_ids=open_ids(), concurrency=3)
+    first = next(stream)
+    assert len(first.message_ids) == 1
+    # 只读取了正在发送的几批, 而不是全部5000个id
+    assert len(consumed) <= 200 * 5
+    rest = list(stream)
+    assert len(rest) == 24 and len(consumed) == 5000
+    assert len(merge_batch_send_responses([first] + rest).message_ids) == 25
+
+
+def test_batch_send_stream_async_iterable(server):
+    server.handlers["/message/v4/batch_send/"] = fail_on("ou_300", server.handle_batch_send)
+
+    async def open_ids():
+        for i in range(1000):
+            yield f"ou_{i}"
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return [resp async for resp in client.batch_send_stream(MESSAGE, open_ids=open_ids(), user_ids=["u_1"])]
+
+    responses = asyncio.run(main())
+    assert len(responses) == 5
+    assert responses[1].failures[0].index == 1 and responses[1].failures[0].open_ids[0] == "ou_200"
+    assert [len(r.message_ids) for r in responses] == [1, 0, 1, 1, 1]
+    check_slices(server, [f"ou_{i}" for i in range(1000)], ["u_1"])
+
+
+def test_gather_reuses_client_executor(server):
+    server.latency = 0.01
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    sessions = set()
+
+    def send(i: int):
+        sessions.add(client.session)
+        return client.send_text(str(i), open_id="ou_1")
+
+    for _ in range(3):
+        client.gather([partial(send, i) for i in range(8)], concurrency=4)
+        assert 1 < server.max_in_flight <= 4
+        server.max_in_flight = 0
+    # 多次gather用的是同一批线程, 不会每次都新建session
+    assert len(sessions) <= 4
+    assert len(list(client.imap(send, range(8), concurrency=2))) == 8
+    assert len(sessions) <= 4
+    asyncio.run(client.close())
+    assert client.gather_executor._shutdown
+
+
+def test_nested_gather_does_not_deadlock(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    barrier = threading.Barrier(FEISHU_GATHER_THREADS)
+    results = []
+
+    def send_all(n: int):
+        # 外层调用先占满gather_executor的所有线程, 再在这些线程中调用gather
+        if n < FEISHU_GATHER_THREADS:
+            barrier.wait(5)
+        return client.gather([partial(client.send_text, f"{n}-{i}", open_id="ou_1") for i in range(3)])
+
+    thread = threading.Thread(target=lambda: results.extend(
+        client.gather([partial(send_all, n) for n in range(FEISHU_GATHER_THREADS + 8)], concurrency=100)), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "嵌套的gather死锁了"
+    assert len(results) == FEISHU_GATHER_THREADS + 8
+    assert all(len(message_ids) == 3 for message_ids in results)
+
+
+def test_gather_stops_after_first_error():
+    executor_calls = []
+    lock = threading.Lock()
+
+    def call(i: int):
+        with lock:
+            executor_calls.append(i)
+        if i == 2:
+            raise ValueError("bad")
+        return i
+
+    with pytest.raises(ValueError):
+        gather_threaded([partial(call, i) for i in range(100)], concurrency=2)
+    assert len(executor_calls) < 100
+
+
+def test_concurrency_must_be_positive(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    with pytest.raises(ValueError):
+        client.imap(str, [1, 2], concurrency=0)
+    with pytest.raises(ValueError):
+        imap_threaded(str, [1, 2], concurrency=0)
+    with pytest.raises(ValueError):
+        client.gather([lambda: 1], concurrency=0)
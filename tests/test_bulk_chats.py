@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from feishu import AsyncFeishuClient, FeishuClient, RateLimiter, ChatOperation
+from feishu.apis.bot import chat_operation_result, create_chat_result
+from feishu.ratelimit import call_with_rate_limit
+from feishu.consts import FEISHU_RATE_LIMIT_ERROR
+from feishu.errors import FeishuError, ERRORS
+from .fake_server import FakeError
+
+
+def chat_ids_of(server, path):
+    return [r["payload"]["chat_id"] for r in server.requests if r["path"] == path]
+
+
+def test_bulk_chat_operations(server):
+    def disband(payload):
+        if payload["chat_id"] == "oc_bad":
+            raise FakeError(90004, "not owner")
+        return {}
+
+    server.handlers["/chat/v4/disband"] = disband
+    operations = [(f"oc_{i}", "add_bot") for i in range(20)] + [
+        ("oc_a", {"op": "rename", "params": {"name": "new name"}}),
+        ("oc_b", ChatOperation(op="transfer_owner", params={"owner_open_id": "ou_owner"})),
+        ("oc_bad", "disband"),
+        ("oc_c", "remove_bot"),
+    ]
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    results = list(client.bulk_chat_operations(iter(operations), concurrency=4, rate_limiter=RateLimiter(1000)))
+
+    assert [r.chat_id for r in results] == [chat_id for chat_id, _ in operations]
+    assert [r.index for r in results if not r.ok] == [22]
+    assert results[22].code == 90004
+    assert sorted(chat_ids_of(server, "/bot/v4/add")) == sorted(f"oc_{i}" for i in range(20))
+    updates = {r["payload"]["chat_id"]: r["payload"] for r in server.requests if r["path"] == "/chat/v4/update/"}
+    assert updates["oc_a"]["name"] == "new name"
+    assert updates["oc_b"]["owner_open_id"] == "ou_owner"
+    assert chat_ids_of(server, "/bot/v4/remove") == ["oc_c"]
+
+
+def test_bulk_chat_operations_resume_from_checkpoint(server, tmp_path):
+    checkpoint_file = str(tmp_path / "checkpoint.jsonl")
+    operations = [(f"oc_{i}", "add_bot") for i in range(10)]
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    for result in client.bulk_chat_operations(operations, concurrency=1, checkpoint_file=checkpoint_file):
+        if result.index == 3:
+            break  # 模拟中途崩溃
+    with open(checkpoint_file, "a") as f:
+        f.write('{"index": 4, "chat_')  # 崩溃时写了半行
+
+    results = list(client.bulk_chat_operations(operations, checkpoint_file=checkpoint_file))
+    assert [r.index for r in results if r.skipped] == [0, 1, 2, 3]
+    assert all(r.ok for r in results)
+    assert chat_ids_of(server, "/bot/v4/add").count("oc_0") == 1
+    assert chat_ids_of(server, "/bot/v4/add").count("oc_9") == 1
+
+
+def test_bulk_chat_operations_async(server):
+    async def operations():
+        for i in range(30):
+            yield f"oc_{i}", "disband"
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return [r async for r in client.bulk_chat_operations(operations(), concurrency=5)]
+
+    server.latency = 0.01
+    results = asyncio.run(main())
+    assert [r.chat_id for r in results] == [f"oc_{i}" for i in range(30)]
+    assert all(r.ok for r in results)
+    assert server.max_in_flight <= 5 + 1
+
+
+def test_bulk_chat_operations_with_malformed_operation(server):
+    operations = [("oc_1", "add_bot"), ("oc_2", "explode"), ("oc_3", {"params": {}}), ("oc_4", "remove_bot")]
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as async_client:
+            return [r async for r in async_client.bulk_chat_operations(operations, concurrency=2)]
+
+    for results in (list(client.bulk_chat_operations(operations, concurrency=2)), asyncio.run(main())):
+        assert [r.ok for r in results] == [True, False, False, True]
+        assert [r.op for r in results[1:3]] == [None, None]
+        assert {r.code for r in results[1:3]} == {ERRORS.VALIDATION_ERROR}
+    assert chat_ids_of(server, "/bot/v4/add") == ["oc_1", "oc_1"]
+
+
+def test_chat_results_capture_any_exception():
+    result = chat_operation_result(0, "oc_1", "add_bot", ConnectionResetError("reset by peer"))
+    assert not result.ok and result.msg == "reset by peer"
+    assert not create_chat_result(0, OSError("network down")).ok
+
+
+def test_rate_limiter_and_retry():
+    limiter = RateLimiter(50, burst=1)
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.19
+
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FeishuError(FEISHU_RATE_LIMIT_ERROR, "request trigger frequency limit")
+        return "ok"
+
+    assert call_with_rate_limit(flaky, backoff=0.01) == "ok" and len(calls) == 3
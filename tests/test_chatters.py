@@ -0,0 +1,89 @@
+import asyncio
+
+from feishu import AsyncFeishuClient, FeishuClient
+from feishu.errors import ERRORS
+from .fake_server import FakeError
+
+
+def test_add_chatter_all_concurrently(server):
+    open_ids = [f"invalid_{i}" if i % 300 == 0 else f"ou_{i}" for i in range(1000)]
+    server.latency = 0.02
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    resp = client.add_chatter_all("oc_1", open_ids=open_ids, concurrency=3)
+
+    batches = [r["payload"] for r in server.requests if r["path"] == "/chat/v4/chatter/add/"]
+    assert len(batches) == 5 and all(len(b["open_ids"]) <= 200 for b in batches)
+    assert 1 < server.max_in_flight <= 3
+    assert resp.chat_id == "oc_1"
+    assert resp.invalid_open_ids == ["invalid_0", "invalid_300", "invalid_600", "invalid_900"]
+    assert not resp.failures
+
+
+def test_remove_chatter_all_reports_failures(server):
+    def fail_on_second_batch(payload):
+        if "u_200" in payload.get("user_ids", []):
+            raise FakeError(90003, "no permission")
+        return server.handle_chatter(payload)
+
+    user_ids = [f"u_{i}" for i in range(450)] + ["invalid_u"]
+    server.handlers["/chat/v4/chatter/delete/"] = fail_on_second_batch
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return await client.remove_chatter_all("oc_1", user_ids=user_ids, slice_size=200)
+
+    resp = asyncio.run(main())
+    assert [(f.index, f.code, len(f.user_ids)) for f in resp.failures] == [(1, 90003, 200)]
+    assert resp.invalid_user_ids == ["invalid_u"]
+
+
+def test_create_chat_all_adds_members_concurrently(server):
+    open_ids = [f"ou_{i}" for i in range(5000)]
+    server.latency = 0.02
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    resp = client.create_chat_all(name="big", open_ids=open_ids, concurrency=8)
+
+    assert resp.chat_id.startswith("oc_") and not resp.failures
+    adds = [r["payload"] for r in server.requests if r["path"] == "/chat/v4/chatter/add/"]
+    assert len(adds) == 24 and {a["chat_id"] for a in adds} == {resp.chat_id}
+    assert sorted(i for a in adds for i in a["open_ids"]) == sorted(open_ids[200:])
+    assert 1 < server.max_in_flight <= 8
+
+
+def test_create_chats_from_manifest(server):
+    def create(payload):
+        if payload.get("name") == "bad":
+            raise FakeError(90001, "invalid name")
+        return server.handle_create_chat(payload)
+
+    server.handlers["/chat/v4/create/"] = create
+    manifest = [{"name": f"chat {i}", "open_ids": [f"ou_{j}" for j in range(300)]} for i in range(5)]
+    manifest.insert(2, {"name": "bad"})
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return [r async for r in client.create_chats(manifest, concurrency=3)]
+
+    results = asyncio.run(main())
+    assert [r.index for r in results] == list(range(6))
+    assert [r.ok for r in results] == [True, True, False, True, True, True]
+    assert results[2].code == 90001
+    assert len({r.response.chat_id for r in results if r.ok}) == 5
+    assert sum(r["path"] == "/chat/v4/chatter/add/" for r in server.requests) == 5
+
+
+def test_create_chats_with_malformed_manifest_entry(server):
+    manifest = [{"name": "a"}, {"name": "b", "open_ids": 5}, "c", {"name": "d"}]
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as async_client:
+            return [r async for r in async_client.create_chats(manifest, concurrency=2)]
+
+    for results in (list(client.create_chats(manifest, concurrency=2)), asyncio.run(main())):
+        assert [r.ok for r in results] == [True, False, False, True]
+        assert {results[1].code, results[2].code} == {ERRORS.VALIDATION_ERROR}
+        assert "open_ids" in results[1].msg
+    assert sum(r["path"] == "/chat/v4/create/" for r in server.requests) == 4
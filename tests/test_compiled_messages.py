@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from feishu import (AsyncFeishuClient, FeishuClient, FeishuError, ERRORS, TextMessage, TextContent, CardMessage,
+                    CardContent, compile_message)
+from feishu.apis.card import create_card_message
+from feishu.apis.message import create_message
+from feishu.models import SendMsgType
+
+calls = []
+
+
+class CountingMessage(TextMessage):
+    def dict(self, **kwargs):
+        calls.append(kwargs)
+        return super().dict(**kwargs)
+
+
+def sent(server, path="/message/v4/send/"):
+    return [r["payload"] for r in server.requests if r["path"] == path]
+
+
+def test_fan_out_serializes_message_once(server):
+    calls.clear()
+    message = CountingMessage(content=TextContent(text="上线通知 {{not a placeholder}}"), open_id="ou_ignored")
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    results = list(client.fan_out(message, [f"ou_{i}" for i in range(20)] + [{"chat_id": "oc_1", "root_id": "om_1"}]))
+
+    assert all(r.ok for r in results) and len(calls) == 1
+    payloads = sent(server)
+    assert {p["content"]["text"] for p in payloads} == {"上线通知 {{not a placeholder}}"}
+    assert {"msg_type": "text", "content": {"text": "上线通知 {{not a placeholder}}"},
+            "chat_id": "oc_1", "root_id": "om_1"} in payloads
+    assert sorted(p["open_id"] for p in payloads if "open_id" in p) == sorted(f"ou_{i}" for i in range(20))
+
+
+def test_batch_send_all_serializes_message_once(server):
+    calls.clear()
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    message = CountingMessage(content=TextContent(text="hello"))
+    resp = client.batch_send_all(message, open_ids=[f"ou_{i}" for i in range(500)], user_ids=["u_1"])
+
+    assert len(resp.message_ids) == 3 and len(calls) == 1
+    batches = sent(server, "/message/v4/batch_send/")
+    assert all(b["msg_type"] == "text" and b["content"] == {"text": "hello"} for b in batches)
+    assert sum(len(b["open_ids"]) for b in batches) == 500
+
+
+def test_send_compiled_message(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    notice = compile_message(TextMessage(content=TextContent(text="hi"), open_id="ou_1"))
+    assert client.send(notice) and client.batch_send(notice, open_ids=["ou_2"]).message_id
+    assert sent(server)[0] == {"msg_type": "text", "content": {"text": "hi"}, "open_id": "ou_1"}
+    assert sent(server, "/message/v4/batch_send/")[0]["open_ids"] == ["ou_2"]
+
+
+def test_batch_send_card_message(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    card = CardMessage(msg_type="interactive", card=CardContent(elements=[{"tag": "hr"}]))
+    client.batch_send(card, open_ids=["ou_1"])
+    batch = sent(server, "/message/v4/batch_send/")[0]
+    assert batch["card"] == {"elements": [{"tag": "hr"}]} and batch["open_ids"] == ["ou_1"]
+
+
+def test_trusted_messages_skip_validation(server):
+    content = TextContent.construct(text="trusted")
+    msg = create_message(SendMsgType.TEXT, content, chat_id="", open_id="ou_1", user_id="", email="", root_id="",
+                         trusted=True)
+    assert msg.dict(exclude_none=True) == {"msg_type": "text", "content": {"text": "trusted"}, "open_id": "ou_1"}
+    card = {"elements": [{"tag": "future_tag", "payload": {"x": 1}}]}
+    assert create_card_message(card, trusted=True, open_id="ou_1").dict(exclude_none=True)["card"] == card
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return await client.send_card(card, open_id="ou_1", trusted=True)
+
+    assert asyncio.run(main())
+    assert sent(server)[0]["card"] == card
+
+
+def test_send_apis_accept_trusted(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    post = {"zh_cn": {"title": "t", "content": [[{"tag": "future_tag", "payload": {"x": 1}}]]}}
+    with pytest.raises(ValidationError):
+        client.send_post(post, open_id="ou_1")
+    assert client.send_text("hello", open_id="ou_1", trusted=True)
+    assert client.send_post(post, open_id="ou_1", trusted=True)
+    assert [p["content"] for p in sent(server)] == [{"text": "hello"}, {"post": post}]
+
+    open_ids = [f"ou_{i}" for i in range(client.limits.max_ids + 1)]
+    with pytest.raises(FeishuError):
+        client.batch_send(TextMessage(content=TextContent(text="hi")), open_ids=open_ids)
+    client.batch_send(TextMessage(content=TextContent(text="hi")), open_ids=open_ids, trusted=True)
+    assert sent(server, "/message/v4/batch_send/")[0]["open_ids"] == open_ids
+
+
+@pytest.mark.parametrize("message", [{}, {"open_id": "ou_1"}, [("msg_type", "text")], "text"])
+def test_compile_rejects_empty_or_non_object_messages(message):
+    with pytest.raises(FeishuError) as e:
+        compile_message(message)
+    assert e.value.code == ERRORS.VALIDATION_ERROR
@@ -0,0 +1,43 @@
+import time
+from concurrent.futures import Future
+
+from feishu import ConcurrentFeishuClient
+from feishu.background import get_background_loop
+
+
+def test_calls_return_futures_and_run_concurrently(server):
+    server.latency = 0.1
+    with ConcurrentFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+        client.get_token().result()
+        start = time.perf_counter()
+        futures = [client.send_text(str(i), open_id="ou_1") for i in range(20)]
+        assert all(isinstance(future, Future) for future in futures)
+        message_ids = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+    assert len(set(message_ids)) == 20
+    assert elapsed < 20 * server.latency / 2, "20个请求应该是并发执行的"
+    assert client.async_client.closed
+
+
+def test_clients_share_one_background_loop(server):
+    with ConcurrentFeishuClient("cli_a", "secret", endpoint=server.endpoint) as client_a, \
+            ConcurrentFeishuClient("cli_b", "secret", endpoint=server.endpoint) as client_b:
+        client_a.send_text("a", open_id="ou_1").result()
+        client_b.send_text("b", open_id="ou_1").result()
+        assert client_a.background_loop is client_b.background_loop is get_background_loop()
+
+
+def test_async_iterator_apis_are_iterable(server):
+    server.chats = [{"chat_id": f"oc_{i}", "name": str(i)} for i in range(250)]
+    with ConcurrentFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+        results = list(client.fan_out({"msg_type": "text", "content": {"text": "hi"}}, ["ou_1", "oc_1", "ou_2"]))
+        assert sorted(map(str, (result.target for result in results))) == sorted(
+            map(str, [{"open_id": "ou_1"}, {"chat_id": "oc_1"}, {"open_id": "ou_2"}]))
+        assert all(result.ok for result in results)
+
+        chats = client.iter_chats(page_size=100)
+        assert [chat.chat_id for chat in chats] == [f"oc_{i}" for i in range(250)]
+        # 提前break不会影响下一次遍历
+        for chat in chats:
+            break
+        assert len(list(chats)) == 250
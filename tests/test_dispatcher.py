@@ -0,0 +1,112 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from feishu import Dispatcher, FeishuClient, FeishuError, ERRORS
+from feishu import dispatcher as dispatcher_module
+
+
+def busy_dispatcher(client, overflow):
+    """一个worker被占住, 队列里已经有一个调用的dispatcher"""
+    started, release = threading.Event(), threading.Event()
+    dispatcher = Dispatcher(client, workers=1, queue_size=1, overflow=overflow, put_timeout=0.05)
+    busy = dispatcher.submit(lambda: started.set() or release.wait())
+    started.wait()
+    queued = dispatcher.submit(lambda: "queued")
+    return dispatcher, release, busy, queued
+
+
+def test_dispatcher_returns_immediately(server):
+    server.latency = 0.2
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    start = time.perf_counter()
+    futures = [client.dispatcher.send_text("hello", open_id=f"ou_{i}") for i in range(4)]
+    assert time.perf_counter() - start < 0.1
+    assert all(future.result(timeout=5).startswith("om_") for future in futures)
+    assert client.dispatcher is client.dispatcher
+
+
+@pytest.mark.parametrize("overflow", ["raise", "block"])
+def test_overflow_raise(server, overflow):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    dispatcher, release, _, queued = busy_dispatcher(client, overflow)
+    with pytest.raises(FeishuError) as e:
+        dispatcher.submit(lambda: "overflow")
+    assert e.value.code == ERRORS.QUEUE_FULL
+    release.set()
+    assert queued.result(timeout=5) == "queued"
+
+
+def test_overflow_drop(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    dispatcher, release, _, queued = busy_dispatcher(client, "drop_newest")
+    dropped = dispatcher.submit(lambda: "overflow")
+    assert dropped.exception(timeout=0).code == ERRORS.QUEUE_FULL
+    release.set()
+    assert queued.result(timeout=5) == "queued"
+
+    dispatcher, release, _, queued = busy_dispatcher(client, "drop_oldest")
+    newest = dispatcher.submit(lambda: "newest")
+    assert queued.exception(timeout=0).code == ERRORS.QUEUE_FULL
+    release.set()
+    assert newest.result(timeout=5) == "newest"
+
+    dispatcher, release, _, queued = busy_dispatcher(client, "caller_runs")
+    caller = dispatcher.submit(threading.current_thread)
+    assert caller.done() and caller.result() is threading.current_thread()
+    release.set()
+
+
+def test_shutdown_drains_queue(server):
+    server.latency = 0.05
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    client.dispatcher = Dispatcher(client, workers=2)
+    futures = [client.dispatcher.send_text("hello", open_id=f"ou_{i}") for i in range(6)]
+
+    client.dispatcher.shutdown(wait=True)
+    assert all(future.done() and future.result().startswith("om_") for future in futures)
+    with pytest.raises(FeishuError):
+        client.dispatcher.send_text("late", open_id="ou_1")
+
+
+def test_submit_racing_shutdown_is_never_queued_behind_stop(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    dispatcher = Dispatcher(client, workers=2, queue_size=10000)
+    futures, rejected = [], []
+
+    def submit_all():
+        for i in range(2000):
+            try:
+                futures.append(dispatcher.submit(lambda: i))
+            except FeishuError:
+                rejected.append(i)
+
+    thread = threading.Thread(target=submit_all)
+    thread.start()
+    dispatcher.shutdown(wait=True)
+    thread.join()
+    # 被接受的调用都在_STOP之前, shutdown返回时已经全部执行完
+    assert all(future.done() for future in futures)
+    assert len(futures) + len(rejected) == 2000
+
+
+def test_drop_oldest_keeps_stop_sentinel(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    started, release = threading.Event(), threading.Event()
+    dispatcher = Dispatcher(client, workers=1, queue_size=1, overflow="drop_oldest")
+    dispatcher.submit(lambda: started.set() or release.wait())
+    started.wait()
+    # 队列已满且只有worker的退出信号时, 新的调用不能把它挤掉
+    dispatcher.queue.put(dispatcher_module._STOP)
+    future = Future()
+    try:
+        dispatcher._put_dropping_oldest((future, lambda: "new"), FeishuError(ERRORS.QUEUE_FULL, "队列已满"))
+    finally:
+        release.set()
+    assert future.exception(timeout=0).code == ERRORS.DISPATCHER_CLOSED
+    dispatcher.threads[0].join(5)
+    assert not dispatcher.threads[0].is_alive()
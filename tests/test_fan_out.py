@@ -0,0 +1,77 @@
+import asyncio
+
+from feishu import AsyncFeishuClient, FeishuClient, RateLimiter, TextMessage, TextContent
+from .fake_server import FakeError
+
+
+def sent(server):
+    return [r["payload"] for r in server.requests if r["path"] == "/message/v4/send/"]
+
+
+def test_fan_out(server):
+    def send(payload):
+        if payload.get("email") == "bad@example.com":
+            raise FakeError(230013, "user not found")
+        return server.handle_send(payload)
+
+    server.handlers["/message/v4/send/"] = send
+    server.latency = 0.01
+    targets = ["oc_1", "ou_1", "u_1", "bad@example.com", {"open_id": "ou_2", "root_id": "om_root"}]
+    targets += [f"ou_x{i}" for i in range(20)]
+    progress = []
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    message = TextMessage(open_id="ou_ignored", content=TextContent(text="hello"))
+
+    results = list(client.fan_out(message, targets, concurrency=4, rate_limiter=RateLimiter(1000),
+                                  on_progress=lambda p: progress.append((p.done, p.failed, p.total))))
+
+    assert [r.index for r in results] == list(range(25))
+    assert [r.ok for r in results[:5]] == [True, True, True, False, True]
+    assert results[3].code == 230013 and results[4].message_id.startswith("om_")
+    assert progress[-1] == (25, 1, 25)
+    assert 1 < server.max_in_flight <= 4
+    payloads = sent(server)
+    assert all(p["content"] == {"text": "hello"} and p["msg_type"] == "text" for p in payloads)
+    recipients = sorted(tuple(sorted(k for k in p if k not in ("msg_type", "content"))) for p in payloads)
+    assert recipients.count(("open_id",)) == 21 and ("open_id", "root_id") in recipients
+    assert ("chat_id",) in recipients and ("user_id",) in recipients
+
+
+def test_fan_out_card_async(server):
+    async def targets():
+        for i in range(10):
+            yield f"oc_{i}"
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            card = {"msg_type": "interactive", "update_multi": True, "card": {"elements": []}}
+            return [r async for r in client.fan_out(card, targets(), concurrency=3)]
+
+    results = asyncio.run(main())
+    assert all(r.ok for r in results) and len(results) == 10
+    assert sorted(p["chat_id"] for p in sent(server)) == sorted(f"oc_{i}" for i in range(10))
+    assert all(p["update_multi"] is True and p["card"] == {"elements": []} for p in sent(server))
+
+
+def test_fan_out_target_extras_are_merged(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    card = {"msg_type": "interactive", "card": {"elements": []}}
+
+    results = list(client.fan_out(card, ["ou_1", {"open_id": "ou_2", "root_id": "om_1", "update_multi": True}]))
+
+    assert all(r.ok for r in results)
+    payloads = {p["open_id"]: p for p in sent(server)}
+    assert "update_multi" not in payloads["ou_1"]
+    assert payloads["ou_2"] == {"msg_type": "interactive", "card": {"elements": []}, "open_id": "ou_2",
+                                "root_id": "om_1", "update_multi": True}
+
+
+def test_fan_out_records_unexpected_errors(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    message = TextMessage(content=TextContent(text="hello"))
+
+    results = list(client.fan_out(message, ["ou_1", {"open_id": "ou_2", "extra": object()}, "ou_3"]))
+
+    assert [r.ok for r in results] == [True, False, True]
+    # 序列化target的extra字段时出错(TypeError), 只影响这一个接收者
+    assert "not JSON serializable" in results[1].msg and len(sent(server)) == 2
@@ -0,0 +1,56 @@
+import asyncio
+
+from feishu import AsyncFeishuClient, FeishuClient, HTTPCache
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+def requests_to(server, path):
+    return [r for r in server.requests if r["path"] == path]
+
+
+def test_unchanged_image_url_is_revalidated(server, tmp_path):
+    server.files["logo.png"] = PNG
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, http_cache=HTTPCache(str(tmp_path)))
+
+    first = client.send_image(image_url=server.file_url("logo.png"), open_id="ou_1")
+    second = client.send_image(image_url=server.file_url("logo.png"), open_id="ou_1")
+    assert first and second
+
+    downloads = requests_to(server, "/files/logo.png")
+    assert len(downloads) == 2 and "If-None-Match" in downloads[1]["headers"]
+    assert len(requests_to(server, "/image/v4/put/")) == 1
+
+    # 图片变了, 重新下载和上传
+    server.files["logo.png"] = PNG + b"\x01"
+    response = client.fetch_cached(server.file_url("logo.png"))
+    assert not response.not_modified and response.body == PNG + b"\x01"
+    assert client.fetch_cached(server.file_url("logo.png")).not_modified
+
+
+def test_http_cache_is_size_bounded(server, tmp_path):
+    cache = HTTPCache(str(tmp_path), max_bytes=250)
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, http_cache=cache)
+    for name in ("a", "b", "c"):
+        server.files[name] = name.encode() * 100
+        client.fetch_cached(server.file_url(name))
+
+    assert cache.get(server.file_url("a")) is None
+    assert cache.get(server.file_url("c")).body == b"c" * 100
+    assert len([p for p in tmp_path.iterdir() if not p.name.startswith("index")]) == 2
+
+
+def test_fetch_cached_async(server, tmp_path):
+    server.files["logo.png"] = PNG
+    cache = HTTPCache(str(tmp_path))
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint, http_cache=cache) as client:
+            first = await client.fetch_cached(server.file_url("logo.png"))
+            second = await client.fetch_cached(server.file_url("logo.png"))
+            await client.send_image(image_url=server.file_url("logo.png"), open_id="ou_1")
+            return first, second
+
+    first, second = asyncio.run(main())
+    assert not first.not_modified and second.not_modified and second.body == PNG
+    assert len(requests_to(server, "/image/v4/put/")) == 1
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+
+from feishu import AsyncFeishuClient, FeishuClient, FeishuError, MemoryCache, SQLiteCache, TextMessage, TextContent
+from feishu.caches import PENDING
+from .fake_server import FakeError
+
+MESSAGE = TextMessage(content=TextContent(text="hello"), open_id="ou_1")
+
+
+def sends(server, path="/message/v4/send/"):
+    return [r for r in server.requests if r["path"] == path]
+
+
+def test_send_with_idempotency_key(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    first = client.send_text("hello", open_id="ou_1", idempotency_key="k1")
+    assert client.send_text("hello", open_id="ou_1", idempotency_key="k1") == first
+    assert client.send(MESSAGE, idempotency_key="k1") == first
+    assert client.send_card({"elements": []}, open_id="ou_1", idempotency_key="k1") == first
+    assert len(sends(server)) == 1
+
+    assert client.send_text("hello", open_id="ou_1", idempotency_key="k2") != first
+    assert client.send_text("hello", open_id="ou_1") != first
+    assert len(sends(server)) == 3
+
+
+def test_idempotency_key_expires(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, idempotency_ttl=0.05)
+    first = client.send(MESSAGE, idempotency_key="k")
+    threading.Event().wait(0.1)
+    assert client.send(MESSAGE, idempotency_key="k") != first
+
+
+def test_concurrent_sends_are_deduplicated(server):
+    server.latency = 0.05
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, idempotency_cache=MemoryCache())
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.send(MESSAGE, idempotency_key="k")))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 1 and len(results) == 5
+    assert len(sends(server)) == 1
+
+
+def test_sends_are_deduplicated_across_processes(server, tmp_path):
+    # 每个client有自己的SQLite连接和进程内去重状态, 相当于共享同一个缓存文件的多个进程
+    server.latency = 0.05
+    path = str(tmp_path / "idempotency.sqlite3")
+    clients = [FeishuClient("cli_test", "secret", endpoint=server.endpoint, idempotency_cache=SQLiteCache(path))
+               for _ in range(3)]
+    results = []
+    threads = [threading.Thread(target=lambda c=client: results.append(c.send(MESSAGE, idempotency_key="k")))
+               for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 3 and len(set(results)) == 1
+    assert len(sends(server)) == 1
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint,
+                                     idempotency_cache=SQLiteCache(path)) as client:
+            return await client.send(MESSAGE, idempotency_key="k")
+
+    assert asyncio.run(main()) == results[0]
+    assert len(sends(server)) == 1
+
+
+def test_cache_reserve(tmp_path):
+    for cache in (MemoryCache(), SQLiteCache(str(tmp_path / "cache.sqlite3"))):
+        assert cache.reserve("k", PENDING, 60)
+        assert not cache.reserve("k", PENDING, 60)
+        assert cache.get("k") == PENDING
+        cache.set("k", "om_1", None)
+        assert not cache.reserve("k", PENDING, 60) and cache.get("k") == "om_1"
+        cache.delete("k")
+        assert cache.get("k") is None
+        # 执行的进程崩溃后, 占用过期了可以重新占用
+        assert cache.reserve("k2", PENDING, 0.01)
+        threading.Event().wait(0.02)
+        assert cache.reserve("k2", PENDING, 60)
+
+
+def test_failed_send_is_not_cached(server):
+    calls = []
+
+    def handle(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise FakeError(99991400, "rate limited")
+        return server.handle_send(payload)
+
+    server.handlers["/message/v4/send/"] = handle
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    try:
+        client.send(MESSAGE, idempotency_key="k")
+        assert False, "should raise"
+    except FeishuError as e:
+        assert e.code == 99991400
+    assert client.idempotency_cache.get("idempotency:cli_test:send:k") is None, "失败后要释放占用"
+    message_id = client.send(MESSAGE, idempotency_key="k")
+    assert message_id and client.send(MESSAGE, idempotency_key="k") == message_id
+    assert len(calls) == 2
+
+
+def test_batch_send_with_idempotency_key(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    first = client.batch_send(MESSAGE, open_ids=["ou_1", "invalid_1"], idempotency_key="k")
+    second = client.batch_send(MESSAGE, open_ids=["ou_1", "invalid_1"], idempotency_key="k")
+    assert second == first and second.invalid_open_ids == ["invalid_1"]
+    assert len(sends(server, "/message/v4/batch_send/")) == 1
+
+
+def test_async_sends_are_deduplicated(server):
+    server.latency = 0.05
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            results = await asyncio.gather(*[client.send(MESSAGE, idempotency_key="k") for _ in range(5)])
+            results.append(await client.send_text("hello", open_id="ou_1", idempotency_key="k"))
+            return results
+
+    results = asyncio.run(main())
+    assert len(set(results)) == 1 and len(results) == 6
+    assert len(sends(server)) == 1
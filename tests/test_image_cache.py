@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from feishu import AsyncFeishuClient, FeishuClient, SQLiteCache
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+def uploads(server):
+    return [r for r in server.requests if r["path"] == "/image/v4/put/"]
+
+
+def test_same_image_is_uploaded_once(server, tmp_path):
+    image_file = tmp_path / "logo.png"
+    image_file.write_bytes(PNG)
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    image_key = client.upload_image(PNG)
+    assert client.upload_image(PNG) == image_key
+    assert client._get_image_key(image_file=str(image_file)) == image_key
+    assert len(uploads(server)) == 1 and uploads(server)[0]["payload"]["image"] == PNG
+
+    assert client.upload_image(PNG + b"\x01") != image_key
+    assert client.upload_image(PNG, image_type="avatar") != image_key
+    assert client.upload_image(PNG, use_cache=False) != image_key
+    assert len(uploads(server)) == 4
+
+
+def test_sqlite_image_cache_survives_restart(server, tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, image_cache=SQLiteCache(path))
+    image_key = client.upload_image(PNG)
+
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, image_cache=SQLiteCache(path))
+    assert client.upload_image(PNG) == image_key
+    assert len(uploads(server)) == 1
+
+
+def test_concurrent_uploads_are_deduplicated(server):
+    server.latency = 0.05
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.upload_image(PNG))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 5 and len(set(results)) == 1
+    assert len(uploads(server)) == 1
+
+
+def test_async_uploads_are_deduplicated(server, tmp_path):
+    server.latency = 0.05
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint, image_cache=cache) as client:
+            results = await asyncio.gather(*[client.upload_image(PNG) for _ in range(5)])
+            results.append(await client.upload_image(PNG))
+            return results
+
+    results = asyncio.run(main())
+    assert len(results) == 6 and len(set(results)) == 1
+    assert len(uploads(server)) == 1
@@ -0,0 +1,63 @@
+import asyncio
+import io
+import random
+
+import pytest
+
+from feishu import AsyncFeishuClient, FeishuClient, FeishuError, ImageOptions
+from feishu.images import encode_image
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+def uploaded(server):
+    return [r["payload"]["image"] for r in server.requests if r["path"] == "/image/v4/put/"]
+
+
+def test_encoded_bytes_are_uploaded_unchanged(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    assert encode_image(PNG) == PNG
+    client.send_image(image=io.BytesIO(PNG), open_id="ou_1")
+    assert uploaded(server) == [PNG]
+
+
+def test_unsupported_image_type():
+    with pytest.raises(FeishuError):
+        encode_image(object())
+
+
+def test_pil_image_is_encoded_and_downsized(server):
+    Image = pytest.importorskip("PIL.Image")
+    image = Image.new("RGB", (2000, 1000), (255, 0, 0))
+    image.info["comment"] = b"secret"
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint,
+                          image_options=ImageOptions(max_dimension=500))
+
+    client.send_image(image=image, open_id="ou_1")
+
+    data = uploaded(server)[0]
+    assert data.startswith(b"\x89PNG") and len(data) < len(image.tobytes()) / 100
+    decoded = Image.open(io.BytesIO(data))
+    assert decoded.size == (500, 250) and "comment" not in decoded.info
+
+
+def test_byte_budget_falls_back_to_jpeg():
+    Image = pytest.importorskip("PIL.Image")
+    noise = Image.frombytes("RGB", (400, 400), random.Random(0).getrandbits(8 * 480000).to_bytes(480000, "little"))
+    data = encode_image(noise, ImageOptions(max_bytes=60 * 1024))
+    assert data.startswith(b"\xff\xd8") and len(data) <= 60 * 1024
+
+    smaller = encode_image(data, ImageOptions(max_bytes=len(data) // 2))
+    assert len(smaller) <= len(data) // 2
+
+
+def test_async_encoding_runs_in_executor(server):
+    Image = pytest.importorskip("PIL.Image")
+    image = Image.new("RGBA", (100, 100), (0, 0, 255, 128))
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return await client.send_image(image=image, open_id="ou_1")
+
+    assert asyncio.run(main())
+    assert Image.open(io.BytesIO(uploaded(server)[0])).mode == "RGBA"
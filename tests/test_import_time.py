@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""用`python -X importtime`检查import的开销, 防止又把重依赖放回到模块顶层"""
+import os
+import subprocess
+import sys
+from typing import Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# `import feishu`的累计import耗时上限(微秒)
+IMPORT_BUDGET_US = 20000
+
+HEAVY_MODULES = ("requests", "aiohttp", "cryptography", "pydantic")
+
+
+def import_times(statement: str) -> Dict[str, int]:
+    """在干净的解释器中执行statement, 返回 模块名 -> 累计import耗时(微秒)"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_import_feishu_within_budget():
+    times = import_times("import feishu")
+    assert times["feishu"] < IMPORT_BUDGET_US, f"import feishu用了{times['feishu']}us"
+    for module in HEAVY_MODULES:
+        assert module not in times, f"import feishu不应该import {module}"
+
+
+def test_import_client_without_transports():
+    times = import_times("from feishu import FeishuClient")
+    for module in ("requests", "aiohttp", "cryptography", "feishu.models.events"):
+        assert module not in times, f"import FeishuClient不应该import {module}"
+
+
+def test_import_events_without_client():
+    times = import_times("from feishu import Event")
+    for module in ("requests", "aiohttp", "feishu.client", "feishu.models.messages"):
+        assert module not in times, f"import Event不应该import {module}"
+
+
+if __name__ == "__main__":
+    test_import_feishu_within_budget()
+    test_import_client_without_transports()
+    test_import_events_without_client()
@@ -0,0 +1,63 @@
+import pytest
+
+from feishu import FeishuClient, MessageLimits, TextMessage, TextContent, CardContent, compile_card
+from feishu.errors import ERRORS, FeishuError
+from feishu.limits import count_elements, preflight
+
+
+def sent_paths(server):
+    return [path for path in server.paths() if path.startswith("/message")]
+
+
+def test_oversized_text_is_rejected_locally(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    with pytest.raises(FeishuError) as e:
+        client.send_text("字" * 60000, open_id="ou_1")
+    assert e.value.code == ERRORS.LIMIT_EXCEEDED
+    assert sent_paths(server) == []
+    # 限制按utf-8请求体计算, 刚好不超过时照常发送
+    assert client.send_text("字" * 50000, open_id="ou_1")
+
+
+def test_card_limits(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    many = {"elements": [{"tag": "hr"}] * 51}
+    with pytest.raises(FeishuError, match="51"):
+        client.send_card(many, open_id="ou_1")
+    big = {"elements": [{"tag": "div", "text": {"tag": "plain_text", "content": "x" * 31 * 1024}}]}
+    with pytest.raises(FeishuError, match="字节"):
+        client.send_card(big, open_id="ou_1")
+    with pytest.raises(FeishuError):
+        client.send_compiled_card(compile_card(CardContent(**many)), open_id="ou_1")
+    with pytest.raises(FeishuError):
+        list(client.fan_out({"msg_type": "interactive", "card": many}, ["ou_1", "ou_2"]))
+    assert sent_paths(server) == []
+
+    relaxed = FeishuClient("cli_test", "secret", endpoint=server.endpoint,
+                           limits=MessageLimits(max_card_elements=None))
+    assert relaxed.send_card(many, open_id="ou_1")
+
+
+def test_batch_send_id_limit(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    message = TextMessage(content=TextContent(text="hi"))
+    with pytest.raises(FeishuError, match="open_ids最多200个"):
+        client.batch_send(message, open_ids=[f"ou_{i}" for i in range(201)])
+    with pytest.raises(FeishuError):
+        client.batch_send_all(TextMessage(content=TextContent(text="x" * 200 * 1024)), open_ids=["ou_1"])
+    assert sent_paths(server) == []
+    # batch_send_all自动按200个拆分
+    assert len(client.batch_send_all(message, open_ids=[f"ou_{i}" for i in range(201)]).message_ids) == 2
+
+
+def test_count_elements_and_preflight():
+    post = {"msg_type": "post", "content": {"post": {
+        "zh_cn": {"content": [[{"tag": "text", "text": "a"}] * 3, [{"tag": "text", "text": "b"}]]},
+        "en_us": {"content": [[{"tag": "text", "text": "a"}]]}}}}
+    assert count_elements(post) == 4
+    card = {"msg_type": "interactive", "card": {"elements": [{"tag": "hr"}], "i18n_elements": {"en_us": [{}] * 3}}}
+    assert count_elements(card) == 3
+    assert preflight({"msg_type": "text", "content": {"text": "你好"}}, MessageLimits()) == \
+        '{"msg_type":"text","content":{"text":"你好"}}'.encode("utf-8")
+    with pytest.raises(FeishuError):
+        preflight(post, MessageLimits(max_post_elements=3))
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from feishu import AsyncFeishuClient, FeishuClient, HTTPCache
+
+
+def test_one_client_many_loop_threads(server):
+    server.latency = 0.01
+    client = AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    barrier = threading.Barrier(4)
+
+    async def worker(n: int):
+        message_ids = await client.gather(client.send_text(f"{n}-{i}", open_id="ou_1") for i in range(10))
+        session = client.session_async
+        # 等所有loop都建好session以后再检查, 每个loop一个session
+        await asyncio.get_event_loop().run_in_executor(None, barrier.wait)
+        assert len(client._async_sessions) == 4
+        return session, message_ids
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda n: asyncio.run(worker(n)), range(4)))
+
+    assert len({id(session) for session, _ in results}) == 4
+    assert all(len(message_ids) == 10 for _, message_ids in results)
+    # asyncio.run结束时loop关闭, 对应的session也会被关闭
+    assert all(session.closed for session, _ in results)
+    asyncio.run(client.close())
+    assert not client._async_sessions
+
+
+def test_legacy_client_survives_loop_change(server):
+    client = FeishuClient("cli_test", "secret", run_async=True, endpoint=server.endpoint)
+    for _ in range(2):
+        loop = asyncio.new_event_loop()
+        client.event_loop = loop
+        assert loop.run_until_complete(client.send_text("hello", open_id="ou_1")).startswith("om_")
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+    assert all(session.closed for session, _ in client._async_sessions.values())
+
+
+def test_legacy_client_many_loop_threads(server):
+    server.latency = 0.01
+    client = FeishuClient("cli_test", "secret", run_async=True, endpoint=server.endpoint)
+    barrier = threading.Barrier(3)
+
+    async def worker(n: int):
+        # 三个线程的loop同时在用这个client, 调用绑定在各自正在运行的loop上
+        await asyncio.get_event_loop().run_in_executor(None, barrier.wait)
+        return await client.gather([lambda i=i: client.send_text(f"{n}-{i}", open_id="ou_1") for i in range(5)])
+
+    with ThreadPoolExecutor(3) as executor:
+        results = list(executor.map(lambda n: asyncio.run(worker(n)), range(3)))
+
+    assert all(len(message_ids) == 5 for message_ids in results)
+    assert len({message_id for message_ids in results for message_id in message_ids}) == 15
+
+
+def test_fetch_cached_from_many_loop_threads(server, tmp_path):
+    server.files["logo.png"] = b"\x89PNG fake image"
+    client = AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint,
+                               http_cache=HTTPCache(str(tmp_path / "http")))
+    barrier = threading.Barrier(2)
+
+    async def worker(n: int):
+        # 两个loop同时在用这个client
+        await asyncio.get_event_loop().run_in_executor(None, barrier.wait)
+        response = await client.fetch_cached(server.file_url("logo.png"))
+        message_id = await client.send_image(image_url=server.file_url("logo.png"), open_id=f"ou_{n}")
+        return response.body, message_id
+
+    with ThreadPoolExecutor(2) as executor:
+        results = list(executor.map(lambda n: asyncio.run(worker(n)), range(2)))
+
+    assert [body for body, _ in results] == [b"\x89PNG fake image"] * 2
+    assert all(message_id.startswith("om_") for _, message_id in results)
+    asyncio.run(client.close())
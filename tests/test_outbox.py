@@ -0,0 +1,60 @@
+from feishu import FeishuClient, Outbox, RateLimiter
+from feishu.apis.card import create_card_message
+from feishu.consts import FEISHU_RATE_LIMIT_ERROR
+from .fake_server import FakeError
+
+
+def test_outbox_survives_restart(server, tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    outbox = Outbox(client, path)
+    ids = [outbox.send_text(f"hello {i}", open_id=f"ou_{i}") for i in range(5)]
+    ids.append(outbox.send_card({"elements": []}, update_multi=True, chat_id="oc_1"))
+    outbox.close()  # 还没有start就"重启"了
+    assert not server.paths()
+
+    with Outbox(client, path, workers=3, rate_limiter=RateLimiter(1000), poll_interval=0.05) as outbox:
+        assert outbox.drain(timeout=5)
+        records = [outbox.get(outbox_id) for outbox_id in ids]
+
+    assert all(r.status == "sent" and r.message_id.startswith("om_") for r in records)
+    assert len({r.message_id for r in records}) == 6
+    payloads = [r["payload"] for r in server.requests if r["path"] == "/message/v4/send/"]
+    assert sorted(p.get("open_id", p.get("chat_id")) for p in payloads) == ["oc_1"] + [f"ou_{i}" for i in range(5)]
+    assert records[-1].payload["card"] == {"elements": []}
+
+
+def test_outbox_retries(server, tmp_path):
+    attempts = {}
+
+    def send(payload):
+        text = payload["content"]["text"]
+        attempts[text] = attempts.get(text, 0) + 1
+        if text == "throttled" and attempts[text] < 3:
+            raise FakeError(FEISHU_RATE_LIMIT_ERROR, "request trigger frequency limit")
+        if text == "bad":
+            raise FakeError(230013, "user not found")
+        return server.handle_send(payload)
+
+    server.handlers["/message/v4/send/"] = send
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    with Outbox(client, str(tmp_path / "outbox.sqlite3"), backoff=0.01, poll_interval=0.01) as outbox:
+        throttled = outbox.send_text("throttled", open_id="ou_1")
+        bad = outbox.send_text("bad", open_id="ou_2")
+        assert outbox.drain(timeout=5)
+        throttled, bad = outbox.get(throttled), outbox.get(bad)
+
+    assert throttled.status == "sent" and throttled.attempts == 3
+    assert bad.status == "failed" and bad.attempts == 1 and bad.error.startswith("230013")
+
+
+def test_outbox_send_card_message(server, tmp_path):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    with Outbox(client, str(tmp_path / "outbox.sqlite3"), poll_interval=0.01) as outbox:
+        outbox_id = outbox.send(create_card_message({"elements": []}, open_id="ou_1"))
+        assert outbox.drain(timeout=5)
+        record = outbox.get(outbox_id)
+
+    assert record.status == "sent"
+    assert record.payload["msg_type"] == "interactive" and record.payload["card"] == {"elements": []}
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from feishu import AsyncFeishuClient, FeishuClient
+
+
+def list_requests(server):
+    return [r["payload"] for r in server.requests if r["path"] == "/chat/v4/list"]
+
+
+def test_iter_chats(server):
+    server.chats = [{"chat_id": f"oc_{i}", "name": f"chat {i}"} for i in range(450)]
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    chats = client.iter_chats(page_size=100)
+    assert [chat.chat_id for chat in chats] == [f"oc_{i}" for i in range(450)]
+    assert len(list_requests(server)) == 5
+    # 可以重复遍历
+    assert len(list(chats)) == 450
+    assert client.list_chat_all()[-1].chat_id == "oc_449"
+
+
+def test_iter_chats_prefetches_next_page(server):
+    server.chats = [{"chat_id": f"oc_{i}"} for i in range(300)]
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    chats = iter(client.iter_chats(page_size=100))
+    next(chats)
+    deadline = time.time() + 2
+    while len(list_requests(server)) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    # 还在处理第一页时, 第二页已经在请求了, 但不会一次把所有页都取完
+    assert len(list_requests(server)) == 2
+
+
+def test_iter_chats_max_items_async(server):
+    server.chats = [{"chat_id": f"oc_{i}"} for i in range(450)]
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return [chat.chat_id async for chat in client.iter_chats(page_size=100, max_items=150)]
+
+    assert asyncio.run(main()) == [f"oc_{i}" for i in range(150)]
+    assert [p["page_size"] for p in list_requests(server)] == ["100", "50"]
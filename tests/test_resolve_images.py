@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from feishu import (AsyncFeishuClient, FeishuClient, FeishuError, CardContent, CardImgModule, CardDivModule,
+                    CardImageElement, I18nPost, PostImgElement, PostTextElement)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+ALT = {"tag": "plain_text", "content": "chart"}
+
+
+def uploads(server):
+    return [r for r in server.requests if r["path"] == "/image/v4/put/"]
+
+
+def sent_payload(server):
+    return [r for r in server.requests if r["path"] == "/message/v4/send/"][-1]["payload"]
+
+
+def test_send_card_resolves_image_sources(server, tmp_path):
+    server.latency = 0.02
+    server.files["chart.png"] = PNG + b"chart"
+    logo = tmp_path / "logo.png"
+    logo.write_bytes(PNG + b"logo")
+    card = CardContent(elements=[
+        CardImgModule(img_source=str(logo), alt=ALT),
+        CardDivModule(text={"tag": "lark_md", "content": "hi"},
+                      extra=CardImageElement(img_source=server.file_url("chart.png"), alt=ALT)),
+        CardImgModule(img_source=str(logo), alt=ALT),
+        {"tag": "img", "img_source": PNG, "alt": ALT},
+        CardImgModule(img_key="img_existing", alt=ALT),
+    ])
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    assert client.send_card(card, open_id="ou_1")
+
+    assert len(uploads(server)) == 3 and server.max_in_flight > 1
+    elements = sent_payload(server)["card"]["elements"]
+    keys = [elements[0]["img_key"], elements[1]["extra"]["img_key"], elements[2]["img_key"], elements[3]["img_key"]]
+    assert keys[0] == keys[2] and len(set(keys)) == 3 and all(k.startswith("img_") for k in keys)
+    assert elements[4]["img_key"] == "img_existing"
+    assert "img_source" not in str(elements)
+    # 调用方的卡片没有被修改
+    assert card.elements[0].img_key == ""
+
+
+def test_image_source_or_key_is_required():
+    with pytest.raises(ValueError):
+        CardImgModule(alt=ALT)
+    with pytest.raises(ValueError):
+        PostImgElement(width=1, height=1)
+
+
+@pytest.mark.parametrize("element", [{"tag": "img"}, {"tag": "img", "width": 1, "height": 1}, {"tag": "bogus"},
+                                     {"text": "no tag"}, "text"])
+def test_malformed_post_element_is_rejected(server, element):
+    with pytest.raises(ValueError):
+        I18nPost(content=[[{"tag": "text", "text": "ok"}, element]])
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    with pytest.raises(ValueError):
+        client.send_post({"zh_cn": {"content": [[element]]}}, open_id="ou_1")
+    assert not server.paths()
+
+
+def test_failed_image_aborts_send(server, tmp_path):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    card = CardContent(elements=[CardImgModule(img_source=str(tmp_path / "missing.png"), alt=ALT)])
+    with pytest.raises(FeishuError):
+        client.send_card(card, open_id="ou_1")
+    assert not [r for r in server.requests if r["path"] == "/message/v4/send/"]
+
+
+def test_send_post_resolves_image_sources_async(server):
+    post = I18nPost(title="report", content=[
+        [PostTextElement(text="line 1")],
+        [PostImgElement(image_source=PNG, width=100, height=100),
+         PostImgElement(image_source=PNG, width=50, height=50)],
+    ])
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return await client.send_post(post, open_id="ou_1")
+
+    assert asyncio.run(main())
+    content = sent_payload(server)["content"]["post"]["zh_cn"]["content"]
+    assert content[0] == [{"tag": "text", "text": "line 1"}]
+    assert content[1][0]["image_key"] == content[1][1]["image_key"] and content[1][1]["width"] == 50
+    assert len(uploads(server)) == 1
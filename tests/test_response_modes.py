@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from feishu import AsyncFeishuClient, FeishuClient, LazyModel, TextMessage, TextContent
+from feishu.models import AddChatterResponse, BatchSendResponse, BotInfo, ChatInfo, ChatPagination
+
+BOT = {"activate_status": 2, "app_name": "bot", "avatar_url": "", "ip_white_list": [], "open_id": "ou_bot"}
+
+
+def test_typed_mode_is_default(server):
+    server.chats = [{"chat_id": "oc_1", "name": "chat"}]
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    assert isinstance(client.list_chat(), ChatPagination)
+    assert isinstance(client.add_chatter("oc_1", open_ids=["ou_1"]), AddChatterResponse)
+
+
+def test_raw_mode(server):
+    server.chats = [{"chat_id": f"oc_{i}", "name": f"chat {i}"} for i in range(250)]
+    server.handlers["/bot/v3/info/"] = lambda payload: {"bot": BOT}
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, response_mode="raw")
+
+    assert client.get_bot_info() == BOT
+    page = client.list_chat(page_size=200)
+    assert page["has_more"] and page["groups"][0] == {"chat_id": "oc_0", "name": "chat 0"}
+    assert [chat["chat_id"] for chat in client.iter_chats(page_size=100)][-1] == "oc_249"
+    assert len(client.list_chat_all()) == 250
+    assert client.add_chatter("oc_1", open_ids=["ou_1", "invalid_1"]) == {
+        "chat_id": "oc_1", "invalid_open_ids": ["invalid_1"], "invalid_user_ids": []}
+
+    message = TextMessage(content=TextContent(text="hi"))
+    assert client.batch_send(message, open_ids=["ou_1"])["message_id"]
+    merged = client.batch_send_all(message, open_ids=[f"ou_{i}" for i in range(300)])
+    assert isinstance(merged, dict) and len(merged["message_ids"]) == 2
+    # 单次调用可以覆盖client的设置
+    assert isinstance(client.get_bot_info(response_mode="typed"), BotInfo)
+
+
+def test_lazy_mode_validates_on_access(server):
+    server.chats = [{"chat_id": "oc_1", "name": "chat", "type": "not a chat type"}]
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    page = client.list_chat(response_mode="lazy")
+    assert isinstance(page, LazyModel) and page.has_more is False
+    chat = page.groups[0]
+    assert isinstance(chat, LazyModel) and chat.chat_id == "oc_1" and chat.owner_open_id == ""
+    # 只有访问到的字段才会校验
+    with pytest.raises(ValidationError):
+        chat.type
+    with pytest.raises(ValidationError):
+        chat.to_model()
+    with pytest.raises(AttributeError):
+        chat.not_a_field
+
+    response = client.batch_send(TextMessage(content=TextContent(text="hi")), open_ids=["ou_1"],
+                                 response_mode="lazy")
+    assert response.message_id.startswith("bm_") and response.invalid_open_ids == []
+    assert isinstance(response.to_model(), BatchSendResponse)
+
+
+def test_lazy_model_setattr_and_dict():
+    chat = LazyModel(ChatInfo, {"chat_id": "oc_1", "members": [{"open_id": "ou_1", "user_id": "u_1"}]})
+    assert chat.members[0].open_id == "ou_1"
+    chat.name = "renamed"
+    assert chat["name"] == "renamed"
+    assert chat.dict() == {"chat_id": "oc_1", "name": "renamed", "members": [{"open_id": "ou_1", "user_id": "u_1"}]}
+    assert chat.to_model().name == "renamed"
+
+
+def test_lazy_mode_async(server):
+    server.chats = [{"chat_id": f"oc_{i}"} for i in range(150)]
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint, response_mode="lazy") as client:
+            chats = [chat async for chat in client.iter_chats(page_size=100)]
+            added = await client.add_chatter_all("oc_1", open_ids=[f"ou_{i}" for i in range(300)])
+            return chats, added
+
+    chats, added = asyncio.run(main())
+    assert [chat.chat_id for chat in chats] == [f"oc_{i}" for i in range(150)]
+    assert isinstance(added, AddChatterResponse) and added.chat_id == "oc_1"
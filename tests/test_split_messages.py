@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from feishu import AsyncFeishuClient, FeishuClient, MessageLimits, I18nPost
+from feishu.errors import FeishuError
+from feishu.limits import split_text, serialize_payload
+from .fake_server import FakeError
+
+
+def sent(server):
+    return [r["payload"] for r in server.requests if r["path"] == "/message/v4/send/"]
+
+
+def test_split_text_keeps_lines_and_content():
+    text = "\n".join(f"第{i}行 \"quoted\"" for i in range(300)) + "\n" + "长" * 1000
+    chunks = split_text(text, 500)
+    assert "".join(chunks) == text
+    assert all(len(serialize_payload(chunk)) - 2 <= 500 for chunk in chunks)
+    # 除了超长的那一行, 都在换行处拆分
+    assert all(chunk.endswith("\n") for chunk in chunks if "长" not in chunk)
+
+
+def test_send_text_split_threads_chunks(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, limits=MessageLimits(max_text_bytes=2000))
+    text = "\n".join(f"log line {i}" for i in range(500))
+    with pytest.raises(FeishuError):
+        client.send_text(text, open_id="ou_1")
+
+    response = client.send_text(text, open_id="ou_1", split=True)
+    payloads = sent(server)
+    assert response.ok and response.chunks == len(payloads) > 1
+    assert response.message_ids == [f"om_{i + 1}" for i in range(len(payloads))]
+    assert "".join(p["content"]["text"] for p in payloads) == text
+    assert "root_id" not in payloads[0] and {p["root_id"] for p in payloads[1:]} == {response.message_id}
+    assert all(p["open_id"] == "ou_1" for p in payloads)
+
+    # 没有超过限制时只发一条
+    assert client.send_text("short", chat_id="oc_1", split=True).message_ids == [f"om_{len(payloads) + 1}"]
+
+
+def test_send_post_split(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, limits=MessageLimits(max_post_bytes=1500))
+    rows = [[{"tag": "text", "text": f"第{i}行: "}, {"tag": "a", "text": "链接", "href": f"https://e.com/{i}"}]
+            for i in range(60)]
+    post = I18nPost(title="日报", content=rows)
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint,
+                                     limits=MessageLimits(max_post_bytes=1500)) as async_client:
+            return await async_client.send_post(post, chat_id="oc_1", root_id="om_root", split=True)
+
+    response = client.send_post(post, chat_id="oc_1", split=True)
+    payloads = sent(server)
+    assert response.ok and len(response.message_ids) == len(payloads) > 1
+    assert all(len(serialize_payload(p)) <= 1500 for p in payloads)
+    bodies = [p["content"]["post"]["zh_cn"] for p in payloads]
+    assert bodies[0]["title"] == "日报" and all("title" not in body for body in bodies[1:])
+    assert [row for body in bodies for row in body["content"]] == post.dict(exclude_none=True)["content"]
+
+    async_response = asyncio.run(main())
+    assert async_response.chunks == response.chunks
+    assert {p["root_id"] for p in sent(server)[len(payloads):]} == {"om_root"}
+
+
+def test_send_chunks_stops_at_failure(server):
+    counter = iter(range(100))
+
+    def handle_send(payload):
+        if next(counter) == 1:
+            raise FakeError(230001, "bad message")
+        return {"data": {"message_id": server.next_id("om")}}
+
+    server.handlers["/message/v4/send/"] = handle_send
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint, limits=MessageLimits(max_text_bytes=500))
+    response = client.send_text("x\n" * 1000, open_id="ou_1", split=True, idempotency_key="report")
+    assert not response.ok and response.code == 230001 and len(response.message_ids) == 1 and response.chunks > 2
+
+    # 用同一个key重试时, 已经发送过的段不会重复发送
+    retried = client.send_text("x\n" * 1000, open_id="ou_1", split=True, idempotency_key="report")
+    assert retried.ok and retried.message_ids[0] == response.message_id
+    assert len(sent(server)) == response.chunks + 1
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import pytest
+
+from feishu import (AsyncFeishuClient, FeishuClient, FeishuError, CardContent, CardDivModule, CardImgModule,
+                    compile_card)
+
+CARD = CardContent(
+    header={"title": {"tag": "plain_text", "content": "{{title}}"}},
+    elements=[
+        CardDivModule(text={"tag": "lark_md", "content": "你好, {{ name }}! 你的余额为{{balance}}元"}),
+        CardImgModule(img_key="img_logo", alt={"tag": "plain_text", "content": "logo"}),
+    ])
+
+
+def sent(server):
+    return [r["payload"] for r in server.requests if r["path"] == "/message/v4/send/"]
+
+
+def test_compiled_card_matches_send_card(server):
+    values = {"title": 'say "hi"', "name": "张三\n", "balance": 3.5}
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    card = compile_card(CARD)
+    assert card.placeholders == {"title", "name", "balance"}
+
+    client.send_compiled_card(card, values, open_id="ou_1", root_id="om_1")
+    expected = json.loads(CARD.json()
+                          .replace("{{title}}", 'say \\"hi\\"').replace("{{ name }}", "张三\\n")
+                          .replace("{{balance}}", "3.5"))
+    client.send_card(expected, open_id="ou_1", root_id="om_1")
+
+    rendered, reference = sent(server)
+    assert rendered == reference
+    assert rendered["card"]["elements"][0]["text"]["content"] == "你好, 张三\n! 你的余额为3.5元"
+
+
+def test_recipient_priority_and_missing_values():
+    card = compile_card(CARD)
+    payload = card.render_dict({"title": "t", "name": "n", "balance": 1}, chat_id="oc_1", open_id="ou_1")
+    assert payload["chat_id"] == "oc_1" and "open_id" not in payload and payload["msg_type"] == "interactive"
+    with pytest.raises(FeishuError):
+        card.render({"title": "t"}, open_id="ou_1")
+
+
+def test_image_sources_must_be_resolved_first():
+    with pytest.raises(FeishuError):
+        compile_card(CardContent(elements=[CardImgModule(img_source=b"png", alt={"tag": "plain_text", "content": ""})]))
+
+
+def test_send_compiled_card_async(server):
+    card = compile_card(CARD)
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return await client.gather(client.send_compiled_card(card, {"title": "t", "name": str(i), "balance": i},
+                                                                 open_id=f"ou_{i}") for i in range(5))
+
+    assert len(set(asyncio.run(main()))) == 5
+    assert sorted(p["open_id"] for p in sent(server)) == [f"ou_{i}" for i in range(5)]
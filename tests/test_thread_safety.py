@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from feishu import FeishuClient, ConcurrentFeishuClient
+
+
+def echo_send(payload: dict) -> dict:
+    # message_id由文本决定, 用来检查返回没有串到别的线程
+    return {"data": {"message_id": "om_" + payload["content"]["text"]}}
+
+
+def test_no_cross_talk_between_threads(server):
+    server.handlers["/message/v4/send/"] = echo_send
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+
+    def worker(n: int):
+        session = client.session
+        results = []
+        for i in range(25):
+            text = f"{n}-{i}"
+            results.append((text, client.send_text(text, open_id="ou_1")))
+            assert client.session is session
+        return session, results
+
+    with ThreadPoolExecutor(8) as executor:
+        outputs = list(executor.map(worker, range(8)))
+
+    assert len({id(session) for session, _ in outputs}) == 8, "每个线程应该有自己的session"
+    for _, results in outputs:
+        for text, message_id in results:
+            assert message_id == "om_" + text
+    assert server.paths().count("/auth/v3/tenant_access_token/internal/") <= 1
+
+
+def test_throughput_scales_with_threads(server):
+    server.latency = 0.02
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    client.get_token()
+
+    def elapsed(threads: int, calls: int = 40) -> float:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(lambda i: client.send_text(str(i), open_id="ou_1"), range(calls)))
+        return time.perf_counter() - start
+
+    assert elapsed(8) < elapsed(1) / 3
+
+
+def _send_in_child(client: FeishuClient, concurrent_client: ConcurrentFeishuClient, queue: multiprocessing.Queue):
+    try:
+        # 父进程的session上有标记, 子进程中应该是新建的session
+        queue.put((not getattr(client.session, "created_in_parent", False),
+                   client.send_text("child", open_id="ou_1"),
+                   concurrent_client.send_text("child", open_id="ou_1").result(5)))
+    except Exception as e:
+        queue.put(e)
+
+
+@pytest.mark.skipif(not hasattr(os, "register_at_fork"), reason="需要fork")
+def test_fork_resets_pools(server):
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    concurrent_client = ConcurrentFeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    client.send_text("parent", open_id="ou_1")
+    concurrent_client.send_text("parent", open_id="ou_1").result()
+    client.session.created_in_parent = True
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_send_in_child, args=(client, concurrent_client, queue))
+    process.start()
+    result = queue.get(timeout=10)
+    process.join(10)
+
+    assert not isinstance(result, Exception), result
+    new_session, message_id, concurrent_message_id = result
+    assert new_session and message_id.startswith("om_") and concurrent_message_id.startswith("om_")
+    # 父进程的连接在fork后依然可用
+    assert client.send_text("parent", open_id="ou_1").startswith("om_")
+    concurrent_client.close()
@@ -0,0 +1,48 @@
+import asyncio
+import io
+
+from feishu import AsyncFeishuClient, FeishuClient, ERRORS
+from feishu.apis.message import image_upload_result
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+def uploads(server):
+    return [r for r in server.requests if r["path"] == "/image/v4/put/"]
+
+
+def test_upload_images_keeps_order_and_reports_failures(server, tmp_path):
+    server.latency = 0.02
+    server.files["chart.png"] = PNG + b"chart"
+    image_file = tmp_path / "logo.png"
+    image_file.write_bytes(PNG + b"logo")
+    client = FeishuClient("cli_test", "secret", endpoint=server.endpoint)
+    images = [str(image_file), server.file_url("chart.png"), PNG, io.BytesIO(PNG), str(tmp_path / "missing.png"),
+              server.file_url("missing.png"), PNG + b"x"]
+
+    results = client.upload_images(images, concurrency=4)
+
+    assert [r.index for r in results] == list(range(len(images)))
+    assert [r.ok for r in results] == [True, True, True, True, False, False, True]
+    assert results[4].code == ERRORS.INVALID_IMAGE_FILE_OR_CONTENT
+    assert results[2].image_key == results[3].image_key
+    assert len({r.image_key for r in results if r.ok}) == 4
+    assert len(uploads(server)) == 4 and 1 < server.max_in_flight <= 4
+
+
+def test_upload_images_async(server):
+    server.latency = 0.02
+
+    async def main():
+        async with AsyncFeishuClient("cli_test", "secret", endpoint=server.endpoint) as client:
+            return await client.upload_images([PNG + bytes([i]) for i in range(10)] + [PNG + b"\x00"], concurrency=3)
+
+    results = asyncio.run(main())
+    assert all(r.ok for r in results) and results[0].image_key == results[-1].image_key
+    assert len(uploads(server)) == 10 and server.max_in_flight <= 3
+
+
+
+def test_upload_result_records_unexpected_errors():
+    result = image_upload_result(1, OSError("disk error"))
+    assert not result.ok and result.index == 1 and result.msg == "disk error"